@@ -1,9 +1,86 @@
-import os, hashlib, hmac, sqlite3
+import os, hashlib, hmac, secrets, sqlite3, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple, Dict
 import streamlit as st
-from lib_db import get_conn
+from lib_db import get_conn, writing
+from lib_perf import timed
+
+try:
+    from streamlit_cookies_controller import CookieController
+except ImportError:  # 無ければCookieは使わず、ログインはブラウザのセッション内だけ
+    CookieController = None
 
 _ITER = 200_000
+SESSION_COOKIE = "score_sheet_session"
+SESSION_DAYS = 14
+
+# パスワードハッシュは専用のスレッドプールで計算する（pbkdf2_hmac は計算中 GIL を離す）。
+# 同時に走らせる数と待ち行列の長さを制限して、ログインが集中しても他の画面を止めない
+HASH_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+HASH_MAX_PENDING = HASH_WORKERS * 4
+HASH_WAIT_SEC = 10
+LOGIN_MAX_FAILURES = 5       # この回数失敗したら
+LOGIN_WINDOW_SEC = 300       # （この期間内に）
+LOGIN_LOCK_SEC = 60          # この秒数ログインを受け付けない
+LOGIN_MAX_TRACKED = 10000    # 失敗を覚えておくユーザー名の上限（古いものから捨てる）
+USER_PAGE_SIZE = 50
+
+_hash_pool = None
+_hash_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+_pool_lock = threading.Lock()
+_login_lock = threading.Lock()
+# ユーザー名 → 失敗時刻。最後に失敗した順に並べ、先頭が一番古い
+_login_failures: "OrderedDict[str, list]" = OrderedDict()
+_login_in_flight = set()
+
+class AuthBusy(Exception):
+    pass
+
+def _run_hash(fn, *args):
+    global _hash_pool
+    if not _hash_slots.acquire(timeout=HASH_WAIT_SEC):
+        raise AuthBusy("混み合っています。しばらくしてから再度お試しください。")
+    try:
+        with _pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pbkdf2")
+        return _hash_pool.submit(fn, *args).result()
+    finally:
+        _hash_slots.release()
+
+def login_retry_after(username: str) -> int:
+    """ログイン失敗が続いているユーザー名なら、再試行できるまでの秒数。"""
+    now = time.monotonic()
+    with _login_lock:
+        failures = [t for t in _login_failures.get(username, []) if now - t < LOGIN_WINDOW_SEC]
+        if failures:
+            _login_failures[username] = failures
+        else:
+            _login_failures.pop(username, None)
+        if len(failures) < LOGIN_MAX_FAILURES:
+            return 0
+        remaining = failures[-1] + LOGIN_LOCK_SEC - now
+        return int(remaining) + 1 if remaining > 0 else 0
+
+def _record_login(username: str, ok: bool) -> None:
+    with _login_lock:
+        if ok:
+            _login_failures.pop(username, None)
+            return
+        now = time.monotonic()
+        # 存在しないユーザー名を大量に試されても増え続けないよう、
+        # 期間の過ぎたものを先頭から捨て、件数も LOGIN_MAX_TRACKED までにする
+        while _login_failures:
+            oldest, times = next(iter(_login_failures.items()))
+            if now - times[-1] < LOGIN_WINDOW_SEC:
+                break
+            del _login_failures[oldest]
+        failures = [t for t in _login_failures.pop(username, []) if now - t < LOGIN_WINDOW_SEC]
+        failures.append(now)
+        _login_failures[username] = failures[-LOGIN_MAX_FAILURES:]
+        while len(_login_failures) > LOGIN_MAX_TRACKED:
+            _login_failures.popitem(last=False)
 
 def _hash_password(password: str, salt: Optional[bytes] = None) -> str:
     if salt is None:
@@ -11,6 +88,12 @@ def _hash_password(password: str, salt: Optional[bytes] = None) -> str:
     dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, _ITER)
     return f"pbkdf2_sha256${_ITER}${salt.hex()}${dk.hex()}"
 
+def _needs_rehash(stored: str) -> bool:
+    try:
+        return int(stored.split("$")[1]) != _ITER
+    except (IndexError, ValueError):
+        return False
+
 def _verify_password(password: str, stored: str) -> bool:
     try:
         algo, iters, salt_hex, hash_hex = stored.split("$")
@@ -22,52 +105,189 @@ def _verify_password(password: str, stored: str) -> bool:
         return False
 
 def ensure_users_table(conn: sqlite3.Connection) -> None:
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          username TEXT UNIQUE NOT NULL,
-          pw_hash TEXT NOT NULL,
-          role TEXT NOT NULL DEFAULT 'user',
-          created_at TEXT NOT NULL DEFAULT (datetime('now','localtime'))
-        );
-    """)
-    conn.commit()
+    with writing(conn) as w:
+        w.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              username TEXT UNIQUE NOT NULL,
+              pw_hash TEXT NOT NULL,
+              role TEXT NOT NULL DEFAULT 'user',
+              created_at TEXT NOT NULL DEFAULT (datetime('now','localtime'))
+            );
+        """)
+        # ログイン継続用のトークン。token にはCookieの値そのものではなく SHA-256 を入れる
+        w.execute("""
+            CREATE TABLE IF NOT EXISTS user_sessions (
+              token TEXT PRIMARY KEY,
+              user_id INTEGER NOT NULL,
+              expires_at TEXT NOT NULL,
+              created_at TEXT NOT NULL DEFAULT (datetime('now','localtime')),
+              FOREIGN KEY(user_id) REFERENCES users(id)
+            );
+        """)
+        w.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions(expires_at);")
+        w.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions(user_id);")
+        w.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role, id);")
 
 def users_count(conn: sqlite3.Connection) -> int:
     cur = conn.execute("SELECT COUNT(*) FROM users;")
     return int(cur.fetchone()[0])
 
+@timed()
 def create_user(conn: sqlite3.Connection, username: str, password: str, role: str = "user") -> Tuple[bool, str]:
     try:
-        pw_hash = _hash_password(password)
-        conn.execute("INSERT INTO users (username, pw_hash, role) VALUES (?, ?, ?);",
-                     (username, pw_hash, role))
-        conn.commit()
+        pw_hash = _run_hash(_hash_password, password)
+        with writing(conn) as w:
+            w.execute("INSERT INTO users (username, pw_hash, role) VALUES (?, ?, ?);",
+                      (username, pw_hash, role))
+        invalidate_user_directory()
         return True, "ユーザーを作成しました。"
     except sqlite3.IntegrityError:
         return False, "そのユーザー名は既に存在します。"
     except Exception as e:
         return False, f"作成に失敗しました: {e}"
 
+@timed()
 def authenticate(conn: sqlite3.Connection, username: str, password: str) -> Optional[Dict]:
-    row = conn.execute("SELECT id, username, pw_hash, role FROM users WHERE username=?;", (username,)).fetchone()
-    if not row:
+    """失敗が続いているユーザー名のときは計算せずに None。
+
+    同じユーザー名で検証中（二重送信など）のときや、ハッシュの計算待ちが溢れたときは
+    AuthBusy（パスワード誤りとは区別して表示する）。
+    """
+    if login_retry_after(username):
         return None
-    if _verify_password(password, row[2]):
+    with _login_lock:
+        if username in _login_in_flight:
+            raise AuthBusy("同じユーザー名でログインを処理中です。しばらくしてから再度お試しください。")
+        _login_in_flight.add(username)
+    try:
+        row = conn.execute("SELECT id, username, pw_hash, role FROM users WHERE username=?;", (username,)).fetchone()
+        ok = bool(row) and _run_hash(_verify_password, password, row[2])
+        _record_login(username, ok)
+        if not ok:
+            return None
+        if _needs_rehash(row[2]):
+            # _ITER を変えた後の最初のログインで新しい回数のハッシュに置き換える
+            new_hash = _run_hash(_hash_password, password)
+            with writing(conn) as w:
+                w.execute("UPDATE users SET pw_hash=? WHERE id=? AND pw_hash=?;", (new_hash, row[0], row[2]))
         return {"id": row[0], "username": row[1], "role": row[3]}
-    return None
+    finally:
+        with _login_lock:
+            _login_in_flight.discard(username)
+
+# =========================
+# セッショントークン
+# =========================
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def create_session(conn: sqlite3.Connection, user_id: int) -> str:
+    """ログイン継続用のトークンを発行する。ついでに期限切れの行を掃除する。"""
+    token = secrets.token_urlsafe(32)
+    with writing(conn) as w:
+        w.execute("DELETE FROM user_sessions WHERE expires_at <= datetime('now','localtime');")
+        w.execute(
+            "INSERT INTO user_sessions (token, user_id, expires_at) "
+            "VALUES (?, ?, datetime('now','localtime', ?));",
+            (_token_hash(token), user_id, f"+{SESSION_DAYS} days"))
+    return token
+
+def resume_session(conn: sqlite3.Connection, token: str) -> Optional[Dict]:
+    if not token:
+        return None
+    row = conn.execute("""
+        SELECT u.id, u.username, u.role
+        FROM user_sessions s JOIN users u ON u.id = s.user_id
+        WHERE s.token=? AND s.expires_at > datetime('now','localtime');
+    """, (_token_hash(token),)).fetchone()
+    if not row:
+        return None
+    return {"id": row[0], "username": row[1], "role": row[2]}
+
+def revoke_session(conn: sqlite3.Connection, token: str) -> None:
+    if token:
+        with writing(conn) as w:
+            w.execute("DELETE FROM user_sessions WHERE token=?;", (_token_hash(token),))
+
+def revoke_user_sessions(conn: sqlite3.Connection, user_id: int) -> None:
+    with writing(conn) as w:
+        w.execute("DELETE FROM user_sessions WHERE user_id=?;", (user_id,))
+
+def _cookie_controller():
+    if CookieController is None:
+        return None
+    try:
+        return CookieController(key="auth_cookies")
+    except Exception:
+        return None
+
+def _session_cookie() -> Optional[str]:
+    try:
+        return st.context.cookies.get(SESSION_COOKIE)
+    except Exception:
+        return None
+
+def sign_in(conn: sqlite3.Connection, user: Dict) -> bool:
+    """認証済みユーザーをこのブラウザにログインさせ、Cookieでリロード後も続くようにする。
+
+    Cookieはコンポーネントが描画されたときに書き込まれるので、True（書き込み待ち）を
+    返したときは、session_cookie_saved() が True になるまで switch_page しないこと。
+    """
+    st.session_state["auth_user"] = user
+    controller = _cookie_controller()
+    if controller is None:
+        return False
+    token = create_session(conn, user["id"])
+    st.session_state["auth_token"] = token
+    try:
+        controller.set(SESSION_COOKIE, token, max_age=SESSION_DAYS * 24 * 3600)
+    except Exception:
+        return False
+    return True
+
+def session_cookie_saved() -> bool:
+    """このブラウザにセッションCookieが書き込まれたか（Cookieを使わない場合は常に True）。"""
+    token = st.session_state.get("auth_token")
+    controller = _cookie_controller()
+    if not token or controller is None:
+        return True
+    try:
+        return controller.get(SESSION_COOKIE) == token
+    except Exception:
+        return True
+
+def sign_out(conn: sqlite3.Connection) -> None:
+    token = st.session_state.pop("auth_token", None) or _session_cookie()
+    st.session_state.pop("auth_user", None)
+    revoke_session(conn, token)
+    controller = _cookie_controller()
+    if controller is not None:
+        try:
+            controller.remove(SESSION_COOKIE)
+        except Exception:
+            pass
 
 def get_current_user() -> Optional[Dict]:
     return st.session_state.get("auth_user")
 
 def refresh_session_user(conn: sqlite3.Connection, user_id: int) -> None:
-    row = conn.execute("SELECT id, username, role FROM users WHERE id=?;", (user_id,)).fetchone()
-    if row:
-        st.session_state["auth_user"] = {"id": row[0], "username": row[1], "role": row[2]}
+    user = get_user(user_id)
+    if user:
+        st.session_state["auth_user"] = user
 
+@timed()
 def require_login() -> None:
     if st.session_state.get("auth_user"):
         return
+    # リロード直後はCookieのトークンから復帰する（パスワードの再計算はしない）
+    token = _session_cookie()
+    if token:
+        user = resume_session(get_conn(), token)
+        if user:
+            st.session_state["auth_user"] = user
+            st.session_state["auth_token"] = token
+            return
     try:
         if hasattr(st, "switch_page"):
             st.switch_page("pages/_login.py")
@@ -94,7 +314,7 @@ def render_userbox(key: str = "logout_button_default") -> None:
             st.caption("ログイン中")
             st.markdown(f"**{user['username']}**（{user['role']}）")
             if st.button("🚪 ログアウト", width='stretch', key=key):
-                st.session_state.pop("auth_user", None)
+                sign_out(get_conn())
                 try:
                     if hasattr(st, "switch_page"):
                         st.switch_page("pages/00_ログイン.py")
@@ -105,17 +325,25 @@ def render_userbox(key: str = "logout_button_default") -> None:
         else:
             st.caption("未ログイン")
 
+@timed()
 def change_password(conn: sqlite3.Connection, user_id: int, current_password: str, new_password: str) -> Tuple[bool, str]:
     row = conn.execute("SELECT pw_hash FROM users WHERE id=?;", (user_id,)).fetchone()
     if not row:
         return False, "ユーザーが見つかりません。"
-    if not _verify_password(current_password, row[0]):
-        return False, "現在のパスワードが正しくありません。"
     if len(new_password) < 6:
         return False, "新しいパスワードは6文字以上にしてください。"
-    new_hash = _hash_password(new_password)
-    conn.execute("UPDATE users SET pw_hash=? WHERE id=?;", (new_hash, user_id))
-    conn.commit()
+    try:
+        if not _run_hash(_verify_password, current_password, row[0]):
+            return False, "現在のパスワードが正しくありません。"
+        new_hash = _run_hash(_hash_password, new_password)
+    except AuthBusy as e:
+        return False, str(e)
+    # 他の端末のログインは無効にする（この画面のセッションだけ残す）
+    token = st.session_state.get("auth_token")
+    current = _token_hash(token) if token else None
+    with writing(conn) as w:
+        w.execute("UPDATE users SET pw_hash=? WHERE id=?;", (new_hash, user_id))
+        w.execute("DELETE FROM user_sessions WHERE user_id=? AND token IS NOT ?;", (user_id, current))
     return True, "パスワードを変更しました。"
 
 def change_username(conn: sqlite3.Connection, user_id: int, new_username: str) -> Tuple[bool, str]:
@@ -125,29 +353,111 @@ def change_username(conn: sqlite3.Connection, user_id: int, new_username: str) -
     row = conn.execute("SELECT id FROM users WHERE username=?;", (new_username,)).fetchone()
     if row and int(row[0]) != int(user_id):
         return False, "そのユーザー名は既に使われています。"
-    conn.execute("UPDATE users SET username=? WHERE id=?;", (new_username, user_id))
-    conn.commit()
+    with writing(conn) as w:
+        w.execute("UPDATE users SET username=? WHERE id=?;", (new_username, user_id))
+    invalidate_user_directory()
     refresh_session_user(conn, user_id)
     return True, "ユーザー名を変更しました。"
 
+@timed()
 def admin_set_password(conn: sqlite3.Connection, target_user_id: int, new_password: str) -> Tuple[bool, str]:
     if len(new_password) < 6:
         return False, "新しいパスワードは6文字以上にしてください。"
-    new_hash = _hash_password(new_password)
-    cur = conn.execute("UPDATE users SET pw_hash=? WHERE id=?;", (new_hash, target_user_id))
+    try:
+        new_hash = _run_hash(_hash_password, new_password)
+    except AuthBusy as e:
+        return False, str(e)
+    with writing(conn) as w:
+        cur = w.execute("UPDATE users SET pw_hash=? WHERE id=?;", (new_hash, target_user_id))
+        w.execute("DELETE FROM user_sessions WHERE user_id=?;", (target_user_id,))
     if cur.rowcount == 0:
         return False, "対象ユーザーが見つかりません。"
-    conn.commit()
     return True, "パスワードをリセットしました。"
 
 def admin_delete_user(conn: sqlite3.Connection, target_user_id: int, acting_user_id: int) -> Tuple[bool, str]:
     if int(target_user_id) == int(acting_user_id):
         return False, "自分自身は削除できません。"
-    cur = conn.execute("DELETE FROM users WHERE id=?;", (target_user_id,))
+    with writing(conn) as w:
+        cur = w.execute("DELETE FROM users WHERE id=?;", (target_user_id,))
+        w.execute("DELETE FROM user_sessions WHERE user_id=?;", (target_user_id,))
     if cur.rowcount == 0:
         return False, "対象ユーザーが見つかりません。"
-    conn.commit()
+    invalidate_user_directory()
     return True, "ユーザーを削除しました。"
 
+def set_user_role(conn: sqlite3.Connection, target_user_id: int, role: str) -> Tuple[bool, str]:
+    if role not in ("user", "admin"):
+        return False, "ロールが正しくありません。"
+    with writing(conn) as w:
+        cur = w.execute("UPDATE users SET role=? WHERE id=?;", (role, target_user_id))
+    if cur.rowcount == 0:
+        return False, "対象ユーザーが見つかりません。"
+    invalidate_user_directory()
+    return True, "ロールを変更しました。"
+
 def list_users(conn: sqlite3.Connection):
     return conn.execute("SELECT id, username, role, created_at FROM users ORDER BY id;").fetchall()
+
+# =========================
+# ユーザー一覧（キャッシュ）
+# =========================
+# 一覧・件数・1件の参照は世代番号をキーにキャッシュし、
+# 作成・ユーザー名変更・ロール変更・削除で世代を進めて捨てる。
+_directory_generation = 0
+_directory_lock = threading.Lock()
+
+def invalidate_user_directory() -> None:
+    # += は読み出しと書き込みに分かれるので、同時に呼ばれても世代を取りこぼさないようにする
+    global _directory_generation
+    with _directory_lock:
+        _directory_generation += 1
+
+def _prefix_range(prefix: str):
+    # username の UNIQUE インデックスを範囲検索で使う（前方一致）
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def read_users_page(conn: sqlite3.Connection, prefix: str = "", role: Optional[str] = None,
+                    after_id: Optional[int] = None, limit: int = USER_PAGE_SIZE):
+    """id 順に limit 件。戻り値は (rows, 次ページの after_id または None)。"""
+    where, params = [], []
+    if prefix:
+        where.append("username >= ? AND username < ?")
+        params.extend(_prefix_range(prefix))
+    if role:
+        where.append("role = ?")
+        params.append(role)
+    if after_id is not None:
+        where.append("id > ?")
+        params.append(after_id)
+    sql = "SELECT id, username, role, created_at FROM users"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    rows = conn.execute(sql + " ORDER BY id LIMIT ?;", (*params, limit + 1)).fetchall()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def count_users_by_role(conn: sqlite3.Connection) -> Dict[str, int]:
+    return dict(conn.execute("SELECT role, COUNT(*) FROM users GROUP BY role;").fetchall())
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_users_page(generation, prefix, role, after_id, limit):
+    return read_users_page(get_conn(), prefix, role, after_id, limit)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_role_counts(generation):
+    return count_users_by_role(get_conn())
+
+@st.cache_data(show_spinner=False, max_entries=1024)
+def _cached_user(generation, user_id):
+    row = get_conn().execute("SELECT id, username, role FROM users WHERE id=?;", (user_id,)).fetchone()
+    return {"id": row[0], "username": row[1], "role": row[2]} if row else None
+
+def user_directory_page(prefix: str = "", role: Optional[str] = None,
+                        after_id: Optional[int] = None, limit: int = USER_PAGE_SIZE):
+    return _cached_users_page(_directory_generation, (prefix or "").strip(), role, after_id, limit)
+
+def user_role_counts() -> Dict[str, int]:
+    return _cached_role_counts(_directory_generation)
+
+def get_user(user_id: int) -> Optional[Dict]:
+    return _cached_user(_directory_generation, int(user_id))
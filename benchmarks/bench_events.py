@@ -0,0 +1,136 @@
+"""集計ページのイベント表作成（build_events + attach_player_names）のベンチマーク。
+
+従来の行ごとの dict 走査 + merge と、列指向の build_events_frame + PlayerIndex を
+同じ合成データで比較する。リポジトリ直下から実行する:
+
+    python benchmarks/bench_events.py
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib_score import MARKS, CLASS_OPTIONS, PlayerIndex, build_events_frame, attach_player_names  # noqa: E402
+
+SIZES = [160, 1_000, 10_000, 100_000]
+ROSTER_SIZE = 300
+REPEAT = 5
+
+
+# =========================
+# 従来の実装（比較用）
+# =========================
+def legacy_build_events(scores):
+    rows = []
+    for key, data in scores.items():
+        team_code, score_no = key.split("_")
+        mark = data.get("mark", "")
+        point = MARKS.index(mark) if mark in MARKS else 0
+        if point <= 0:
+            continue
+        rows.append({
+            "TEAM": "Red" if team_code == "A" else "Blue",
+            "列": team_code,
+            "CLASS": data.get("class", ""),
+            "背番号": str(data.get("number", "")).strip(),
+            "スコア番号": int(score_no),
+            "得点種別": mark,
+            "得点": point,
+        })
+    return pd.DataFrame(rows)
+
+
+def legacy_attach_player_names(events_df, players_df):
+    players_df = players_df.copy()
+    for col in ["uniform_number", "class_type", "team"]:
+        players_df[col] = players_df[col].astype(str).str.strip()
+    events_df = events_df.copy()
+    for col in ["背番号", "CLASS", "TEAM"]:
+        events_df[col] = events_df[col].astype(str).str.strip()
+
+    merged = events_df.merge(
+        players_df,
+        left_on=["背番号", "CLASS", "TEAM"],
+        right_on=["uniform_number", "class_type", "team"],
+        how="left",
+    ).rename(columns={"player_name": "名前", "bibs_type": "ビブスType"})
+    merged["名前"] = merged["名前"].fillna("")
+    merged["ビブスType"] = merged["ビブスType"].fillna("")
+    merged.loc[merged["名前"].astype(str).str.strip() == "", "名前"] = "未登録選手"
+    merged.loc[merged["ビブスType"].astype(str).str.strip() == "", "ビブスType"] = "不明"
+    return merged
+
+
+# =========================
+# 合成データ
+# =========================
+def make_players(n, rng):
+    rows = []
+    for i in range(n):
+        rows.append({
+            "uniform_number": str(i % 100),
+            "player_name": f"選手{i}",
+            "team": "Red" if i % 2 == 0 else "Blue",
+            "bibs_type": rng.choice(["A", "B", "C"]),
+            "class_type": CLASS_OPTIONS[(i // 2) % len(CLASS_OPTIONS)],
+        })
+    return pd.DataFrame(rows).drop_duplicates(["uniform_number", "class_type", "team"])
+
+
+def make_cells(n, rng):
+    """得点入りセルが n 個のシート（dict と列指向の両方）。"""
+    scores = {}
+    for i in range(n):
+        team = "A" if i % 2 == 0 else "B"
+        scores[f"{team}_{i // 2 + 1}"] = {
+            "mark": rng.choice(MARKS[1:]),
+            "class": rng.choice(CLASS_OPTIONS),
+            "number": str(rng.randrange(120)),
+        }
+    cells = pd.DataFrame({
+        "team": [k.split("_")[0] for k in scores],
+        "score_no": [int(k.split("_")[1]) for k in scores],
+        "mark": [c["mark"] for c in scores.values()],
+        "class": [c["class"] for c in scores.values()],
+        "number": [c["number"] for c in scores.values()],
+    })
+    return scores, cells
+
+
+def best_of(func):
+    best = float("inf")
+    result = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    rng = random.Random(0)
+    players_df = make_players(ROSTER_SIZE, rng)
+    player_index = PlayerIndex(players_df)
+
+    print(f"{'cells':>8} {'legacy ms':>10} {'columnar ms':>12} {'speedup':>8}")
+    for n in SIZES:
+        scores, cells = make_cells(n, rng)
+        legacy_s, legacy = best_of(lambda: legacy_attach_player_names(legacy_build_events(scores), players_df))
+        new_s, new = best_of(lambda: attach_player_names(build_events_frame(cells), player_index))
+
+        columns = ["TEAM", "CLASS", "背番号", "スコア番号", "得点", "名前", "ビブスType"]
+        pd.testing.assert_frame_equal(
+            legacy[columns].reset_index(drop=True),
+            new[columns].reset_index(drop=True),
+            check_dtype=False,
+        )
+        print(f"{n:>8} {legacy_s * 1000:>10.2f} {new_s * 1000:>12.2f} {legacy_s / new_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""スコアシート入力・集計の主要処理のベンチマーク（Streamlit を起動せずに実行する）。
+
+main.py と pages/score_analytics.py から関数定義だけを取り出し、st.session_state を
+差し替えて、空・半分・満杯（160点）のシートと大きな選手名簿で計測する。
+結果（時間と tracemalloc のピークメモリ）は JSON に書き出す。リポジトリ直下から実行する:
+
+    python benchmarks/bench_hot_paths.py
+    python benchmarks/bench_hot_paths.py --output before.json
+    python benchmarks/bench_hot_paths.py --compare before.json   # 遅くなった項目があれば終了コード 1
+
+DB やスコアの保存先は一時ディレクトリに作るので、data/ 以下には触れない。
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SHEETS = {"empty": 0, "half": 80, "full": 160}     # チームごとの得点入りセル数
+ROSTER_SIZES = [300, 3_000, 30_000]
+REPEAT = 5
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_MS = 1.0     # これより小さい差は誤差として無視する
+DEFAULT_OUTPUT = ROOT / "benchmarks" / "results" / "hot_paths.json"
+
+
+# =========================
+# ページスクリプトの読み込み
+# =========================
+class SessionStateStub(dict):
+    """属性でも添字でも読み書きできる st.session_state の代わり。"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        self.pop(name, None)
+
+
+class StreamlitStub:
+    """session_state だけ差し替え、それ以外（cache_data など）は本物の streamlit に任せる。"""
+
+    def __init__(self, real):
+        self._real = real
+        self.session_state = SessionStateStub()
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+def _is_definition(node):
+    if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+        return True
+    if isinstance(node, ast.Assign):
+        return all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets)
+    # PDFフォントの登録
+    return isinstance(node, ast.Try) and "registerFont" in ast.unparse(node)
+
+
+def load_page(path, st_stub):
+    """ページスクリプトから import・関数・クラス・定数だけを実行した名前空間を返す。
+
+    画面を組み立てるトップレベルの処理（認証・ウィジェット）は実行しない。
+    """
+    path = Path(path)
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    module = ast.Module(body=[n for n in tree.body if _is_definition(n)], type_ignores=[])
+    ns = {"__file__": str(path), "__name__": f"bench_{path.stem}"}
+    exec(compile(module, str(path), "exec"), ns)
+    ns["st"] = st_stub
+    return ns
+
+
+# =========================
+# 合成データ
+# =========================
+def make_players(n, rng):
+    import pandas as pd
+    from lib_score import CLASS_OPTIONS
+
+    return pd.DataFrame({
+        "id": range(1, n + 1),
+        "uniform_number": [str(i % 100) for i in range(n)],
+        "player_name": [f"選手{i}" for i in range(n)],
+        "team": ["Red" if i % 2 == 0 else "Blue" for i in range(n)],
+        "bibs_type": [rng.choice(["A", "B", "C"]) for _ in range(n)],
+        "class_type": [CLASS_OPTIONS[(i // 2) % len(CLASS_OPTIONS)] for i in range(n)],
+    })
+
+
+def make_sheet(filled, rng):
+    """チームごとに 1〜filled 番まで得点の入ったシート。"""
+    from lib_score import CLASS_OPTIONS, MARKS, ScoreState, cell_key
+
+    state = ScoreState()
+    for team_idx in range(2):
+        for score_no in range(1, filled + 1):
+            state.set_cell(
+                cell_key(team_idx, score_no),
+                rng.choice(MARKS[1:]),
+                rng.choice(CLASS_OPTIONS),
+                str(rng.randrange(100)),
+            )
+    return state
+
+
+# =========================
+# 計測
+# =========================
+def measure(func, repeat):
+    """repeat 回の実行時間（最小・中央値）と、追加の1回で測ったピークメモリ。"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(repeat):
+    import streamlit
+
+    from lib_db import create_game, get_conn, read_score_cells_frame
+    from lib_score import PlayerIndex, attach_player_names, build_events_frame
+
+    st_stub = StreamlitStub(streamlit)
+    main = load_page(ROOT / "main.py", st_stub)
+    analytics = load_page(ROOT / "pages" / "score_analytics.py", st_stub)
+    state = st_stub.session_state
+
+    rng = random.Random(0)
+    conn = get_conn()
+    results = []
+
+    def record(name, case, func, n=None, calls=1):
+        stats = measure(func, repeat)
+        if calls > 1:
+            stats["per_call_ms"] = round(stats["best_ms"] / calls, 4)
+        results.append({"name": name, "case": case, "n": n, **stats})
+        print(f"{name:<28} {case:<12} {stats['best_ms']:>10.2f} ms {stats['peak_kb']:>10.1f} KiB")
+
+    for case, filled in SHEETS.items():
+        sheet = make_sheet(filled, rng)
+        game_id = create_game(conn, f"bench {case}")
+        keys = [k for k in sheet if sheet[k]["mark"]]
+        state.game_id = game_id
+        state.scores = sheet
+
+        # 保存・読み込み（1セルずつの保存を入力済みセルの数だけ）
+        if keys:
+            record("save_scores", case, lambda: [main["save_scores"](k) for k in keys],
+                   n=len(keys), calls=len(keys))
+        record("load_scores", case, lambda: main["load_scores"](game_id), n=len(keys))
+
+        # ランニングスコア（行キャッシュ無し／あり）
+        def running_score_cold():
+            state.pop("running_score_row_cache", None)
+            main["make_running_score_html"]("A_1")
+
+        record("make_running_score_html", f"{case}/cold", running_score_cold, n=len(keys))
+        main["make_running_score_html"]("A_1")
+        record("make_running_score_html", f"{case}/warm",
+               lambda: main["make_running_score_html"]("A_2"), n=len(keys))
+
+        # PDF（キャッシュ無し）
+        def pdf_cold():
+            main["render_score_sheet_pdf"].clear()
+            main["create_score_sheet_pdf"]("Red", "Blue")
+
+        record("create_score_sheet_pdf", case, pdf_cold, n=len(keys))
+
+        # 集計ページのイベント表
+        record("build_events", case, lambda: analytics["build_events"](game_id), n=len(keys))
+
+    full_events = build_events_frame(read_score_cells_frame(conn, state.game_id))
+    for size in ROSTER_SIZES:
+        players_df = make_players(size, rng)
+        record("PlayerIndex", f"roster {size}", lambda: PlayerIndex(players_df), n=size)
+        index = PlayerIndex(players_df)
+        record("attach_player_names", f"roster {size}",
+               lambda: attach_player_names(full_events, index), n=size)
+
+    return results
+
+
+# =========================
+# 出力・比較
+# =========================
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, ratio=REGRESSION_RATIO):
+    """baseline より ratio 倍以上（かつ REGRESSION_MIN_MS 以上）遅くなった項目を返す。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r["case"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        old = baseline.get((r["name"], r["case"]))
+        if not old or r["best_ms"] - old["best_ms"] < REGRESSION_MIN_MS:
+            continue
+        if r["best_ms"] >= old["best_ms"] * ratio:
+            regressions.append((r["name"], r["case"], old["best_ms"], r["best_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--compare", metavar="BASELINE_JSON")
+    args = parser.parse_args()
+    output = Path(args.output).resolve()
+    baseline = Path(args.compare).resolve() if args.compare else None
+
+    # lib_db は import 時のカレントディレクトリに data/ を作るので、一時ディレクトリで動かす
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        results = run(args.repeat)
+        os.chdir(ROOT)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n→ {output}")
+
+    if baseline:
+        regressions = compare(results, baseline)
+        for name, case, old, new in regressions:
+            print(f"REGRESSION {name} {case}: {old:.2f} ms → {new:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
+import csv
+import io
+import os
+import queue
 import sqlite3
+import tempfile
+import threading
 import pandas as pd
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
 import time
+import zlib
 import streamlit as st
 
+from lib_perf import timed
+
 # 定数
-PLAYER_CSV = 'players.csv'
 DATA_DIR   = Path.cwd() / "data"
 DATA_DIR.mkdir(exist_ok=True)
 DB_PATH    = DATA_DIR / "events.db"
@@ -15,6 +25,7 @@ STAT_SET  = {'アシスト','ブロック','リバウンド','スティール'}
 FOUL_SET  = {'ファール','ターンオーバー'}
 
 # 共有CSS
+@timed()
 def inject_css():
     st.markdown("""
     <style>
@@ -31,12 +42,220 @@ def inject_css():
     </style>
     """, unsafe_allow_html=True)
 
-@st.cache_resource
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    conn.execute("PRAGMA busy_timeout=3000;")
+# 接続管理
+# 接続はDBファイルごとに ConnectionManager が持つ。
+# 読み取りはスレッドごとの接続（connection() を抜けたとき、またはスレッド終了後に
+# プールへ戻して使い回す）、書き込みはDBごとに1本の接続をロックで直列化し、抜けるときに commit する。
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA busy_timeout=3000;",
+)
+MAX_IDLE_CONNECTIONS = 8
+GROUP_COMMIT_WINDOW = 0.002     # 秒。最初の1件からこの時間だけ後続を待ってまとめる
+GROUP_COMMIT_MAX_BATCH = 256
+
+class ManagedConnection(sqlite3.Connection):
+    manager = None
+
+class ConnectionManager:
+    def __init__(self, path, init=None, max_idle=MAX_IDLE_CONNECTIONS):
+        self.path = str(path)
+        self.init = init
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = []
+        self._leases = {}           # 借りているスレッド -> 接続
+        self._idle_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        self._writer = None
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=ManagedConnection)
+        conn.manager = self
+        # 空き領域は incremental_vacuum で少しずつ返す。auto_vacuum は新規DB（まだページが無い）
+        # にしか効かず、WAL への切り替えより先に設定する必要がある（既存DBは convert_auto_vacuum）。
+        # 既存DBで毎回設定すると書き込みロックを取りに行くので、新規のときだけにする
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _ensure_ready(self):
+        # スキーマ作成などの初期化はプロセスで1回だけ
+        if self._ready:
+            return
+        with self._write_lock:
+            if not self._ready:
+                if self._writer is None:
+                    self._writer = self._connect()
+                if self.init:
+                    self.init(self._writer)
+                self._writer.commit()
+                self._ready = True
+
+    def get(self) -> sqlite3.Connection:
+        """このスレッド用の接続。
+
+        release() するまでこのスレッドが使い続ける。返さずに終了したスレッドの接続は、
+        次に別のスレッドが借りるときにプールへ戻す（Streamlit は再実行ごとにスレッドが替わる）。
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._ensure_ready()
+            with self._idle_lock:
+                dead = [t for t in self._leases if not t.is_alive()]
+                for thread in dead:
+                    self._put_idle(self._leases.pop(thread))
+                conn = self._idle.pop() if self._idle else None
+            conn = conn or self._connect()
+            with self._idle_lock:
+                self._leases[threading.current_thread()] = conn
+            self._local.conn = conn
+        return conn
+
+    def release(self):
+        """このスレッドの接続をプールへ返す。借りていなければ何もしない。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._idle_lock:
+            self._leases.pop(threading.current_thread(), None)
+            self._put_idle(conn)
+
+    @contextmanager
+    def connection(self):
+        """このスレッドの接続を借り、抜けるときに返す。
+
+        すでに借りている（外側で get() / connection() 済み）ときはその接続を使い、返さない。
+        """
+        borrowed = getattr(self._local, "conn", None) is None
+        conn = self.get()
+        try:
+            yield conn
+        finally:
+            if borrowed:
+                self.release()
+
+    def _put_idle(self, conn):
+        # _idle_lock を持った状態で呼ぶ
+        if conn.in_transaction:
+            conn.rollback()
+        if len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    def group_writer(self):
+        with self._idle_lock:
+            if getattr(self, "_group_writer", None) is None:
+                self._group_writer = GroupCommitWriter(self)
+            return self._group_writer
+
+    @contextmanager
+    def writer(self):
+        """書き込み用の接続。同時に1スレッドだけ。入れ子にした場合は一番外側で commit する。"""
+        self._ensure_ready()
+        with self._write_lock:
+            conn = self._writer
+            self._write_depth += 1
+            try:
+                yield conn
+                if self._write_depth == 1:
+                    conn.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    conn.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+
+class GroupCommitWriter:
+    """INSERT をキューに溜め、バックグラウンドで数ミリ秒分ずつ1トランザクションにまとめて commit する。
+
+    submit() は Future を返し、commit 後に lastrowid（失敗時は例外）がセットされる。
+    1件の失敗はその文だけが取り消され、同じバッチの他の文は commit される。
+    """
+
+    def __init__(self, manager, window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params=()) -> Future:
+        future = Future()
+        self._queue.put((sql, params, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            results = []
+            try:
+                with self.manager.writer() as w:
+                    for sql, params, future in batch:
+                        try:
+                            results.append((future, w.execute(sql, params).lastrowid, None))
+                        except Exception as e:
+                            results.append((future, None, e))
+            except Exception as e:
+                # commit 自体の失敗はバッチ全体の失敗
+                results = [(future, None, e) for _, _, future in batch]
+            for future, rowid, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(rowid)
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def connection_manager(path, init=None) -> ConnectionManager:
+    """同じDBファイルに対しては、プロセス内で同じ ConnectionManager を返す。"""
+    key = str(Path(path).resolve())
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(path, init)
+            _managers[key] = manager
+        return manager
+
+@contextmanager
+def writing(conn):
+    """conn と同じDBへの書き込み用接続を返す。抜けるときに commit（例外時は rollback）。
+
+    get_conn() などの管理下の接続なら直列化された書き込み接続を使い、
+    それ以外の接続（sqlite3.connect で開いたもの）はそのままトランザクションで包む。
+    """
+    manager = getattr(conn, "manager", None)
+    if manager is None:
+        with conn:
+            yield conn
+        return
+    with manager.writer() as w:
+        yield w
+
+def init_events_db(conn):
     conn.execute("""
       CREATE TABLE IF NOT EXISTS events(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,20 +271,112 @@ def get_conn() -> sqlite3.Connection:
     """)
     conn.execute("CREATE INDEX IF NOT EXISTS idx_events_ct ON events(class, team)")
     conn.execute("CREATE INDEX IF NOT EXISTS idx_events_time ON events(created_at)")
-    return conn
-
-# プレイヤー読み込み
-@st.cache_data(show_spinner=False)
-def load_players(updated_at=None) -> pd.DataFrame:
-    p = Path(PLAYER_CSV)
-    if not p.exists():
-        return pd.DataFrame(columns=['CLASS','TEAM','背番号','プレイヤー名','ビブスType','表示'])
-    df = pd.read_csv(p, dtype=str)
-    for c in ['CLASS','TEAM','背番号','プレイヤー名','ビブスType']:
-        if c not in df.columns: df[c] = ''
-    df['背番号'] = df['背番号'].astype(str)
-    df['表示'] = df['背番号'] + ' - ' + df['プレイヤー名'] + '（' + df['ビブスType'] + '）'
-    return df
+    # 試合ごとのイベント（古いDBには game_id 列が無いので追加する）
+    if "game_id" not in {row[1] for row in conn.execute("PRAGMA table_info(events)")}:
+        conn.execute("ALTER TABLE events ADD COLUMN game_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_game ON events(game_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_game_score ON events(game_id, team, action)")
+    # 試合×チームの得点合計。events の追加・削除・更新時にトリガーで差分更新する
+    # （game_id が無いイベントは 0 として数える）
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS event_team_totals(
+        game_id INTEGER NOT NULL,
+        team    TEXT    NOT NULL,
+        points  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (game_id, team)
+      ) WITHOUT ROWID
+    """)
+    points = "CASE {row}.action WHEN '3pt' THEN 3 WHEN '2pt' THEN 2 WHEN '1pt' THEN 1 ELSE 0 END"
+    upsert = """
+            INSERT INTO event_team_totals(game_id, team, points)
+              SELECT COALESCE({row}.game_id, 0), {row}.team, {sign}({points})
+              WHERE {row}.team IS NOT NULL
+              ON CONFLICT(game_id, team) DO UPDATE SET points = points + excluded.points;"""
+    # TEAM の無いイベントは合計に数えない
+    for event, when, body in (
+        ("INSERT", " WHEN NEW.team IS NOT NULL", upsert.format(row="NEW", sign="+", points=points.format(row="NEW"))),
+        ("DELETE", " WHEN OLD.team IS NOT NULL", upsert.format(row="OLD", sign="-", points=points.format(row="OLD"))),
+        ("UPDATE", "", upsert.format(row="OLD", sign="-", points=points.format(row="OLD"))
+                       + upsert.format(row="NEW", sign="+", points=points.format(row="NEW"))),
+    ):
+        conn.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_events_totals_{event.lower()} AFTER {event} ON events{when}
+          BEGIN{body}
+          END
+        """)
+    if conn.execute("SELECT NOT EXISTS(SELECT 1 FROM event_team_totals)").fetchone()[0]:
+        conn.execute(f"""
+          INSERT INTO event_team_totals(game_id, team, points)
+          SELECT COALESCE(game_id, 0), team, SUM({points.format(row="events")})
+          FROM events
+          WHERE team IS NOT NULL
+          GROUP BY COALESCE(game_id, 0), team
+        """)
+    # 試合後に events から移したイベント
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS events_archive(
+        id INTEGER PRIMARY KEY,
+        class   TEXT,
+        team    TEXT,
+        bib     TEXT,
+        no      TEXT,
+        name    TEXT,
+        action  TEXT,
+        quarter TEXT,
+        created_at TEXT,
+        game_id INTEGER,
+        archived_at TEXT DEFAULT (datetime('now','localtime'))
+      )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_archive_game ON events_archive(game_id)")
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS games(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'active',   -- active / ended
+        started_at TEXT DEFAULT (datetime('now','localtime')),
+        ended_at   TEXT
+      )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_games_status ON games(status)")
+    # ランニングスコア（入力済みのセルだけを1行ずつ持つ）
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS score_cells(
+        game_id  INTEGER NOT NULL,
+        team     TEXT    NOT NULL,   -- A / B
+        score_no INTEGER NOT NULL,   -- 1..160
+        mark     TEXT    NOT NULL DEFAULT '',
+        class    TEXT    NOT NULL DEFAULT '初級',
+        number   TEXT    NOT NULL DEFAULT '',
+        updated_at TEXT DEFAULT (datetime('now','localtime')),
+        PRIMARY KEY (game_id, team, score_no)
+      ) WITHOUT ROWID
+    """)
+    # 試合ごとの更新回数。集計画面のキャッシュキーに使う
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS score_versions(
+        game_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+      )
+    """)
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        conn.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_score_cells_{event.lower()} AFTER {event} ON score_cells
+          BEGIN
+            INSERT INTO score_versions(game_id, version) VALUES ({row}.game_id, 1)
+              ON CONFLICT(game_id) DO UPDATE SET version = version + 1;
+          END
+        """)
+    # 1回だけ行う移行などの済み印
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS app_meta(
+        key   TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+      ) WITHOUT ROWID
+    """)
+
+def get_conn() -> sqlite3.Connection:
+    return connection_manager(DB_PATH, init_events_db).get()
 
 # 通知
 def notify(msg: str, icon: str = "✅"):
@@ -75,85 +386,518 @@ def notify(msg: str, icon: str = "✅"):
         st.success(msg)
 
 # CRUD / IO
-def add_event_sql(conn, classType, team, bibsType, uniformNumber, playerName, action_label, quarter):
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO events(class,team,bib,no,name,action,quarter) VALUES (?,?,?,?,?,?,?)",
-        (classType, team, bibsType, uniformNumber, playerName, action_label, quarter)
-    )
-    conn.commit()
-    return cur.lastrowid
+ADD_EVENT_SQL = "INSERT INTO events(class,team,bib,no,name,action,quarter,game_id) VALUES (?,?,?,?,?,?,?,?)"
+
+def submit_event_sql(conn, classType, team, bibsType, uniformNumber, playerName, action_label, quarter,
+                     game_id=None) -> Future:
+    # 他のセッションの入力とまとめて commit する。Future.result() で id が返る
+    params = (classType, team, bibsType, uniformNumber, playerName, action_label, quarter, game_id)
+    manager = getattr(conn, "manager", None)
+    if manager is None:
+        future = Future()
+        with writing(conn) as w:
+            future.set_result(w.execute(ADD_EVENT_SQL, params).lastrowid)
+        return future
+    return manager.group_writer().submit(ADD_EVENT_SQL, params)
+
+def add_event_sql(conn, classType, team, bibsType, uniformNumber, playerName, action_label, quarter,
+                  game_id=None):
+    return submit_event_sql(
+        conn, classType, team, bibsType, uniformNumber, playerName, action_label, quarter, game_id
+    ).result()
 
 def delete_event_by_id(conn, row_id: int):
-    conn.execute("DELETE FROM events WHERE id=?", (row_id,))
-    conn.commit()
+    with writing(conn) as w:
+        w.execute("DELETE FROM events WHERE id=?", (row_id,))
 
 def delete_events_by_ids(conn, ids):
     if not ids: return
     placeholders = ",".join(["?"] * len(ids))
-    conn.execute(f"DELETE FROM events WHERE id IN ({placeholders})", ids)
-    conn.commit()
+    with writing(conn) as w:
+        w.execute(f"DELETE FROM events WHERE id IN ({placeholders})", ids)
 
-def read_df_sql(conn) -> pd.DataFrame:
-    return pd.read_sql_query("""
+EVENT_SELECT = """
         SELECT class AS CLASS, team AS TEAM, bib AS ビブスType, no AS 背番号, name AS 名前,
                action AS "得点・アシスト", quarter AS クォーター, created_at, id
-        FROM events
-        ORDER BY id
-    """, conn)
+        FROM events"""
+EVENT_PAGE_SIZE = 500
+EVENT_CATEGORY_COLUMNS = ['CLASS', 'TEAM', 'ビブスType', '得点・アシスト', 'クォーター']
 
-def read_recent_df(conn, n=30) -> pd.DataFrame:
-    df = pd.read_sql_query(f"""
-        SELECT class AS CLASS, team AS TEAM, bib AS ビブスType, no AS 背番号, name AS 名前,
-               action AS "得点・アシスト", quarter AS クォーター, created_at, id
-        FROM events
-        ORDER BY id DESC
-        LIMIT {int(n)}
-    """, conn)
+def _event_filters(game_id=None, quarter=None, team=None, class_type=None):
+    # game_id=0 は試合に紐づかない（game_id が NULL の）イベント
+    where, params = [], []
+    if game_id is not None:
+        where.append("game_id IS ?"); params.append(game_id or None)
+    for col, value in (("quarter", quarter), ("team", team), ("class", class_type)):
+        if value is not None:
+            where.append(f"{col}=?"); params.append(value)
+    return where, params
+
+def typed_events_df(df: pd.DataFrame) -> pd.DataFrame:
+    # 少種類の列はカテゴリ、自由入力は文字列、日時は datetime にそろえる
+    for col in EVENT_CATEGORY_COLUMNS:
+        df[col] = df[col].astype('category')
+    for col in ['背番号', '名前']:
+        df[col] = df[col].astype('string')
+    df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
+    df['id'] = df['id'].astype('int64')
+    return df
+
+@timed()
+def read_df_sql(conn, game_id=None, quarter=None, team=None, class_type=None) -> pd.DataFrame:
+    where, params = _event_filters(game_id, quarter, team, class_type)
+    sql = EVENT_SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id"
+    return pd.read_sql_query(sql, conn, params=params)
+
+@timed()
+def read_events_page(conn, game_id=None, quarter=None, team=None, class_type=None,
+                     after_id=None, limit=EVENT_PAGE_SIZE, newest_first=False):
+    """キーセット方式で1ページ読む。(型付きDataFrame, 次ページのカーソル) を返す。
+
+    カーソルは最後の行の id で、次ページは after_id に渡す。最終ページなら None。
+    OFFSET を使わないので、シーズン分のイベントがあっても後ろのページが遅くならない。
+    """
+    where, params = _event_filters(game_id, quarter, team, class_type)
+    if after_id is not None:
+        where.append("id < ?" if newest_first else "id > ?"); params.append(int(after_id))
+    sql = (
+        EVENT_SELECT
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + (" ORDER BY id DESC" if newest_first else " ORDER BY id")
+        + " LIMIT ?"
+    )
+    df = pd.read_sql_query(sql, conn, params=params + [int(limit) + 1])
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        next_cursor = int(df['id'].iloc[-1])
+    return typed_events_df(df.reset_index(drop=True)), next_cursor
+
+def iter_event_pages(conn, limit=EVENT_PAGE_SIZE, **filters):
+    cursor = None
+    while True:
+        df, cursor = read_events_page(conn, after_id=cursor, limit=limit, **filters)
+        if not df.empty:
+            yield df
+        if cursor is None:
+            return
+
+@timed()
+def read_recent_df(conn, n=30, game_id=None) -> pd.DataFrame:
+    where, params = _event_filters(game_id)
+    sql = EVENT_SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id DESC LIMIT ?"
+    df = pd.read_sql_query(sql, conn, params=params + [int(n)])
     return df[::-1]
 
-def export_events_csv(conn):
-    df = read_df_sql(conn)
-    fname = f"events_{time.strftime('%Y%m%d_%H%M%S')}.csv"
-    csv_bytes = df.drop(columns=['id']).to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
-    return fname, csv_bytes
+EXPORT_COLUMNS = ['CLASS', 'TEAM', 'ビブスType', '背番号', '名前', '得点・アシスト', 'クォーター', 'created_at']
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
 
-def backup_sqlite(conn):
-    backups_dir = DATA_DIR / "backups"
-    backups_dir.mkdir(exist_ok=True)
-    fname = f"events_backup_{time.strftime('%Y%m%d_%H%M%S')}.db"
-    dst_path = backups_dir / fname
-    with sqlite3.connect(dst_path) as dst:
-        conn.backup(dst)
-    with open(dst_path, "rb") as f:
-        data = f.read()
-    return fname, data
-
-def wipe_all_data(conn):
-    conn.execute("BEGIN IMMEDIATE;")
-    conn.execute("DELETE FROM events;")
+def iter_events_csv(conn, game_id=None, date_from=None, date_to=None, compress=False,
+                    chunk_rows=EXPORT_CHUNK_ROWS):
+    # イベントを chunk_rows 行ずつカーソルで読み、エンコード済みのCSV（任意でgzip）を順に返す
+    where, params = _event_filters(game_id)
+    if date_from:
+        where.append("created_at >= ?"); params.append(str(date_from))
+    if date_to:
+        where.append("created_at < date(?, '+1 day')"); params.append(str(date_to))
+    sql = EVENT_SELECT + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY id"
+
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    def emit(text):
+        data = text.encode("utf-8")
+        return gz.compress(data) if gz else data
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield emit("\ufeff" + buf.getvalue())
+
+    cur = conn.execute(sql, params)
     try:
-        conn.execute("DELETE FROM sqlite_sequence WHERE name='events';")
-    except sqlite3.Error:
-        pass
-    conn.commit()
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            buf.seek(0); buf.truncate()
+            writer.writerows(row[:-1] for row in rows)   # id は出力しない
+            chunk = emit(buf.getvalue())
+            if chunk:
+                yield chunk
+    finally:
+        cur.close()
+    if gz:
+        yield gz.flush()
+
+@timed("lib_db.export_events_csv")
+def _spool_events_csv(f, conn, game_id, date_from, date_to, compress):
+    for chunk in iter_events_csv(conn, game_id, date_from, date_to, compress):
+        f.write(chunk)
+    f.seek(0)
+
+@contextmanager
+def export_events_csv(conn, game_id=None, date_from=None, date_to=None, compress=False):
+    # 小さいうちはメモリ、大きくなったら一時ファイルに書き出す。ファイルは with を抜けると閉じる:
+    #   with export_events_csv(conn) as (fname, f):
+    #       st.download_button("CSV", data=f, file_name=fname)
+    suffix = ".csv.gz" if compress else ".csv"
+    fname = f"events_{time.strftime('%Y%m%d_%H%M%S')}{suffix}"
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as f:
+        _spool_events_csv(f, conn, game_id, date_from, date_to, compress)
+        yield fname, f
+
+BACKUP_DIR = DATA_DIR / "backups"
+BACKUP_PAGES = 256          # 1ステップでコピーするページ数
+BACKUP_SLEEP = 0.005        # ステップ間で書き込み側に譲る秒数
+BACKUP_KEEP = 10            # 残す世代数
+BACKUP_MAX_RESTARTS = 3     # 他接続の書き込みでコピーがやり直しになる回数の上限
+
+_backup_lock = threading.Lock()
+_backup_scheduler = None
+
+def _database_path(conn):
+    for _, name, path in conn.execute("PRAGMA database_list").fetchall():
+        if name == "main" and path:
+            return Path(path)
+    raise sqlite3.Error("backup requires a file-backed database")
+
+class _BackupRestarted(Exception):
+    pass
+
+def _copy_database(src, dst, pages, sleep):
+    # 他の接続が書き込むと SQLite はページコピーを最初からやり直すため、
+    # 書き込みが続くと終わらない。やり直しが続いたら残りを1ステップでコピーする
+    # （WAL では読み取りスナップショットを持つだけなので書き込みは止めない）
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+    except _BackupRestarted:
+        src.backup(dst)
+    except sqlite3.Error as e:
+        if not isinstance(e.__context__, _BackupRestarted):
+            raise
+        src.backup(dst)
+
+def rotate_backups(keep=BACKUP_KEEP, prefix="events_backup_"):
+    # 古い世代から削除して keep 個だけ残す。ファイル名に日時が入っているので名前順＝時刻順
+    backups = sorted(BACKUP_DIR.glob(f"{prefix}*.db"))
+    for old in backups[:max(len(backups) - keep, 0)]:
+        for path in (old, old.with_name(old.name + "-wal"), old.with_name(old.name + "-shm")):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+@timed()
+def backup_sqlite(conn, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, keep=BACKUP_KEEP):
+    # 専用の接続から数ページずつコピーし、合間に書き込みを通す。
+    # 書きかけは .part に置き、完了してから名前を付けるので途中の世代は残らない。
+    # 戻り値は (ファイル名, パス)。ダウンロードさせる場合は呼び出し側が with open(path, "rb") で開く
+    src_path = _database_path(conn)
+    BACKUP_DIR.mkdir(exist_ok=True)
+    fname = f"events_backup_{time.strftime('%Y%m%d_%H%M%S')}.db"
+    dst_path = BACKUP_DIR / fname
+    tmp_path = dst_path.with_name(fname + ".part")
+
+    with _backup_lock:
+        src = sqlite3.connect(src_path, timeout=30)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            _copy_database(src, dst, pages, sleep)
+            dst.execute("PRAGMA journal_mode=DELETE;")   # 単体ファイルで開けるようにする
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp_path, dst_path)
+        if keep:
+            rotate_backups(keep)
+    return fname, dst_path
+
+def start_backup_scheduler(interval_sec, keep=BACKUP_KEEP):
+    # interval_sec ごとに events.db をバックアップするデーモンスレッド。プロセスに1本だけ
+    global _backup_scheduler
+    with _backup_lock:
+        if _backup_scheduler is not None and _backup_scheduler.is_alive():
+            return _backup_scheduler
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval_sec):
+                try:
+                    # 常駐スレッドなので、次の回まで接続を持ち続けずにプールへ返す
+                    with connection_manager(DB_PATH, init_events_db).connection() as conn:
+                        backup_sqlite(conn, keep=keep)
+                except (sqlite3.Error, OSError):
+                    pass
+
+        thread = threading.Thread(target=run, name="events-backup", daemon=True)
+        thread.stop = stop
+        thread.start()
+        _backup_scheduler = thread
+        return thread
+
+# アーカイブ・削除
+# 削除は ARCHIVE_CHUNK_ROWS 行ずつ別トランザクションで行い、合間に他の書き込みを通す。
+# 空いたページは VACUUM せず、バックグラウンドで incremental_vacuum により少しずつ返す。
+ARCHIVE_CHUNK_ROWS = 1000
+RECLAIM_PAGES = 512         # incremental_vacuum 1回で返すページ数
+RECLAIM_SLEEP = 0.01
+
+_reclaim_lock = threading.Lock()
+_reclaim_threads = {}
+
+def _delete_events_chunked(conn, where, params, chunk_rows, archive):
+    moved = 0
+    while True:
+        with writing(conn) as w:
+            ids = [r[0] for r in w.execute(
+                f"SELECT id FROM events WHERE {where} ORDER BY id LIMIT ?", (*params, chunk_rows))]
+            if not ids:
+                break
+            lo, hi = ids[0], ids[-1]
+            if archive:
+                w.execute(f"""
+                  INSERT OR REPLACE INTO events_archive
+                    (id, class, team, bib, no, name, action, quarter, created_at, game_id)
+                  SELECT id, class, team, bib, no, name, action, quarter, created_at, game_id
+                  FROM events WHERE {where} AND id BETWEEN ? AND ?
+                """, (*params, lo, hi))
+            w.execute(f"DELETE FROM events WHERE {where} AND id BETWEEN ? AND ?", (*params, lo, hi))
+        moved += len(ids)
+    return moved
+
+@timed()
+def archive_game_events(conn, game_id, chunk_rows=ARCHIVE_CHUNK_ROWS, archive=True):
+    """試合のイベントを events_archive へ移して events から消す。移した件数を返す。
+
+    archive=False なら移さずに消すだけ。空き領域の回収はバックグラウンドで行う。
+    """
+    where, params = _event_filters(game_id)
+    if not where:
+        where, params = ["game_id IS NULL"], []
+    moved = _delete_events_chunked(conn, where[0], params, chunk_rows, archive)
+    if moved:
+        reclaim_space_async(conn)
+    return moved
+
+@timed()
+def wipe_all_data(conn, chunk_rows=ARCHIVE_CHUNK_ROWS):
+    _delete_events_chunked(conn, "1", (), chunk_rows, archive=False)
+    with writing(conn) as w:
+        try:
+            w.execute("DELETE FROM sqlite_sequence WHERE name='events';")
+        except sqlite3.Error:
+            pass
+    reclaim_space_async(conn)
+
+def convert_auto_vacuum(path):
+    # auto_vacuum=NONE で作られた既存DBを INCREMENTAL に切り替える（全体を書き直す VACUUM）。
+    # 運用中は実行せず、アプリを止めた状態で python maintenance.py auto-vacuum から使う
+    conn = sqlite3.connect(path, timeout=30)
     try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
         conn.execute("VACUUM;")
-    except sqlite3.Error:
-        pass
-
-def get_score_red_blue(conn):
-    df = read_df_sql(conn)
-    if df.empty: return (0, 0)
-    score_df = df[df['得点・アシスト'].isin(POINT_MAP.keys())].copy()
-    if score_df.empty: return (0, 0)
-    score_df['得点'] = score_df['得点・アシスト'].map(POINT_MAP)
-    gp = score_df.groupby('TEAM', as_index=False)['得点'].sum()
-    red = int(gp.loc[gp['TEAM']=='Red',  '得点'].sum()) if 'Red'  in gp['TEAM'].values else 0
-    blue= int(gp.loc[gp['TEAM']=='Blue', '得点'].sum()) if 'Blue' in gp['TEAM'].values else 0
-    return (red, blue)
+        return True
+    finally:
+        conn.close()
+
+def reclaim_space(conn, pages=RECLAIM_PAGES, sleep=RECLAIM_SLEEP):
+    # 空きページを pages ずつ返す。auto_vacuum=INCREMENTAL でないDBでは何もしない
+    # （切り替えは convert_auto_vacuum で運用外に行う）
+    with writing(conn) as w:
+        mode = w.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        return
+    while True:
+        with writing(conn) as w:
+            if not w.execute("PRAGMA freelist_count").fetchone()[0]:
+                break
+            w.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        time.sleep(sleep)
+
+def reclaim_space_async(conn):
+    # 管理下の接続ならDBごとに1本のスレッドで回収する。それ以外はこの場で回収する
+    manager = getattr(conn, "manager", None)
+    if manager is None:
+        reclaim_space(conn)
+        return None
+    with _reclaim_lock:
+        thread = _reclaim_threads.get(manager.path)
+        if thread is not None and thread.is_alive():
+            return thread
+
+        def run():
+            try:
+                reclaim_space(conn)
+            except sqlite3.Error:
+                pass
+
+        thread = threading.Thread(target=run, name="sqlite-reclaim", daemon=True)
+        _reclaim_threads[manager.path] = thread
+        thread.start()
+        return thread
+
+@timed()
+def get_score_red_blue(conn, game_id=None):
+    # event_team_totals（トリガーで維持）を読むだけ。game_id 省略時は全試合の合計
+    if game_id is None:
+        rows = conn.execute(
+            "SELECT team, SUM(points) FROM event_team_totals WHERE team IN ('Red','Blue') GROUP BY team"
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT team, points FROM event_team_totals WHERE game_id=? AND team IN ('Red','Blue')", (game_id,)
+        ).fetchall()
+    totals = {team: int(points or 0) for team, points in rows}
+    return (totals.get('Red', 0), totals.get('Blue', 0))
+
+# 試合・スコアシート
+LEGACY_SCORES_IMPORTED = "legacy_scores_imported"
+
+def get_meta(conn, key: str, default=None):
+    row = conn.execute("SELECT value FROM app_meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_meta(conn, key: str, value: str):
+    with writing(conn) as w:
+        w.execute(
+            "INSERT INTO app_meta(key, value) VALUES (?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, value),
+        )
+
+def ensure_active_game(conn, load_legacy_scores=None) -> int:
+    """進行中の試合の id を返す（試合が1つも無ければ作る）。
+
+    load_legacy_scores を渡すと、初回だけ旧保存形式（score_sheet_data.json）の
+    セル辞書を読み、得点があれば新しい試合として取り込む。済み印は app_meta に残すので、
+    リセットなどで score_cells が空になっても取り込み直さない。読み込みが例外を
+    投げた場合は何も書かずにそのまま送出する（次回また取り込みを試みる）。
+    """
+    games = list_games(conn)
+    pending = load_legacy_scores is not None and get_meta(conn, LEGACY_SCORES_IMPORTED) is None
+    if games and not pending:
+        active = [g for g in games if g[2] == "active"]
+        return (active or games)[0][0]
+
+    with writing(conn) as w:
+        if pending and get_meta(w, LEGACY_SCORES_IMPORTED) is None:
+            scores = load_legacy_scores()
+            set_meta(w, LEGACY_SCORES_IMPORTED, "1")
+            if any(cell.get("mark") for cell in scores.values()):
+                game_id = create_game(w, f"試合 {len(list_games(w)) + 1}")
+                import_score_cells(w, game_id, scores)
+                return game_id
+        games = list_games(w)
+        if not games:
+            return create_game(w, "試合 1")
+    active = [g for g in games if g[2] == "active"]
+    return (active or games)[0][0]
+
+def create_game(conn, name: str) -> int:
+    with writing(conn) as w:
+        cur = w.execute("INSERT INTO games(name) VALUES (?)", (name,))
+    return cur.lastrowid
+
+@timed()
+def list_games(conn, status=None):
+    if status:
+        return conn.execute(
+            "SELECT id, name, status, started_at, ended_at FROM games WHERE status=? ORDER BY id DESC", (status,)
+        ).fetchall()
+    return conn.execute("SELECT id, name, status, started_at, ended_at FROM games ORDER BY id DESC").fetchall()
+
+def end_game(conn, game_id: int):
+    with writing(conn) as w:
+        w.execute(
+            "UPDATE games SET status='ended', ended_at=datetime('now','localtime') WHERE id=?", (game_id,)
+        )
+
+@timed()
+def upsert_score_cell(conn, game_id: int, team: str, score_no: int, mark: str, class_type: str, number: str):
+    """1セルを保存し、保存後の score_versions の版数を返す（何も変わらなかったときは None）。
+
+    版数はトリガーで1行の変更ごとに1つ進むので、呼び出し側が持っている版数の
+    ちょうど1つ先なら、間に他のセッションの保存は挟まっていない。
+    """
+    # 空セルは行を持たない（クリア＝削除）
+    with writing(conn) as w:
+        if not mark and not number:
+            cur = w.execute(
+                "DELETE FROM score_cells WHERE game_id=? AND team=? AND score_no=?", (game_id, team, score_no)
+            )
+        else:
+            cur = w.execute("""
+                INSERT INTO score_cells(game_id, team, score_no, mark, class, number)
+                VALUES (?,?,?,?,?,?)
+                ON CONFLICT(game_id, team, score_no) DO UPDATE SET
+                  mark=excluded.mark, class=excluded.class, number=excluded.number,
+                  updated_at=datetime('now','localtime')
+            """, (game_id, team, score_no, mark, class_type, number))
+        if cur.rowcount < 1:
+            return None
+        return get_score_version(w, game_id)
+
+@timed()
+def load_score_cells(conn, game_id: int) -> dict:
+    rows = conn.execute(
+        "SELECT team, score_no, mark, class, number FROM score_cells WHERE game_id=?", (game_id,)
+    ).fetchall()
+    return {f"{team}_{no}": {"mark": mark, "class": cls, "number": number} for team, no, mark, cls, number in rows}
+
+@timed()
+def read_score_cells_frame(conn, game_id: int, scored_only: bool = True) -> pd.DataFrame:
+    # 列指向で読み込む（lib_score.build_events_frame にそのまま渡せる形）
+    where = " AND mark IN ('1点','2点','3点')" if scored_only else ""
+    return pd.read_sql_query(
+        f"""
+        SELECT team, score_no, mark, class, number
+        FROM score_cells
+        WHERE game_id=?{where}
+        ORDER BY score_no, team
+        """,
+        conn,
+        params=(game_id,),
+    )
+
+def import_score_cells(conn, game_id: int, scores: dict):
+    rows = []
+    for key, cell in scores.items():
+        team, _, score_no = key.partition("_")
+        if team not in ("A", "B") or not score_no.isdigit():
+            continue
+        if not cell.get("mark") and not cell.get("number"):
+            continue
+        rows.append((
+            game_id, team, int(score_no),
+            cell.get("mark", ""), cell.get("class", "初級"), str(cell.get("number", "")).strip(),
+        ))
+    with writing(conn) as w:
+        w.executemany("""
+            INSERT OR REPLACE INTO score_cells(game_id, team, score_no, mark, class, number)
+            VALUES (?,?,?,?,?,?)
+        """, rows)
+    return len(rows)
+
+def get_score_version(conn, game_id: int) -> int:
+    row = conn.execute("SELECT version FROM score_versions WHERE game_id=?", (game_id,)).fetchone()
+    return int(row[0]) if row else 0
+
+def clear_score_cells(conn, game_id: int):
+    with writing(conn) as w:
+        w.execute("DELETE FROM score_cells WHERE game_id=?", (game_id,))
 
 # スマホ向け UI 拡張
+@timed()
 def inject_mobile_big_ui():
     st.markdown("""
     <style>
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+# 定数
+DEFAULT_COMPACT_EVERY = 200
+
+
+# =========================
+# スナップショット＋追記ログ
+# =========================
+class Journal:
+    """JSONスナップショットと、1行1レコードの追記ログの組。
+
+    - append() はログ末尾に1行追記して fsync するだけなので、全体を書き直さない。
+    - read() はスナップショットとログを返す。書き込み途中で落ちた最終行は捨てて切り詰める。
+    - write_snapshot() は一時ファイル経由で置き換えてからログを空にする。
+      置き換え直後に落ちてもログを再適用するだけなので、レコードは
+      「何度適用しても同じ結果になる」形（セルの最終値など）にしておくこと。
+    """
+
+    def __init__(self, snapshot_path, log_path, compact_every=DEFAULT_COMPACT_EVERY):
+        self.snapshot_path = Path(snapshot_path)
+        self.log_path = Path(log_path)
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self._log_records = None
+
+    def read(self):
+        with self.lock:
+            snapshot = None
+            if self.snapshot_path.exists():
+                with self.snapshot_path.open("r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            records = self._read_log()
+            self._log_records = len(records)
+            return snapshot, records
+
+    def _read_log(self):
+        if not self.log_path.exists():
+            return []
+
+        records = []
+        good_size = 0
+        with self.log_path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                good_size += len(line)
+
+        if good_size != self.log_path.stat().st_size:
+            # 書き込み途中の行を切り落とし、次の追記が壊れた行に続かないようにする
+            with self.log_path.open("r+b") as f:
+                f.truncate(good_size)
+        return records
+
+    def append(self, record):
+        """1レコード追記する。コンパクションの目安を超えたら True を返す。"""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self.lock:
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode("utf-8"))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            if self._log_records is None:
+                self._log_records = len(self._read_log())
+            else:
+                self._log_records += 1
+            return self._log_records >= self.compact_every
+
+    def write_snapshot(self, data, indent=2):
+        with self.lock:
+            tmp_path = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if self.log_path.exists():
+                with self.log_path.open("r+b") as f:
+                    f.truncate(0)
+                    os.fsync(f.fileno())
+            self._log_records = 0
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(snapshot_path, log_path=None, compact_every=DEFAULT_COMPACT_EVERY):
+    """同じファイルに対しては、プロセス内で同じ Journal（＝同じロック）を返す。"""
+    snapshot_path = Path(snapshot_path).resolve()
+    log_path = Path(log_path).resolve() if log_path else snapshot_path.with_suffix(".log")
+    with _journals_lock:
+        journal = _journals.get(snapshot_path)
+        if journal is None:
+            journal = Journal(snapshot_path, log_path, compact_every)
+            _journals[snapshot_path] = journal
+        return journal
@@ -0,0 +1,390 @@
+import sqlite3
+from datetime import date
+
+import pandas as pd
+
+from lib_db import connection_manager, writing
+from lib_score import build_events_frame
+
+# 定数
+LEAGUE_DB_PATH = "league_stats.db"
+MIXED_CLASS = "混合"      # 複数のCLASSが混ざった試合の matches.class_type
+UNKNOWN_PLAYER = "未登録選手"
+
+
+# =========================
+# 接続・スキーマ
+# =========================
+# teams / players / matches / player_match_stats は既存のスキーマのまま使い、
+# シーズン集計用のサマリー表（team_season / player_season / head_to_head）を
+# トリガーで差分更新する。画面側は試合数が増えても明細を集計し直さない。
+def get_league_conn() -> sqlite3.Connection:
+    return connection_manager(LEAGUE_DB_PATH, init_league_db).get()
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def init_league_db(conn):
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS teams (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+      )
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS players (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_id INTEGER NOT NULL,
+        uniform_number TEXT NOT NULL,
+        player_name TEXT NOT NULL,
+        class_type TEXT NOT NULL DEFAULT '',
+        FOREIGN KEY(team_id) REFERENCES teams(id),
+        UNIQUE(team_id, class_type, uniform_number)
+      )
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS matches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_date TEXT NOT NULL,
+        class_type TEXT NOT NULL,
+        team_a_id INTEGER NOT NULL,
+        team_b_id INTEGER NOT NULL,
+        score_a INTEGER NOT NULL,
+        score_b INTEGER NOT NULL,
+        FOREIGN KEY(team_a_id) REFERENCES teams(id),
+        FOREIGN KEY(team_b_id) REFERENCES teams(id)
+      )
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS player_match_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id INTEGER NOT NULL,
+        player_id INTEGER NOT NULL,
+        team_id INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        FOREIGN KEY(match_id) REFERENCES matches(id),
+        FOREIGN KEY(player_id) REFERENCES players(id),
+        FOREIGN KEY(team_id) REFERENCES teams(id)
+      )
+    """)
+
+    # 元の試合（events.db の games.id）と、選手ごとのCLASSを持たせる
+    if "game_id" not in _columns(conn, "matches"):
+        conn.execute("ALTER TABLE matches ADD COLUMN game_id INTEGER")
+    if "class_type" not in _columns(conn, "player_match_stats"):
+        conn.execute("ALTER TABLE player_match_stats ADD COLUMN class_type TEXT NOT NULL DEFAULT ''")
+        conn.execute("""
+          UPDATE player_match_stats
+          SET class_type = (SELECT m.class_type FROM matches m WHERE m.id = player_match_stats.match_id)
+          WHERE class_type = ''
+        """)
+    players_migrated = _migrate_players_class(conn)
+
+    # 明細側の索引（試合単位の削除・対戦成績・選手の試合一覧を索引だけで引く）
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_game ON matches(game_id) WHERE game_id IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_date ON matches(match_date, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_pair ON matches(team_a_id, team_b_id, score_a, score_b)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pms_match ON player_match_stats(match_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pms_player ON player_match_stats(player_id, class_type, match_id, points)")
+
+    # サマリー表
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS team_season (
+        team_id INTEGER PRIMARY KEY,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        draws INTEGER NOT NULL DEFAULT 0,
+        points_for INTEGER NOT NULL DEFAULT 0,
+        points_against INTEGER NOT NULL DEFAULT 0
+      )
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS head_to_head (
+        team_id INTEGER NOT NULL,
+        opponent_id INTEGER NOT NULL,
+        games INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        draws INTEGER NOT NULL DEFAULT 0,
+        points_for INTEGER NOT NULL DEFAULT 0,
+        points_against INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (team_id, opponent_id)
+      ) WITHOUT ROWID
+    """)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS player_season (
+        player_id INTEGER NOT NULL,
+        class_type TEXT NOT NULL,
+        team_id INTEGER NOT NULL,
+        games INTEGER NOT NULL DEFAULT 0,
+        points INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (player_id, class_type)
+      ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_player_season_leaders ON player_season(class_type, points DESC, games, player_id, team_id)")
+
+    _create_summary_triggers(conn)
+    if players_migrated or _summaries_missing(conn):
+        rebuild_summaries(conn)
+    conn.commit()
+
+def _migrate_players_class(conn):
+    """players の一意キーを (チーム, 背番号) から (チーム, CLASS, 背番号) に移す。
+
+    背番号はCLASSごとに振られるので、旧キーでは別CLASSの選手が1人にまとめられていた。
+    元の id はその選手の最初のCLASSに引き継ぎ、他のCLASSの得点は別の選手として付け替える。
+    移行した場合は True（呼び出し側でサマリー表を作り直す）。
+    """
+    if "class_type" in _columns(conn, "players"):
+        return False
+    conn.execute("""
+      CREATE TABLE players_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_id INTEGER NOT NULL,
+        uniform_number TEXT NOT NULL,
+        player_name TEXT NOT NULL,
+        class_type TEXT NOT NULL DEFAULT '',
+        FOREIGN KEY(team_id) REFERENCES teams(id),
+        UNIQUE(team_id, class_type, uniform_number)
+      )
+    """)
+    first_class = "(SELECT MIN(s.class_type) FROM player_match_stats s WHERE s.player_id = p.id)"
+    conn.execute(f"""
+      INSERT INTO players_new(id, team_id, uniform_number, player_name, class_type)
+      SELECT p.id, p.team_id, p.uniform_number, p.player_name, COALESCE({first_class}, '')
+      FROM players p
+    """)
+    conn.execute(f"""
+      INSERT INTO players_new(team_id, uniform_number, player_name, class_type)
+      SELECT DISTINCT p.team_id, p.uniform_number, p.player_name, s.class_type
+      FROM player_match_stats s
+      JOIN players p ON p.id = s.player_id
+      WHERE s.class_type > {first_class}
+    """)
+    conn.execute("""
+      UPDATE player_match_stats SET player_id = (
+        SELECT n.id
+        FROM players p
+        JOIN players_new n
+          ON n.team_id = p.team_id AND n.uniform_number = p.uniform_number
+         AND n.class_type = player_match_stats.class_type
+        WHERE p.id = player_match_stats.player_id
+      )
+    """)
+    conn.execute("DROP TABLE players")
+    conn.execute("ALTER TABLE players_new RENAME TO players")
+    return True
+
+def _create_summary_triggers(conn):
+    # 1試合を両チームの側から見た (自チーム, 相手, 得点, 失点) で加減算する
+    sides = (("team_a_id", "team_b_id", "score_a", "score_b"), ("team_b_id", "team_a_id", "score_b", "score_a"))
+    for event, row, sign in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-")):
+        body = []
+        for team, opp, pf, pa in sides:
+            win = f"({row}.{pf} > {row}.{pa})"
+            loss = f"({row}.{pf} < {row}.{pa})"
+            draw = f"({row}.{pf} = {row}.{pa})"
+            body.append(f"""
+            INSERT INTO team_season(team_id, games, wins, losses, draws, points_for, points_against)
+              VALUES ({row}.{team}, {sign}1, {sign}{win}, {sign}{loss}, {sign}{draw}, {sign}{row}.{pf}, {sign}{row}.{pa})
+              ON CONFLICT(team_id) DO UPDATE SET
+                games = games + excluded.games, wins = wins + excluded.wins,
+                losses = losses + excluded.losses, draws = draws + excluded.draws,
+                points_for = points_for + excluded.points_for,
+                points_against = points_against + excluded.points_against;
+            INSERT INTO head_to_head(team_id, opponent_id, games, wins, losses, draws, points_for, points_against)
+              VALUES ({row}.{team}, {row}.{opp}, {sign}1, {sign}{win}, {sign}{loss}, {sign}{draw}, {sign}{row}.{pf}, {sign}{row}.{pa})
+              ON CONFLICT(team_id, opponent_id) DO UPDATE SET
+                games = games + excluded.games, wins = wins + excluded.wins,
+                losses = losses + excluded.losses, draws = draws + excluded.draws,
+                points_for = points_for + excluded.points_for,
+                points_against = points_against + excluded.points_against;""")
+        conn.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_matches_{event.lower()} AFTER {event} ON matches
+          BEGIN{"".join(body)}
+          END
+        """)
+        conn.execute(f"""
+          CREATE TRIGGER IF NOT EXISTS trg_pms_{event.lower()} AFTER {event} ON player_match_stats
+          BEGIN
+            INSERT INTO player_season(player_id, class_type, team_id, games, points)
+              VALUES ({row}.player_id, {row}.class_type, {row}.team_id, {sign}1, {sign}{row}.points)
+              ON CONFLICT(player_id, class_type) DO UPDATE SET
+                games = games + excluded.games, points = points + excluded.points;
+          END
+        """)
+
+def _summaries_missing(conn):
+    has_matches = conn.execute("SELECT EXISTS(SELECT 1 FROM matches)").fetchone()[0]
+    has_summary = conn.execute("SELECT EXISTS(SELECT 1 FROM team_season)").fetchone()[0]
+    return bool(has_matches) and not has_summary
+
+def rebuild_summaries(conn):
+    """サマリー表を明細から作り直す（初回移行・不整合時のみ）。"""
+    conn.execute("DELETE FROM team_season")
+    conn.execute("DELETE FROM head_to_head")
+    conn.execute("DELETE FROM player_season")
+    sides = """
+        SELECT team_a_id AS team_id, team_b_id AS opponent_id, score_a AS pf, score_b AS pa FROM matches
+        UNION ALL
+        SELECT team_b_id, team_a_id, score_b, score_a FROM matches
+    """
+    conn.execute(f"""
+        INSERT INTO team_season(team_id, games, wins, losses, draws, points_for, points_against)
+        SELECT team_id, COUNT(*), SUM(pf > pa), SUM(pf < pa), SUM(pf = pa), SUM(pf), SUM(pa)
+        FROM ({sides}) GROUP BY team_id
+    """)
+    conn.execute(f"""
+        INSERT INTO head_to_head(team_id, opponent_id, games, wins, losses, draws, points_for, points_against)
+        SELECT team_id, opponent_id, COUNT(*), SUM(pf > pa), SUM(pf < pa), SUM(pf = pa), SUM(pf), SUM(pa)
+        FROM ({sides}) GROUP BY team_id, opponent_id
+    """)
+    conn.execute("""
+        INSERT INTO player_season(player_id, class_type, team_id, games, points)
+        SELECT player_id, class_type, MIN(team_id), COUNT(*), SUM(points)
+        FROM player_match_stats GROUP BY player_id, class_type
+    """)
+
+
+# =========================
+# 試合の取り込み
+# =========================
+def get_or_create_team(conn, name: str) -> int:
+    row = conn.execute("SELECT id FROM teams WHERE name=?", (name,)).fetchone()
+    if row:
+        return row[0]
+    return conn.execute("INSERT INTO teams(name) VALUES (?)", (name,)).lastrowid
+
+def archive_score_sheet(conn, game_id: int, team_a_name: str, team_b_name: str,
+                        cells: pd.DataFrame, player_index=None, match_date=None) -> int:
+    """終了したスコアシートを1試合として記録する。
+
+    cells は lib_db.read_score_cells_frame() の結果。同じ game_id を再度取り込んだ場合は
+    前回の記録を消してから入れ直す（サマリー表はトリガーで差し引きされる）。
+    選手は (チーム, CLASS, 背番号) 単位で、背番号が空の得点はチーム得点にだけ数える。
+    """
+    events = build_events_frame(cells)
+    score_a = int(events.loc[events["列"] == "A", "得点"].sum()) if not events.empty else 0
+    score_b = int(events.loc[events["列"] == "B", "得点"].sum()) if not events.empty else 0
+    classes = sorted(set(events["CLASS"])) if not events.empty else []
+    class_type = classes[0] if len(classes) == 1 else MIXED_CLASS
+
+    player_points = (
+        events[events["背番号"] != ""]
+        .groupby(["列", "TEAM", "CLASS", "背番号"], as_index=False)["得点"].sum()
+        if not events.empty else pd.DataFrame(columns=["列", "TEAM", "CLASS", "背番号", "得点"])
+    )
+    names = {}
+    if player_index is not None and len(player_index) and not player_points.empty:
+        pos = player_index.positions(player_points["背番号"], player_points["CLASS"], player_points["TEAM"])
+        names = {i: player_index.names[p] for i, p in enumerate(pos) if p >= 0 and player_index.names[p]}
+
+    with writing(conn) as conn:
+        old = conn.execute("SELECT id FROM matches WHERE game_id=?", (game_id,)).fetchone()
+        if old:
+            conn.execute("DELETE FROM player_match_stats WHERE match_id=?", (old[0],))
+            conn.execute("DELETE FROM matches WHERE id=?", (old[0],))
+
+        team_ids = {"A": get_or_create_team(conn, team_a_name), "B": get_or_create_team(conn, team_b_name)}
+        cur = conn.execute(
+            """
+            INSERT INTO matches(match_date, class_type, team_a_id, team_b_id, score_a, score_b, game_id)
+            VALUES (?,?,?,?,?,?,?)
+            """,
+            (match_date or date.today().isoformat(), class_type, team_ids["A"], team_ids["B"], score_a, score_b, game_id),
+        )
+        match_id = cur.lastrowid
+
+        rows = list(player_points.itertuples(index=False, name=None))
+        conn.executemany(
+            """
+            INSERT INTO players(team_id, class_type, uniform_number, player_name) VALUES (?,?,?,?)
+            ON CONFLICT(team_id, class_type, uniform_number) DO UPDATE SET player_name = excluded.player_name
+              WHERE players.player_name = ? AND excluded.player_name != ?
+            """,
+            [
+                (team_ids[col], class_type_, number, names.get(i, UNKNOWN_PLAYER), UNKNOWN_PLAYER, UNKNOWN_PLAYER)
+                for i, (col, _, class_type_, number, _) in enumerate(rows)
+            ],
+        )
+        player_ids = dict(
+            ((team_id, class_type_, number), player_id)
+            for player_id, team_id, class_type_, number in conn.execute(
+                "SELECT id, team_id, class_type, uniform_number FROM players WHERE team_id IN (?,?)",
+                (team_ids["A"], team_ids["B"]),
+            )
+        )
+        conn.executemany(
+            "INSERT INTO player_match_stats(match_id, player_id, team_id, points, class_type) VALUES (?,?,?,?,?)",
+            [
+                (match_id, player_ids[(team_ids[col], class_type_, number)], team_ids[col], int(points), class_type_)
+                for col, _, class_type_, number, points in rows
+            ],
+        )
+    return match_id
+
+
+# =========================
+# シーズン集計（サマリー表だけを読む）
+# =========================
+def read_team_names(conn) -> list:
+    """試合記録のあるチーム名（対戦成績の選択肢）。"""
+    return [name for (name,) in conn.execute("""
+        SELECT t.name FROM team_season s JOIN teams t ON t.id = s.team_id
+        WHERE s.games > 0 ORDER BY t.name
+    """)]
+
+def read_standings(conn) -> pd.DataFrame:
+    return pd.read_sql_query("""
+        SELECT t.name AS チーム, s.games AS 試合, s.wins AS 勝, s.losses AS 敗, s.draws AS 分,
+               s.points_for AS 得点, s.points_against AS 失点,
+               s.points_for - s.points_against AS 得失点差,
+               ROUND(CAST(s.points_for AS REAL) / s.games, 1) AS 平均得点
+        FROM team_season s
+        JOIN teams t ON t.id = s.team_id
+        WHERE s.games > 0
+        ORDER BY s.wins DESC, 得失点差 DESC, s.points_for DESC, t.name
+    """, conn)
+
+def read_player_points_per_game(conn, min_games: int = 1) -> pd.DataFrame:
+    return pd.read_sql_query("""
+        SELECT t.name AS チーム, ps.class_type AS CLASS, p.uniform_number AS 背番号, p.player_name AS 名前,
+               ps.games AS 試合, ps.points AS 得点,
+               ROUND(CAST(ps.points AS REAL) / ps.games, 2) AS 平均得点
+        FROM player_season ps
+        JOIN players p ON p.id = ps.player_id
+        JOIN teams t ON t.id = ps.team_id
+        WHERE ps.games >= ?
+        ORDER BY 平均得点 DESC, ps.points DESC
+    """, conn, params=(min_games,))
+
+def read_class_leaders(conn, class_type=None, limit: int = 5) -> pd.DataFrame:
+    """CLASSごとの得点上位。class_type を指定するとそのCLASSだけ。"""
+    where = "WHERE class_type = ?" if class_type else ""
+    params = (class_type, limit) if class_type else (limit,)
+    return pd.read_sql_query(f"""
+        SELECT r.class_type AS CLASS, r.順位, t.name AS チーム, p.uniform_number AS 背番号,
+               p.player_name AS 名前, r.games AS 試合, r.points AS 得点
+        FROM (
+            SELECT player_id, team_id, class_type, games, points,
+                   RANK() OVER (PARTITION BY class_type ORDER BY points DESC) AS 順位
+            FROM player_season
+            {where}
+        ) r
+        JOIN players p ON p.id = r.player_id
+        JOIN teams t ON t.id = r.team_id
+        WHERE r.順位 <= ? AND r.points > 0
+        ORDER BY r.class_type, r.順位, p.uniform_number
+    """, conn, params=params)
+
+def read_head_to_head(conn, team_name: str, opponent_name: str) -> dict:
+    row = conn.execute("""
+        SELECT h.games, h.wins, h.losses, h.draws, h.points_for, h.points_against
+        FROM head_to_head h
+        JOIN teams t ON t.id = h.team_id
+        JOIN teams o ON o.id = h.opponent_id
+        WHERE t.name = ? AND o.name = ?
+    """, (team_name, opponent_name)).fetchone()
+    keys = ("games", "wins", "losses", "draws", "points_for", "points_against")
+    return dict(zip(keys, row or (0,) * len(keys)))
@@ -0,0 +1,153 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# 定数
+PERF_ENV = "SCORE_SHEET_PERF"       # 1 / true / on で起動時から計測する
+SAMPLE_LIMIT = 1000                 # 関数ごとに保持する直近の計測数
+
+
+# =========================
+# 計測（オプトイン）
+# =========================
+# 無効時は timed() の包み関数がフラグを1回見るだけで元の関数を呼ぶ。
+# 有効時は呼び出しごとの所要時間を関数名ごとに直近 SAMPLE_LIMIT 件まで保持し、
+# 全セッション共通（プロセス内）で p50 / p95 を集計する。
+_enabled = os.environ.get(PERF_ENV, "").strip().lower() in ("1", "true", "on", "yes")
+_lock = threading.Lock()
+_samples = {}       # name -> deque[秒]
+_counts = {}        # name -> (呼び出し回数, 合計秒)
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled):
+    """管理画面のトグル用。プロセス全体で切り替わる。"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def record(name, seconds):
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=SAMPLE_LIMIT)
+        samples.append(seconds)
+        count, total = _counts.get(name, (0, 0.0))
+        _counts[name] = (count + 1, total + seconds)
+
+
+@contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """with span("main.click_detector"): ... の区間を計測する。無効時は何もしない。"""
+    return _span(name) if _enabled else _NO_SPAN
+
+
+def timed(name=None):
+    """関数の所要時間を計測するデコレーター。名前を省略すると module.関数名
+    （ページスクリプトはモジュール名が __main__ なのでファイル名を使う）。
+
+    st.cache_data などのキャッシュ付き関数には付けず、それを呼ぶ側に付ける
+    （包むと .clear() などの属性が見えなくなるため）。
+    """
+    def decorate(func):
+        module = func.__module__
+        if module == "__main__":
+            module = Path(func.__code__.co_filename).stem
+        label = name or f"{module}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def rerun_start():
+    """ページスクリプト全体の計測開始。無効時は None。"""
+    return time.perf_counter() if _enabled else None
+
+
+def rerun_end(page, started):
+    if started is not None:
+        record(f"rerun.{page}", time.perf_counter() - started)
+
+
+# =========================
+# 集計・出力
+# =========================
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def perf_stats():
+    """関数ごとの集計（p50 / p95 / 最大は直近 SAMPLE_LIMIT 件から）。遅い順。"""
+    with _lock:
+        snapshot = {name: (sorted(samples), _counts[name]) for name, samples in _samples.items()}
+
+    rows = []
+    for name, (values, (count, total)) in snapshot.items():
+        rows.append({
+            "name": name,
+            "count": count,
+            "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+            "total_ms": round(total * 1000, 1),
+        })
+    rows.sort(key=lambda r: r["p95_ms"], reverse=True)
+    return rows
+
+
+def perf_json():
+    return json.dumps({
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "enabled": _enabled,
+        "sample_limit": SAMPLE_LIMIT,
+        "stats": perf_stats(),
+    }, ensure_ascii=False, indent=2)
+
+
+def reset_perf():
+    with _lock:
+        _samples.clear()
+        _counts.clear()
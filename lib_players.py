@@ -0,0 +1,439 @@
+import csv
+import io
+import json
+import os
+import threading
+from bisect import bisect_left
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+from lib_db import connection_manager, writing
+from lib_journal import get_journal
+from lib_score import PlayerIndex
+
+# 定数
+PLAYERS_DB_PATH = "players.db"
+PLAYER_FIELDS = ["uniform_number", "player_name", "team", "bibs_type", "class_type"]
+IMPORT_BATCH_SIZE = 1000
+ROSTER_COMPACT_EVERY = 200
+JSON_READ_CHUNK = 64 * 1024
+
+# 名簿ファイルの見出し（旧 players.csv 形式の日本語見出しも受け付ける）
+COLUMN_ALIASES = {
+    "背番号": "uniform_number",
+    "プレイヤー名": "player_name",
+    "名前": "player_name",
+    "TEAM": "team",
+    "チーム": "team",
+    "ビブスType": "bibs_type",
+    "CLASS": "class_type",
+}
+
+
+# =========================
+# 選手名簿サービス（players.db）
+# =========================
+# main・集計・選手登録の各画面はここから名簿を引く。
+# 読み込みは players.db の更新時刻か invalidate_roster() で世代が変わったときだけで、
+# 再実行のたびに全件を読み直さない。
+class Roster:
+    """読み込み済みの名簿（変更しない）。"""
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.index = PlayerIndex(df)
+        self._by_id = {}
+        self._by_key = {}
+        for row in df.to_dict(orient="records"):
+            self._by_id[row["id"]] = row
+            key = (str(row["team"]).strip(), str(row["class_type"]).strip(), str(row["uniform_number"]).strip())
+            self._by_key.setdefault(key, row)    # 同じキーは先に登録された選手
+
+        # 背番号の前方一致用：(チーム, CLASS) ごとに背番号の文字列順で整列した一覧
+        groups = {}
+        for (team, class_type, number), row in self._by_key.items():
+            groups.setdefault((team, class_type), []).append((number, row))
+        self._prefix = {}
+        for group, items in groups.items():
+            items.sort(key=lambda item: item[0])
+            self._prefix[group] = ([number for number, _ in items], [row for _, row in items])
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, player_id):
+        return self._by_id.get(player_id)
+
+    def find(self, team, class_type, uniform_number):
+        """(チーム, CLASS, 背番号) の選手。チームは Red / Blue。"""
+        return self._by_key.get((str(team).strip(), str(class_type).strip(), str(uniform_number).strip()))
+
+    def suggest(self, team, class_type, prefix="", limit=6):
+        """(チーム, CLASS) の選手のうち、背番号が prefix で始まる選手を背番号順に返す。
+
+        前方一致の範囲は文字列順の一覧から二分探索で切り出し、その範囲だけを
+        数値の背番号順（2 → 10 → 23、数字以外は後ろ）に並べ替えて先頭 limit 件を返す。
+        """
+        numbers, rows = self._prefix.get((str(team).strip(), str(class_type).strip()), ([], []))
+        prefix = str(prefix).strip()
+        start = bisect_left(numbers, prefix)
+        # prefix で始まる文字列は [prefix, 末尾の1文字を1つ進めた文字列) の範囲に並ぶ
+        end = bisect_left(numbers, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start) if prefix else len(numbers)
+        found = sorted(rows[start:end], key=lambda row: _number_order(row["uniform_number"]))
+        return found[:limit]
+
+
+def _number_order(number):
+    number = str(number).strip()
+    return (0, int(number), number) if number.isdigit() else (1, 0, number)
+
+
+_roster = None
+_roster_generation = 0
+_roster_lock = threading.Lock()
+
+
+def init_players_db(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uniform_number TEXT NOT NULL,
+            player_name TEXT NOT NULL,
+            team TEXT NOT NULL,
+            bibs_type TEXT NOT NULL,
+            class_type TEXT NOT NULL,
+            UNIQUE(uniform_number, player_name, team, bibs_type, class_type)
+        );
+        """
+    )
+
+
+def get_players_conn(db_path=PLAYERS_DB_PATH):
+    return connection_manager(db_path, init_players_db).get()
+
+
+def _db_stamp(db_path):
+    # WALモードでは書き込みが -wal 側に入るので、両方の更新時刻とサイズを見る
+    stamp = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def read_players_db(db_path=PLAYERS_DB_PATH):
+    columns = ["id"] + PLAYER_FIELDS
+    return pd.read_sql_query(
+        f"SELECT {', '.join(columns)} FROM players ORDER BY id",
+        get_players_conn(db_path),
+    )
+
+
+def roster_version(db_path=PLAYERS_DB_PATH):
+    """名簿のバージョン。集計キャッシュなどのキーに使う。"""
+    return (_roster_generation, _db_stamp(db_path))
+
+
+def get_roster(db_path=PLAYERS_DB_PATH):
+    global _roster
+    version = roster_version(db_path)
+    roster = _roster
+    if roster is not None and roster.version == version:
+        return roster
+    with _roster_lock:
+        if _roster is None or _roster.version != version:
+            _roster = Roster(read_players_db(db_path), version)
+        return _roster
+
+
+def invalidate_roster():
+    """選手の登録・削除後に呼ぶ。次の get_roster() で読み直す。"""
+    global _roster_generation
+    with _roster_lock:
+        _roster_generation += 1
+
+
+# =========================
+# 名簿ファイルの読み込み（1件ずつ流す）
+# =========================
+def _iter_json_array(f):
+    """トップレベルが配列のJSONを、全体を読み込まずに1要素ずつ返す。"""
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(f, encoding="utf-8-sig") if isinstance(f.read(0), bytes) else f
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # 空白と区切りを読み飛ばす
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            buf, pos = reader.read(JSON_READ_CHUNK), 0
+            eof = not buf
+
+        if pos >= len(buf):
+            if started:
+                raise ValueError("JSONの配列が閉じていません")
+            return
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("選手データはJSON配列である必要があります")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            chunk = reader.read(JSON_READ_CHUNK)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        pos = end
+        if isinstance(item, dict):
+            yield item
+
+
+def _iter_csv(f):
+    reader = io.TextIOWrapper(f, encoding="utf-8-sig", newline="") if isinstance(f.read(0), bytes) else f
+    yield from csv.DictReader(reader)
+
+
+def _iter_excel(f):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ValueError("Excelの取り込みには openpyxl が必要です（pip install openpyxl）") from e
+
+    wb = load_workbook(f, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        header = ["" if h is None else str(h).strip() for h in header]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def iter_player_records(f, file_name):
+    """JSON / CSV / Excel の名簿から、選手を1件ずつ dict で返す。
+
+    f はバイナリのファイルオブジェクト（st.file_uploader の戻り値も可）。
+    見出しは英語のカラム名と、背番号・プレイヤー名などの日本語名のどちらでもよい。
+    """
+    suffix = Path(file_name).suffix.lower()
+    if suffix == ".json":
+        records = _iter_json_array(f)
+    elif suffix == ".csv":
+        records = _iter_csv(f)
+    elif suffix in (".xlsx", ".xlsm"):
+        records = _iter_excel(f)
+    else:
+        raise ValueError(f"対応していないファイル形式です: {suffix or file_name}")
+
+    for record in records:
+        yield {COLUMN_ALIASES.get(str(k).strip(), str(k).strip()): v for k, v in record.items()}
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)    # Excelの数値セル（背番号 11 → 11.0）
+    return str(value).strip()
+
+
+def player_row(record):
+    """dict → INSERT用のタプル。背番号か名前が空なら None。"""
+    row = tuple(_cell_text(record.get(k)) for k in PLAYER_FIELDS)
+    if not row[0] or not row[1]:
+        return None
+    return row
+
+
+# =========================
+# 一括登録（SQLite）
+# =========================
+def import_players(conn, records, batch_size=IMPORT_BATCH_SIZE):
+    """選手を1トランザクションでまとめて登録し、(追加件数, スキップ件数) を返す。
+
+    executemany を batch_size 件ずつ流すので、巨大なファイルでも全件をメモリに載せない。
+    追加件数は開始前後の total_changes の差で数える。重複（INSERT OR IGNORE で無視）と
+    背番号・名前が空の行はスキップ件数に入る。
+    """
+    total = 0
+    with writing(conn) as w:
+        before = w.total_changes
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            total += len(batch)
+            rows = [row for row in map(player_row, batch) if row]
+            w.executemany(
+                """
+                INSERT OR IGNORE INTO players
+                (uniform_number, player_name, team, bibs_type, class_type)
+                VALUES (?, ?, ?, ?, ?);
+                """,
+                rows,
+            )
+        inserted = w.total_changes - before
+    return inserted, total - inserted
+
+
+# =========================
+# JSON名簿（スナップショット＋追記ログ）
+# =========================
+class RosterStore:
+    """players.json を索引付きでメモリに持つ選手名簿。
+
+    - 重複判定は5項目のキー → id のハッシュ索引、削除は id の索引で引くため、
+      登録・削除の手間は名簿の人数によらない。
+    - 保存は lib_journal の追記ログ（players.log）に1行足すだけで、
+      players.json の書き直しは定期的なコンパクション時のみ。
+    - ファイルが外から書き換えられた場合（別プロセスなど）は次の参照時に読み直す。
+    """
+
+    def __init__(self, json_path, compact_every=ROSTER_COMPACT_EVERY):
+        self.journal = get_journal(json_path, compact_every=compact_every)
+        self.lock = threading.RLock()
+        self._by_id = {}      # id -> 選手 dict（登録順）
+        self._by_key = {}     # (背番号, 名前, チーム, ビブス, CLASS) -> id
+        self._next_id = 1
+        self._stamp = None
+
+    # ---- 読み込み ----
+    def _file_stamp(self):
+        stamp = []
+        for path in (self.journal.snapshot_path, self.journal.log_path):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _reload_if_changed(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        snapshot, records = self.journal.read()
+        if snapshot is not None and not isinstance(snapshot, list):
+            raise ValueError("players.json の形式が不正です")
+
+        self._by_id.clear()
+        self._by_key.clear()
+        self._next_id = 1
+        for player in snapshot or []:
+            if isinstance(player, dict):
+                self._put(player)
+        for record in records:
+            if record.get("op") == "add":
+                self._put(record.get("player") or {})
+            elif record.get("op") == "delete":
+                self._drop(record.get("id"))
+        self._stamp = self._file_stamp()
+
+    def _put(self, player):
+        try:
+            player_id = int(player.get("id"))
+        except (TypeError, ValueError):
+            player_id = self._next_id
+        row = {"id": player_id, **dict(zip(PLAYER_FIELDS, (_cell_text(player.get(k)) for k in PLAYER_FIELDS)))}
+        self._drop(player_id)
+        self._by_id[player_id] = row
+        self._by_key.setdefault(tuple(row[k] for k in PLAYER_FIELDS), player_id)
+        self._next_id = max(self._next_id, player_id + 1)
+        return row
+
+    def _drop(self, player_id):
+        row = self._by_id.pop(player_id, None)
+        if row is not None:
+            key = tuple(row[k] for k in PLAYER_FIELDS)
+            if self._by_key.get(key) == player_id:
+                del self._by_key[key]
+        return row is not None
+
+    # ---- 参照 ----
+    def players(self):
+        with self.lock:
+            self._reload_if_changed()
+            return list(self._by_id.values())
+
+    # ---- 更新 ----
+    def _append(self, record):
+        if self.journal.append(record):
+            self.compact()
+        else:
+            self._stamp = self._file_stamp()
+
+    def add(self, uniform_number, player_name, team, bibs_type, class_type):
+        """選手を登録する。同じ5項目の選手がいれば登録せず False。"""
+        with self.lock, self.journal.lock:
+            self._reload_if_changed()
+            # _put と同じ整形（前後の空白・Excelの 11.0 など）で比べる
+            key = tuple(_cell_text(v) for v in (uniform_number, player_name, team, bibs_type, class_type))
+            if key in self._by_key:
+                return False
+            row = self._put({"id": self._next_id, **dict(zip(PLAYER_FIELDS, key))})
+            self._append({"op": "add", "player": row})
+            return True
+
+    def delete(self, player_id):
+        with self.lock, self.journal.lock:
+            self._reload_if_changed()
+            if not self._drop(int(player_id)):
+                return False
+            self._append({"op": "delete", "id": int(player_id)})
+            return True
+
+    def replace_all(self, players):
+        """名簿全体を置き換える（SQLite → JSON の書き出しなど）。"""
+        with self.lock, self.journal.lock:
+            self._by_id.clear()
+            self._by_key.clear()
+            self._next_id = 1
+            for player in players:
+                self._put(player)
+            self.compact()
+
+    def compact(self):
+        with self.lock, self.journal.lock:
+            self.journal.write_snapshot(list(self._by_id.values()))
+            self._stamp = self._file_stamp()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_roster_store(json_path, compact_every=ROSTER_COMPACT_EVERY):
+    """同じファイルに対しては、プロセス内で同じ RosterStore を返す。"""
+    json_path = Path(json_path).resolve()
+    with _stores_lock:
+        store = _stores.get(json_path)
+        if store is None:
+            store = RosterStore(json_path, compact_every)
+            _stores[json_path] = store
+        return store
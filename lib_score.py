@@ -0,0 +1,281 @@
+import hashlib
+from array import array
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from lib_journal import get_journal
+
+# 定数
+TEAM_CODES = ("A", "B")
+MAX_SCORE_NO = 160
+MARKS = ("", "1点", "2点", "3点")          # 添字 = 得点
+POINT_MAP = {mark: point for point, mark in enumerate(MARKS)}
+CLASS_OPTIONS = ["初級", "中級", "上級"]
+DEFAULT_CLASS = "初級"
+TEAM_LABELS = {"A": "Red", "B": "Blue"}
+
+EVENT_COLUMNS = ["TEAM", "列", "CLASS", "背番号", "スコア番号", "得点種別", "得点"]
+
+
+def empty_cell():
+    return {"mark": "", "class": DEFAULT_CLASS, "number": ""}
+
+
+def parse_cell_key(key):
+    """'A_12' → (0, 12)。不正なキーは KeyError。"""
+    if not isinstance(key, str):
+        raise KeyError(key)
+    team, _, score_no = key.partition("_")
+    if team not in TEAM_CODES or not score_no.isdigit():
+        raise KeyError(key)
+    score_no = int(score_no)
+    if not 1 <= score_no <= MAX_SCORE_NO:
+        raise KeyError(key)
+    return TEAM_CODES.index(team), score_no
+
+
+def cell_key(team_idx, score_no):
+    return f"{TEAM_CODES[team_idx]}_{score_no}"
+
+
+# =========================
+# ランニングスコア状態
+# =========================
+class ScoreState(Mapping):
+    """160×2 のランニングスコアを配列で保持し、集計を差分更新する。
+
+    従来の scores 辞書と同じく scores["A_1"] で {"mark", "class", "number"} を返し、
+    scores["A_1"] = {...} で1セルだけ更新する。チーム合計・CLASS別・選手別の得点は
+    更新時に差分で反映するため、画面側の参照は全セルを走査しない。
+    """
+
+    def __init__(self):
+        size = len(TEAM_CODES) * MAX_SCORE_NO
+        self._points = array("b", bytes(size))
+        self._classes = [DEFAULT_CLASS] * size
+        self._numbers = [""] * size
+        self._team_totals = [0] * len(TEAM_CODES)
+        self._class_totals = {}     # (team_idx, class) -> 得点
+        self._player_totals = {}    # (team_idx, class, number) -> 得点
+        self.version = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        for key, cell in (data or {}).items():
+            try:
+                state[key] = cell
+            except (KeyError, TypeError, AttributeError):
+                continue
+        state.version = 0
+        return state
+
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+    # ---- Mapping ----
+    def _slot(self, key):
+        team_idx, score_no = parse_cell_key(key)
+        return (score_no - 1) * len(TEAM_CODES) + team_idx
+
+    def __getitem__(self, key):
+        slot = self._slot(key)
+        return {
+            "mark": MARKS[self._points[slot]],
+            "class": self._classes[slot],
+            "number": self._numbers[slot],
+        }
+
+    def __iter__(self):
+        for score_no in range(1, MAX_SCORE_NO + 1):
+            for team_idx in range(len(TEAM_CODES)):
+                yield cell_key(team_idx, score_no)
+
+    def __len__(self):
+        return len(self._points)
+
+    def __setitem__(self, key, cell):
+        self.set_cell(key, cell.get("mark", ""), cell.get("class", DEFAULT_CLASS), cell.get("number", ""))
+
+    # ---- 更新 ----
+    def _apply(self, slot, sign):
+        point = self._points[slot]
+        if point <= 0:
+            return
+        team_idx = slot % len(TEAM_CODES)
+        class_key = (team_idx, self._classes[slot])
+        player_key = (team_idx, self._classes[slot], self._numbers[slot])
+
+        self._team_totals[team_idx] += sign * point
+        for totals, k in ((self._class_totals, class_key), (self._player_totals, player_key)):
+            value = totals.get(k, 0) + sign * point
+            if value:
+                totals[k] = value
+            else:
+                totals.pop(k, None)
+
+    def set_cell(self, key, mark, class_type, number):
+        slot = self._slot(key)
+        self._apply(slot, -1)
+        self._points[slot] = POINT_MAP.get(mark, 0)
+        self._classes[slot] = class_type or DEFAULT_CLASS
+        self._numbers[slot] = str(number or "").strip()
+        self._apply(slot, +1)
+        self.version += 1
+
+    def clear_cell(self, key):
+        self.set_cell(key, "", DEFAULT_CLASS, "")
+
+    # ---- 参照 ----
+    def digest(self):
+        """セル内容のハッシュ。PDFなどの生成結果のキャッシュキーに使う。"""
+        h = hashlib.sha1(self._points.tobytes())
+        h.update("\x1f".join(self._classes).encode("utf-8"))
+        h.update("\x1f".join(self._numbers).encode("utf-8"))
+        return h.hexdigest()
+
+    def team_total(self, team_code):
+        return self._team_totals[TEAM_CODES.index(team_code)]
+
+    def class_totals(self):
+        return {(TEAM_CODES[t], c): p for (t, c), p in self._class_totals.items()}
+
+    def player_totals(self):
+        return {(TEAM_CODES[t], c, n): p for (t, c, n), p in self._player_totals.items()}
+
+    def cells_frame(self):
+        """全セルを列指向の表 (team, score_no, mark, class, number) で返す。"""
+        points = np.frombuffer(self._points.tobytes(), dtype=np.int8)
+        return pd.DataFrame({
+            "team": np.tile(np.array(TEAM_CODES, dtype=object), MAX_SCORE_NO),
+            "score_no": np.repeat(np.arange(1, MAX_SCORE_NO + 1), len(TEAM_CODES)),
+            "mark": np.array(MARKS, dtype=object)[points],
+            "class": np.array(self._classes, dtype=object),
+            "number": np.array(self._numbers, dtype=object),
+        })
+
+    def summary_df(self, team_a_name, team_b_name):
+        names = (team_a_name, team_b_name)
+        rows = [
+            {"チーム": names[t], "級": c, "背番号": n, "得点": p}
+            for (t, c, n), p in self._player_totals.items()
+        ]
+        if not rows:
+            return pd.DataFrame(columns=["チーム", "級", "背番号", "得点"])
+        return pd.DataFrame(rows).sort_values(["チーム", "級", "背番号"]).reset_index(drop=True)
+
+    def team_summary_df(self, team_a_name, team_b_name):
+        names = (team_a_name, team_b_name)
+        rows = [
+            {"チーム": names[t], "得点": total}
+            for t, total in enumerate(self._team_totals)
+            if total
+        ]
+        if not rows:
+            return pd.DataFrame(columns=["チーム", "得点"])
+        return pd.DataFrame(rows).sort_values("チーム").reset_index(drop=True)
+
+
+# =========================
+# 集計用イベント表
+# =========================
+def build_events_frame(cells):
+    """列指向のセル表 (team, score_no, mark, class, number) から得点イベント表を作る。
+
+    行ごとのPython処理は行わず、得点の無いセルはまとめて落とす。
+    SQL（lib_db.read_score_cells_frame）でも ScoreState.cells_frame() でも同じ形で渡せる。
+    """
+    if cells is None or cells.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    points = cells["mark"].map(POINT_MAP).fillna(0).astype("int64").to_numpy()
+    scored = points > 0
+    if not scored.any():
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    team = cells["team"].to_numpy()[scored]
+    return pd.DataFrame({
+        "TEAM": np.where(team == "A", TEAM_LABELS["A"], TEAM_LABELS["B"]),
+        "列": team,
+        "CLASS": cells["class"].to_numpy()[scored],
+        "背番号": cells["number"].to_numpy()[scored],
+        "スコア番号": cells["score_no"].to_numpy()[scored].astype("int64"),
+        "得点種別": cells["mark"].to_numpy()[scored],
+        "得点": points[scored],
+    })
+
+
+class PlayerIndex:
+    """(背番号, CLASS, TEAM) から選手名・ビブスTypeを引くための索引。
+
+    選手DBの文字列整形と索引作成は作成時の1回だけで、引き当ては
+    MultiIndex.get_indexer によるハッシュ検索でまとめて行う。
+    同じキーの選手が複数いる場合は先に登録された方を使う。
+    """
+
+    KEY_COLUMNS = ["uniform_number", "class_type", "team"]
+
+    def __init__(self, players_df):
+        columns = self.KEY_COLUMNS + ["player_name", "bibs_type"]
+        df = players_df.reindex(columns=columns).fillna("").astype(str)
+        for col in columns:
+            df[col] = df[col].str.strip()
+        df = df.drop_duplicates(self.KEY_COLUMNS, keep="first")
+
+        self.keys = pd.MultiIndex.from_frame(df[self.KEY_COLUMNS])
+        self.names = df["player_name"].to_numpy(dtype=object)
+        self.bibs = df["bibs_type"].to_numpy(dtype=object)
+
+    def __len__(self):
+        return len(self.names)
+
+    def positions(self, numbers, classes, teams):
+        if not len(self) or not len(numbers):
+            return np.full(len(numbers), -1)
+        query = pd.MultiIndex.from_arrays([
+            np.asarray(numbers, dtype=object),
+            np.asarray(classes, dtype=object),
+            np.asarray(teams, dtype=object),
+        ])
+        return self.keys.get_indexer(query)
+
+
+def attach_player_names(events_df, player_index):
+    """イベント表に 名前・ビブスType を付ける。未登録は「未登録選手」「不明」。"""
+    if events_df.empty:
+        return events_df
+
+    events_df = events_df.copy()
+    if not len(player_index):
+        events_df["名前"] = ""
+        events_df["ビブスType"] = ""
+        return events_df
+
+    pos = player_index.positions(events_df["背番号"], events_df["CLASS"], events_df["TEAM"])
+    found = pos >= 0
+    names = np.full(len(pos), "", dtype=object)
+    bibs = np.full(len(pos), "", dtype=object)
+    names[found] = player_index.names[pos[found]]
+    bibs[found] = player_index.bibs[pos[found]]
+
+    events_df["名前"] = np.where(names == "", "未登録選手", names)
+    events_df["ビブスType"] = np.where(bibs == "", "不明", bibs)
+    return events_df
+
+
+# =========================
+# 旧保存形式（スナップショット＋追記ログ）の読み込み
+# =========================
+# スコアは events.db の score_cells に保存する。score_sheet_data.json（と追記ログ
+# score_sheet_data.log）は、DBへ移行する前のデータを取り込むときだけ読む。
+def load_score_data(data_file):
+    """スナップショットにログを再適用したセル辞書を返す。"""
+    snapshot, records = get_journal(data_file).read()
+    data = dict(snapshot or {})
+    for record in records:
+        key = record.get("key")
+        if key:
+            data[key] = record.get("cell", empty_cell())
+    return data
@@ -1,8 +1,6 @@
-import json
 import html as html_lib
 from pathlib import Path
 from io import BytesIO
-import sqlite3
 
 import pandas as pd
 import streamlit as st
@@ -14,8 +12,26 @@ from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from app_auth import require_login, render_userbox
+from lib_score import ScoreState, CLASS_OPTIONS, TEAM_LABELS, load_score_data
+from lib_players import get_roster
+from lib_league import get_league_conn, archive_score_sheet
+from lib_perf import timed, span, rerun_start, rerun_end
+from lib_db import (
+    get_conn,
+    create_game,
+    list_games,
+    end_game,
+    read_score_cells_frame,
+    upsert_score_cell,
+    load_score_cells,
+    ensure_active_game,
+    clear_score_cells,
+    get_score_version,
+)
 from st_click_detector import click_detector
 
+_perf_started = rerun_start()
+
 # =========================
 # ページ設定・認証
 # =========================
@@ -43,7 +59,6 @@ render_userbox()
 # 定数
 # =========================
 DATA_FILE = Path("score_sheet_data.json")
-PLAYERS_DB_PATH = "players.db"
 
 DISPLAY_MARK_MAP = {
     "1点": "●",
@@ -51,13 +66,11 @@ DISPLAY_MARK_MAP = {
     "3点": "／",
 }
 
-POINT_MAP = {"": 0, "1点": 1, "2点": 2, "3点": 3}
-CLASS_OPTIONS = ["初級", "中級", "上級"]
-
 
 # =========================
 # 画面デザイン
 # =========================
+@timed()
 def inject_global_style():
     st.markdown(
         """
@@ -443,62 +456,75 @@ def remove_cell_query_param():
         pass
 
 
-def fetch_players():
+def default_scores():
+    return ScoreState()
+
+
+def ensure_default_game(conn):
+    """進行中の試合を返す。
+
+    初回起動時（JSON保存からの移行時）だけ、既存の score_sheet_data.json を
+    新しい試合として取り込む（lib_db.ensure_active_game）。
+    """
     try:
-        with sqlite3.connect(PLAYERS_DB_PATH) as conn:
-            return pd.read_sql_query(
-                """
-                SELECT
-                    uniform_number,
-                    player_name,
-                    team,
-                    bibs_type,
-                    class_type
-                FROM players
-                ORDER BY team, class_type, uniform_number
-                """,
-                conn,
-            )
+        return ensure_active_game(conn, lambda: load_score_data(DATA_FILE))
     except Exception as e:
-        st.warning(f"選手DBを読み込めませんでした: {e}")
-        return pd.DataFrame(
-            columns=["uniform_number", "player_name", "team", "bibs_type", "class_type"]
-        )
+        st.warning(f"既存のスコアデータを取り込めませんでした: {e}")
+        return ensure_active_game(conn)
 
 
-def default_scores():
-    scores = {}
-    for score_no in range(1, 161):
-        for team in ["A", "B"]:
-            scores[f"{team}_{score_no}"] = {
-                "mark": "",
-                "class": "初級",
-                "number": "",
-            }
-    return scores
+@timed()
+def load_scores(game_id):
+    try:
+        return ScoreState.from_dict(load_score_cells(get_conn(), game_id))
+    except Exception as e:
+        st.warning(f"スコアデータを読み込めませんでした: {e}")
+        return default_scores()
 
 
-def load_scores():
-    if DATA_FILE.exists():
-        try:
-            with DATA_FILE.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            scores = default_scores()
-            scores.update(data)
-            return scores
-        except Exception:
-            return default_scores()
-    return default_scores()
+@timed()
+def save_scores(cell_key):
+    team, score_no = cell_key.split("_")
+    cell = st.session_state.scores[cell_key]
+    version = upsert_score_cell(
+        get_conn(),
+        st.session_state.game_id,
+        team,
+        int(score_no),
+        cell["mark"],
+        cell["class"],
+        cell["number"],
+    )
+    # 自分の保存だけで版数が1つ進んだなら、手元の ScoreState はDBと同じなので読み直さない。
+    # 他のセッションの保存が挟まっていれば版数が合わず、次の rerun で読み直す
+    if version is not None and version == st.session_state.get("scores_version", -1) + 1:
+        st.session_state.scores_version = version
+
+
+def reset_scores():
+    st.session_state.scores = default_scores()
+    clear_score_cells(get_conn(), st.session_state.game_id)
 
 
-def save_scores():
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump(st.session_state.scores, f, ensure_ascii=False, indent=2)
+def reload_scores(game_id):
+    # 版数は読み込みの前に取る（読み込み中に入った保存は次のrerunで拾い直す）
+    version = get_score_version(get_conn(), game_id)
+    st.session_state.scores = load_scores(game_id)
+    st.session_state.scores_game_id = game_id
+    st.session_state.scores_version = version
 
 
 def init_state():
-    if "scores" not in st.session_state:
-        st.session_state.scores = load_scores()
+    if "game_id" not in st.session_state:
+        st.session_state.game_id = ensure_default_game(get_conn())
+    # 他の端末・タブが同じ試合に保存していたら（score_versions が進んでいたら）読み直す。
+    # 自分の保存の分は save_scores が版数を進めておくので読み直さない
+    game_id = st.session_state.game_id
+    if (
+        st.session_state.get("scores_game_id") != game_id
+        or st.session_state.get("scores_version") != get_score_version(get_conn(), game_id)
+    ):
+        reload_scores(game_id)
     if "selected_cell" not in st.session_state:
         st.session_state.selected_cell = ""
     if "show_score_dialog" not in st.session_state:
@@ -512,6 +538,40 @@ def init_state():
     if "last_clicked_cell" not in st.session_state:
         st.session_state.last_clicked_cell = ""
 
+def switch_game(game_id):
+    st.session_state.game_id = game_id
+    reload_scores(game_id)
+    st.session_state.selected_cell = ""
+    close_score_dialog()
+
+
+def on_game_select():
+    switch_game(st.session_state.game_select)
+
+
+def on_new_game():
+    conn = get_conn()
+    game_id = create_game(conn, f"試合 {len(list_games(conn)) + 1}")
+    st.session_state.game_select = game_id
+    switch_game(game_id)
+
+
+@timed()
+def finish_game(team_a_name, team_b_name):
+    """試合を終了し、シーズン成績（league_stats.db）に記録する。"""
+    conn = get_conn()
+    game_id = st.session_state.game_id
+    archive_score_sheet(
+        get_league_conn(),
+        game_id,
+        team_a_name,
+        team_b_name,
+        read_score_cells_frame(conn, game_id),
+        get_roster().index,
+    )
+    end_game(conn, game_id)
+
+
 def open_score_dialog(cell_key: str):
     st.session_state.selected_cell = cell_key
     st.session_state.dialog_cell = cell_key
@@ -528,136 +588,163 @@ def close_score_dialog():
 # =========================
 # 画面用 ランニングスコアHTML
 # =========================
+# click_detector は iframe 内に描画されるため、スタイルは毎回HTMLに同梱する必要がある。
+# 文字列はモジュール読み込み時に1回だけ組み立てる。
+RUNNING_SCORE_CSS = "".join((
+    "<style>",
+    ".score-wrap { width: 100%; overflow-x: auto; -webkit-overflow-scrolling: touch; padding: 18px 64px; border-radius: 30px; background: rgba(255,255,255,.76); border: 1px solid rgba(255,255,255,.78); box-shadow: 0 22px 60px rgba(15,23,42,.12); backdrop-filter: blur(16px); }",
+    ".score-title-main { text-align: center; font-size: 15px; font-weight: 950; letter-spacing: .12em; padding: 13px; border: 1px solid rgba(255,255,255,.18); border-radius: 20px; background: linear-gradient(135deg, #0f172a, #1e293b 48%, #334155); color: white; margin-bottom: 14px; box-shadow: 0 14px 28px rgba(15,23,42,.20); }",
+    ".score-block-row { display: flex; gap: 12px; align-items: flex-start; justify-content: flex-start; }",
+    ".score-block-table { border-collapse: separate; border-spacing: 0; font-family: 'Noto Sans JP', Inter, Arial, sans-serif; font-size: 13px; text-align: center; background: white; color: #0f172a; border: 1px solid rgba(15,23,42,.12); border-radius: 18px; overflow: hidden; box-shadow: 0 14px 32px rgba(15,23,42,.08); }",
+    ".score-block-table th, .score-block-table td { border-right: 1px solid rgba(15,23,42,.12); border-bottom: 1px solid rgba(15,23,42,.12); width: 46px; height: 32px; padding: 0; }",
+    ".score-block-table tr:last-child td { border-bottom: 0; }",
+    ".score-block-table th:last-child, .score-block-table td:last-child { border-right: 0; }",
+    ".score-block-table th { background: linear-gradient(135deg, #f8fafc, #e2e8f0); font-size: 12px; font-weight: 950; color: #0f172a; }",
+    ".input-cell { background: linear-gradient(135deg, #f8fafc, #e2e8f0); cursor: pointer; font-weight: 950; font-size: 18px; transition: transform .14s ease, box-shadow .14s ease, filter .14s ease; }",
+    ".input-cell:hover { transform: scale(1.045); filter: brightness(1.02); box-shadow: inset 0 0 0 2px rgba(249,115,22,.62); }",
+    ".input-cell a { display: block; width: 100%; height: 100%; color: inherit; text-decoration: none; line-height: 32px; }",
+    ".selected-cell { background: linear-gradient(135deg, #fed7aa, #fb923c) !important; outline: 3px solid #ea580c; outline-offset: -3px; }",
+    ".score-no { background: #ffffff; color: #334155; font-size: 12px; font-weight: 850; position: relative; }",
+    ".score-mark { position: absolute; top: -0px; left: 50%; transform: translateX(-50%); font-size: 22px; font-weight: 950; color: #0f172a; pointer-events: none; }",
+    ".class-beginner { color: #dc2626 !important; }",
+    ".class-intermediate { color: #2563eb !important; }",
+    ".class-advanced { color: #16a34a !important; }",
+    "@media (max-width: 768px) {",
+    ".score-wrap { overflow-x: auto; padding: 12px 64px; border-radius: 22px; }",
+    ".score-block-row { display: flex; flex-wrap: wrap; gap: 10px; justify-content: flex-start; }",
+    ".score-block-table { width: calc(50% - 6px); font-size: 11px; border-radius: 15px; }",
+    ".score-block-table th, .score-block-table td { width: 34px; height: 26px; }",
+    ".input-cell { font-size: 14px; }",
+    ".input-cell a { line-height: 26px; }",
+    ".score-no { font-size: 10px; }",
+    ".score-mark { top: 0px; font-size: 17px; }",
+    ".score-title-main { font-size: 12px; padding: 9px; }",
+    "}",
+    "</style>",
+))
+
+CLASS_COLOR_CLASS = {
+    "初級": "class-beginner",
+    "中級": "class-intermediate",
+    "上級": "class-advanced",
+}
+
+RUNNING_SCORE_TABLE_HEAD = (
+    '<table class="score-block-table">'
+    "<tr>"
+    '<th colspan="2">A</th>'
+    "<th colspan='2'>B</th>"
+    "</tr>"
+)
+
+# 1セッションで保持する行HTMLの上限。超えたら作り直す。
+RUNNING_SCORE_ROW_CACHE_LIMIT = 2000
+
+
+def running_score_input_cell(key, mark, class_type, number, selected):
+    classes = ["input-cell"]
+    if selected:
+        classes.append("selected-cell")
+
+    text = ""
+    if mark:
+        text = to_circle_number(number) if mark == "3点" else number
+        # 色は文字がある時だけ効くので、空セルには付けない
+        color_class = CLASS_COLOR_CLASS.get(class_type)
+        if color_class:
+            classes.append(color_class)
+
+    return (
+        f'<td class="{" ".join(classes)}">'
+        f'<a href="#" id="{key}">{html_lib.escape(str(text))}</a>'
+        f"</td>"
+    )
+
+
+def running_score_no_cell(score_no, mark):
+    display_mark = DISPLAY_MARK_MAP.get(mark, "")
+    if not display_mark:
+        return f'<td class="score-no">{score_no}</td>'
+    return f'<td class="score-no">{score_no}<span class="score-mark">{display_mark}</span></td>'
+
+
+def running_score_row_html(score_no, a_cell, b_cell, a_selected, b_selected):
+    a_mark, a_class_type, a_number = a_cell
+    b_mark, b_class_type, b_number = b_cell
+    return "".join((
+        "<tr>",
+        running_score_input_cell(f"A_{score_no}", a_mark, a_class_type, a_number, a_selected),
+        running_score_no_cell(score_no, a_mark),
+        running_score_no_cell(score_no, b_mark),
+        running_score_input_cell(f"B_{score_no}", b_mark, b_class_type, b_number, b_selected),
+        "</tr>",
+    ))
+
+
+@timed()
 def make_running_score_html(selected_cell="", start_block=0, end_block=4):
-    html = ""
-
-    html += "<style>"
-    html += ".score-wrap { width: 100%; overflow-x: auto; -webkit-overflow-scrolling: touch; padding: 18px 64px; border-radius: 30px; background: rgba(255,255,255,.76); border: 1px solid rgba(255,255,255,.78); box-shadow: 0 22px 60px rgba(15,23,42,.12); backdrop-filter: blur(16px); }"
-    html += ".score-title-main { text-align: center; font-size: 15px; font-weight: 950; letter-spacing: .12em; padding: 13px; border: 1px solid rgba(255,255,255,.18); border-radius: 20px; background: linear-gradient(135deg, #0f172a, #1e293b 48%, #334155); color: white; margin-bottom: 14px; box-shadow: 0 14px 28px rgba(15,23,42,.20); }"
-    html += ".score-block-row { display: flex; gap: 12px; align-items: flex-start; justify-content: flex-start; }"
-    html += ".score-block-table { border-collapse: separate; border-spacing: 0; font-family: 'Noto Sans JP', Inter, Arial, sans-serif; font-size: 13px; text-align: center; background: white; color: #0f172a; border: 1px solid rgba(15,23,42,.12); border-radius: 18px; overflow: hidden; box-shadow: 0 14px 32px rgba(15,23,42,.08); }"
-    html += ".score-block-table th, .score-block-table td { border-right: 1px solid rgba(15,23,42,.12); border-bottom: 1px solid rgba(15,23,42,.12); width: 46px; height: 32px; padding: 0; }"
-    html += ".score-block-table tr:last-child td { border-bottom: 0; }"
-    html += ".score-block-table th:last-child, .score-block-table td:last-child { border-right: 0; }"
-    html += ".score-block-table th { background: linear-gradient(135deg, #f8fafc, #e2e8f0); font-size: 12px; font-weight: 950; color: #0f172a; }"
-    html += ".input-cell { background: linear-gradient(135deg, #f8fafc, #e2e8f0); cursor: pointer; font-weight: 950; font-size: 18px; transition: transform .14s ease, box-shadow .14s ease, filter .14s ease; }"
-    html += ".input-cell:hover { transform: scale(1.045); filter: brightness(1.02); box-shadow: inset 0 0 0 2px rgba(249,115,22,.62); }"
-    html += ".input-cell a { display: block; width: 100%; height: 100%; color: inherit; text-decoration: none; line-height: 32px; }"
-    html += ".selected-cell { background: linear-gradient(135deg, #fed7aa, #fb923c) !important; outline: 3px solid #ea580c; outline-offset: -3px; }"
-    html += ".score-no { background: #ffffff; color: #334155; font-size: 12px; font-weight: 850; position: relative; }"
-    html += ".score-mark { position: absolute; top: -0px; left: 50%; transform: translateX(-50%); font-size: 22px; font-weight: 950; color: #0f172a; pointer-events: none; }"
-    html += ".class-beginner { color: #dc2626 !important; }"
-    html += ".class-intermediate { color: #2563eb !important; }"
-    html += ".class-advanced { color: #16a34a !important; }"
-    
-    html += "@media (max-width: 768px) {"
-    html += ".score-wrap { overflow-x: auto; padding: 12px 64px; border-radius: 22px; }"
-    html += ".score-block-row { display: flex; flex-wrap: wrap; gap: 10px; justify-content: flex-start; }"
-    html += ".score-block-table { width: calc(50% - 6px); font-size: 11px; border-radius: 15px; }"
-    html += ".score-block-table th, .score-block-table td { width: 34px; height: 26px; }"
-    html += ".input-cell { font-size: 14px; }"
-    html += ".input-cell a { line-height: 26px; }"
-    html += ".score-no { font-size: 10px; }"
-    html += ".score-mark { top: 0px; font-size: 17px; }"
-    html += ".score-title-main { font-size: 12px; padding: 9px; }"
-    html += "}"
-    html += "</style>"
-
-    def cell_class(key, mark):
-        classes = ["input-cell"]
-        if key == selected_cell:
-            classes.append("selected-cell")
-        return " ".join(classes)
-
-    def class_color_class(class_type):
-        if class_type == "初級":
-            return "class-beginner"
-        elif class_type == "中級":
-            return "class-intermediate"
-        elif class_type == "上級":
-            return "class-advanced"
+    scores = st.session_state.scores
 
-    html += '<div class="score-wrap">'
-    html += '<div class="score-title-main">ランニングスコア　RUNNING SCORE</div>'
-    html += '<div class="score-block-row">'
+    # 行ごとのHTMLを「セル内容＋選択状態」をキーに使い回す。
+    # 1タップで変わるのは保存したセルと選択セルの行だけなので、ほとんどの行は再生成しない。
+    row_cache = st.session_state.setdefault("running_score_row_cache", {})
+    if len(row_cache) > RUNNING_SCORE_ROW_CACHE_LIMIT:
+        row_cache.clear()
+
+    parts = [
+        RUNNING_SCORE_CSS,
+        '<div class="score-wrap">',
+        '<div class="score-title-main">ランニングスコア　RUNNING SCORE</div>',
+        '<div class="score-block-row">',
+    ]
 
     for block in range(start_block, end_block):
-        html += '<table class="score-block-table">'
-        html += "<tr>"
-        html += '<th colspan="2">A</th>'
-        html += "<th colspan='2'>B</th>"
-        html += "</tr>"
+        parts.append(RUNNING_SCORE_TABLE_HEAD)
 
         for row in range(40):
             score_no = block * 40 + row + 1
             a_key = f"A_{score_no}"
             b_key = f"B_{score_no}"
 
-            a_data = st.session_state.scores[a_key]
-            b_data = st.session_state.scores[b_key]
-
-            a_mark = a_data["mark"]
-            b_mark = b_data["mark"]
-            a_display_mark = DISPLAY_MARK_MAP.get(a_mark, "")
-            b_display_mark = DISPLAY_MARK_MAP.get(b_mark, "")
-            a_number = a_data["number"]
-            b_number = b_data["number"]
-            a_class_type = a_data["class"]
-            b_class_type = b_data["class"]
-
-            a_class = cell_class(a_key, a_mark)
-            b_class = cell_class(b_key, b_mark)
-            a_color_class = class_color_class(a_class_type)
-            b_color_class = class_color_class(b_class_type)
-
-            a_text = ""
-            b_text = ""
-
-            if a_mark:
-                a_text = to_circle_number(a_number) if a_mark == "3点" else a_number
-
-            if b_mark:
-                b_text = to_circle_number(b_number) if b_mark == "3点" else b_number
-
-            html += "<tr>"
-            html += (
-                f'<td class="{a_class} {a_color_class}">'
-                f'<a href="#" id="{a_key}">{html_lib.escape(str(a_text))}</a>'
-                f"</td>"
-            )
-            html += (
-                f'<td class="score-no">{score_no}'
-                f'<span class="score-mark">{a_display_mark}</span></td>'
-            )
-            html += (
-                f'<td class="score-no">{score_no}'
-                f'<span class="score-mark">{b_display_mark}</span></td>'
-            )
-            html += (
-                f'<td class="{b_class} {b_color_class}">'
-                f'<a href="#" id="{b_key}">{html_lib.escape(str(b_text))}</a>'
-                f"</td>"
-            )
-            html += "</tr>"
-
-        html += "</table>"
-
-    html += "</div>"
-    html += "</div>"
-
-    return html
+            a_data = scores[a_key]
+            b_data = scores[b_key]
+            a_cell = (a_data["mark"], a_data["class"], a_data["number"])
+            b_cell = (b_data["mark"], b_data["class"], b_data["number"])
+
+            cache_key = (score_no, a_cell, b_cell, a_key == selected_cell, b_key == selected_cell)
+            row_html = row_cache.get(cache_key)
+            if row_html is None:
+                row_html = running_score_row_html(score_no, a_cell, b_cell, cache_key[3], cache_key[4])
+                row_cache[cache_key] = row_html
+            parts.append(row_html)
+
+        parts.append("</table>")
+
+    parts.append("</div>")
+    parts.append("</div>")
+
+    return "".join(parts)
 
 
 # =========================
 # PDF作成
 # =========================
-def create_score_sheet_pdf(team_a_name, team_b_name):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+RUNNING_SCORE_LAYOUT = {
+    "erase_x": 0,
+    "erase_y": 0,
+    "erase_w": 0,
+    "erase_h": 0,
+    "x": 309,
+    "top_y": 750,
+    "cell_w": 15.2,
+    "cell_h": 12.35,
+    "block_gap": 10.6,
+}
 
-    page_w, page_h = A4
-    font = PDF_FONT
+PDF_STATIC_FORM = "score_sheet_static"
 
+
+def find_template_path():
     template_path = Path(__file__).with_name("score_sheet_template.png")
     if not template_path.exists():
         template_path = Path("score_sheet_template.png")
@@ -667,28 +754,101 @@ def create_score_sheet_pdf(team_a_name, team_b_name):
             "score_sheet_template.png が見つかりません。"
             "このPythonファイルと同じフォルダに配置してください。"
         )
+    return template_path
 
-    bg = ImageReader(str(template_path))
-    c.drawImage(bg, 0, 0, width=page_w, height=page_h, mask="auto")
 
-    scores = getattr(st.session_state, "scores", None)
-    if not scores:
-        scores = load_scores()
+def draw_text_center(c, x, y, value, size=6, color=colors.black):
+    c.setFillColor(color)
+    c.setFont(PDF_FONT, size)
+    c.drawCentredString(x, y, "" if value is None else str(value))
+    c.setFillColor(colors.black)
 
-    def set_font(size):
-        c.setFont(font, size)
 
-    def draw_text_center(x, y, value, size=6, color=colors.black):
-        c.setFillColor(color)
-        set_font(size)
-        c.drawCentredString(x, y, "" if value is None else str(value))
-        c.setFillColor(colors.black)
+def draw_text_left(c, x, y, value, size=6, color=colors.black):
+    c.setFillColor(color)
+    c.setFont(PDF_FONT, size)
+    c.drawString(x, y, "" if value is None else str(value))
+    c.setFillColor(colors.black)
 
-    def draw_text_left(x, y, value, size=6, color=colors.black):
-        c.setFillColor(color)
-        set_font(size)
-        c.drawString(x, y, "" if value is None else str(value))
-        c.setFillColor(colors.black)
+
+@st.cache_resource(show_spinner=False)
+def load_template_image(template_path):
+    """テンプレートPNGの読み込み・デコードはプロセス内で1回だけ行う。"""
+    return ImageReader(template_path)
+
+
+def draw_template_image(c, template_path):
+    page_w, page_h = A4
+    c.drawImage(load_template_image(str(template_path)), 0, 0, width=page_w, height=page_h, mask="auto")
+
+
+def draw_static_sheet(c):
+    """テンプレート上の罫線・スコア番号・見出しなど、入力内容に依存しない部分。"""
+    page_w, page_h = A4
+
+    c.setFillColor(colors.white)
+    c.rect(58, page_h - 20, 160, 12, stroke=0, fill=1)
+    c.rect(360, page_h - 20, 160, 12, stroke=0, fill=1)
+
+    lx = RUNNING_SCORE_LAYOUT["x"]
+    top_y = RUNNING_SCORE_LAYOUT["top_y"]
+    cell_w = RUNNING_SCORE_LAYOUT["cell_w"]
+    cell_h = RUNNING_SCORE_LAYOUT["cell_h"]
+    block_gap = RUNNING_SCORE_LAYOUT["block_gap"]
+    block_w = cell_w * 4
+
+    c.setFillColor(colors.white)
+    c.rect(
+        RUNNING_SCORE_LAYOUT["erase_x"],
+        RUNNING_SCORE_LAYOUT["erase_y"],
+        RUNNING_SCORE_LAYOUT["erase_w"],
+        RUNNING_SCORE_LAYOUT["erase_h"],
+        stroke=0,
+        fill=1,
+    )
+    c.setFillColor(colors.black)
+
+    draw_text_center(
+        c,
+        lx + (block_w * 4 + block_gap * 3) / 2,
+        top_y + 8,
+        "ランニングスコア  RUNNING SCORE",
+        size=7,
+    )
+
+    c.setLineWidth(0.45)
+    c.setStrokeColor(colors.black)
+
+    for block in range(4):
+        bx = lx + block * (block_w + block_gap)
+        c.setFillColor(colors.white)
+        c.rect(bx, top_y - cell_h, cell_w * 2, cell_h, stroke=1, fill=1)
+        c.rect(bx + cell_w * 2, top_y - cell_h, cell_w * 2, cell_h, stroke=1, fill=1)
+        draw_text_center(c, bx + cell_w, top_y - cell_h + 3.1, "A", size=5.5)
+        draw_text_center(c, bx + cell_w * 3, top_y - cell_h + 3.1, "B", size=5.5)
+
+        for row in range(40):
+            score_no = block * 40 + row + 1
+            y0 = top_y - cell_h * (row + 2)
+
+            c.setFillColor(colors.lightgrey)
+            c.rect(bx, y0, cell_w, cell_h, stroke=1, fill=1)
+
+            c.setFillColor(colors.white)
+            c.rect(bx + cell_w, y0, cell_w, cell_h, stroke=1, fill=1)
+            draw_text_center(c, bx + cell_w * 1.5, y0 + 2.8, score_no, size=5.2)
+
+            c.setFillColor(colors.white)
+            c.rect(bx + cell_w * 2, y0, cell_w, cell_h, stroke=1, fill=1)
+            draw_text_center(c, bx + cell_w * 2.5, y0 + 2.8, score_no, size=5.2)
+
+            c.setFillColor(colors.lightgrey)
+            c.rect(bx + cell_w * 3, y0, cell_w, cell_h, stroke=1, fill=1)
+
+
+def draw_score_marks(c, scores, team_a_name, team_b_name):
+    """チーム名・選手番号・得点記号・合計など、入力内容に応じて変わる部分。"""
+    page_w, page_h = A4
 
     def player_color(class_type):
         if class_type == "初級":
@@ -727,33 +887,17 @@ def create_score_sheet_pdf(team_a_name, team_b_name):
             c.circle(cx, cy + 0.5, 4.5, stroke=1, fill=0)
 
             # 数字も色付き
-            draw_text_center(cx, cy - 1.7, number, size=5.0, color=color)
+            draw_text_center(c, cx, cy - 1.7, number, size=5.0, color=color)
 
             # 状態を元に戻す（←これが超重要）
             c.restoreState()
 
         else:
             # 1点・2点は数字だけ色
-            draw_text_center(cx, cy - 2.0, number, size=6.0, color=color)
+            draw_text_center(c, cx, cy - 2.0, number, size=6.0, color=color)
 
-    c.setFillColor(colors.white)
-    c.rect(58, page_h - 20, 160, 12, stroke=0, fill=1)
-    c.rect(360, page_h - 20, 160, 12, stroke=0, fill=1)
-    
-    draw_text_left(80, page_h - 18, team_a_name, 7)   # チーム名← +20
-    draw_text_left(382, page_h - 18, team_b_name, 7)  # チーム名← +20
- 
-    RUNNING_SCORE_LAYOUT = {
-        "erase_x": 0,
-        "erase_y": 0,
-        "erase_w": 0,
-        "erase_h": 0,
-        "x": 309,
-        "top_y": 750,
-        "cell_w": 15.2,
-        "cell_h": 12.35,
-        "block_gap": 10.6,
-    }
+    draw_text_left(c, 80, page_h - 18, team_a_name, 7)   # チーム名← +20
+    draw_text_left(c, 382, page_h - 18, team_b_name, 7)  # チーム名← +20
 
     lx = RUNNING_SCORE_LAYOUT["x"]
     top_y = RUNNING_SCORE_LAYOUT["top_y"]
@@ -762,34 +906,8 @@ def create_score_sheet_pdf(team_a_name, team_b_name):
     block_gap = RUNNING_SCORE_LAYOUT["block_gap"]
     block_w = cell_w * 4
 
-    c.setFillColor(colors.white)
-    c.rect(
-        RUNNING_SCORE_LAYOUT["erase_x"],
-        RUNNING_SCORE_LAYOUT["erase_y"],
-        RUNNING_SCORE_LAYOUT["erase_w"],
-        RUNNING_SCORE_LAYOUT["erase_h"],
-        stroke=0,
-        fill=1,
-    )
-    c.setFillColor(colors.black)
-
-    draw_text_center(
-        lx + (block_w * 4 + block_gap * 3) / 2,
-        top_y + 8,
-        "ランニングスコア  RUNNING SCORE",
-        size=7,
-    )
-
-    c.setLineWidth(0.45)
-    c.setStrokeColor(colors.black)
-
     for block in range(4):
         bx = lx + block * (block_w + block_gap)
-        c.setFillColor(colors.white)
-        c.rect(bx, top_y - cell_h, cell_w * 2, cell_h, stroke=1, fill=1)
-        c.rect(bx + cell_w * 2, top_y - cell_h, cell_w * 2, cell_h, stroke=1, fill=1)
-        draw_text_center(bx + cell_w, top_y - cell_h + 3.1, "A", size=5.5)
-        draw_text_center(bx + cell_w * 3, top_y - cell_h + 3.1, "B", size=5.5)
 
         for row in range(40):
             score_no = block * 40 + row + 1
@@ -798,44 +916,58 @@ def create_score_sheet_pdf(team_a_name, team_b_name):
             b_data = scores.get(f"B_{score_no}", {})
             a_mark = a_data.get("mark", "")
             b_mark = b_data.get("mark", "")
-            a_number = a_data.get("number", "")
-            b_number = b_data.get("number", "")
-            a_class = a_data.get("class", "")
-            b_class = b_data.get("class", "")
-
-            c.setFillColor(colors.lightgrey)
-            c.rect(bx, y0, cell_w, cell_h, stroke=1, fill=1)
-            draw_player_number(bx + cell_w / 2, y0 + cell_h / 2, a_number, a_mark, a_class)
 
-            c.setFillColor(colors.white)
-            c.rect(bx + cell_w, y0, cell_w, cell_h, stroke=1, fill=1)
-            draw_text_center(bx + cell_w * 1.5, y0 + 2.8, score_no, size=5.2)
+            draw_player_number(bx + cell_w / 2, y0 + cell_h / 2, a_data.get("number", ""), a_mark, a_data.get("class", ""))
             draw_score_mark(bx + cell_w * 1.5, y0 + cell_h / 2, a_mark)
-
-            c.setFillColor(colors.white)
-            c.rect(bx + cell_w * 2, y0, cell_w, cell_h, stroke=1, fill=1)
-            draw_text_center(bx + cell_w * 2.5, y0 + 2.8, score_no, size=5.2)
             draw_score_mark(bx + cell_w * 2.5, y0 + cell_h / 2, b_mark)
+            draw_player_number(bx + cell_w * 3.5, y0 + cell_h / 2, b_data.get("number", ""), b_mark, b_data.get("class", ""))
 
-            c.setFillColor(colors.lightgrey)
-            c.rect(bx + cell_w * 3, y0, cell_w, cell_h, stroke=1, fill=1)
-            draw_player_number(bx + cell_w * 3.5, y0 + cell_h / 2, b_number, b_mark, b_class)
+    draw_text_center(c, 470, 76, str(scores.team_total("A")), size=12)
+    draw_text_center(c, 550, 76, str(scores.team_total("B")), size=12)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def render_score_sheet_pdf(digest, team_a_name, team_b_name, _scores):
+    """digest（セル内容のハッシュ）とチーム名が同じならPDFを作り直さない。"""
+    template_path = find_template_path()
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
 
-    events_df = build_events(team_a_name, team_b_name)
-    a_total = get_team_total(events_df, team_a_name)
-    b_total = get_team_total(events_df, team_b_name)
-    draw_text_center(470, 76, str(a_total), size=12)
-    draw_text_center(550, 76, str(b_total), size=12)
+    draw_template_image(c, template_path)
+
+    # 入力内容に依存しない罫線・番号はフォームXObjectにまとめる
+    c.beginForm(PDF_STATIC_FORM)
+    draw_static_sheet(c)
+    c.endForm()
+    c.doForm(PDF_STATIC_FORM)
+
+    draw_score_marks(c, _scores, team_a_name, team_b_name)
 
     c.showPage()
     c.save()
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+@timed()
+def create_score_sheet_pdf(team_a_name, team_b_name):
+    scores = getattr(st.session_state, "scores", None)
+    if scores is None:
+        scores = load_scores(st.session_state.game_id)
+    return render_score_sheet_pdf(scores.digest(), team_a_name, team_b_name, scores)
 
 
 # =========================
 # ダイアログ
 # =========================
+PLAYER_SUGGEST_LIMIT = 4
+
+
+def pick_player_number(number_key, number):
+    # ボタンのコールバックで入力欄の値を書き換える（text_input生成前に実行される）
+    st.session_state[number_key] = number
+
+
 @st.dialog("スコア入力")
 def score_dialog(cell_key: str):
     data = st.session_state.scores[cell_key]
@@ -992,6 +1124,35 @@ def score_dialog(cell_key: str):
     number_is_valid = number == "" or number.isdigit()
     if not number_is_valid:
         st.error("選手番号は数字のみ入力してください。")
+    else:
+        try:
+            roster = get_roster()
+        except Exception:
+            roster = None
+
+        if roster is not None:
+            player = roster.find(TEAM_LABELS[team], player_class, number) if number else None
+            if player:
+                st.caption(f"👤 {player['player_name']}（{player['bibs_type']}）")
+            elif number:
+                st.caption("👤 未登録の選手番号です")
+
+            # 同じチーム・CLASSの登録選手から、入力中の番号で始まる候補を出す
+            suggestions = [
+                p for p in roster.suggest(TEAM_LABELS[team], player_class, number, limit=PLAYER_SUGGEST_LIMIT)
+                if p is not player
+            ]
+            if suggestions:
+                cols = st.columns(len(suggestions))
+                for col, p in zip(cols, suggestions):
+                    with col:
+                        st.button(
+                            f"{p['uniform_number']} {p['player_name']}",
+                            width="stretch",
+                            key=f"suggest_{cell_key}_{p['id']}",
+                            on_click=pick_player_number,
+                            args=(number_key, p["uniform_number"]),
+                        )
 
     col1, col2 = st.columns(2)
 
@@ -1006,22 +1167,18 @@ def score_dialog(cell_key: str):
                 "number": number,
             }
             st.session_state["last_selected_class"] = player_class
-            save_scores()
+            save_scores(cell_key)
             st.session_state.selected_cell = cell_key
             close_score_dialog()
             st.rerun()
 
     with col2:
         if st.button("🧹 このセルをクリア", width="stretch", key=f"clear_{cell_key}"):
-            st.session_state.scores[cell_key] = {
-                "mark": "",
-                "class": "初級",
-                "number": "",
-            }
+            st.session_state.scores.clear_cell(cell_key)
             # text_inputのkeyを直接書き換えるとStreamlitAPIExceptionになるため、
             # 次回ダイアログ生成前に削除するためのフラグだけ立てる。
             st.session_state[reset_number_key] = True
-            save_scores()
+            save_scores(cell_key)
             st.session_state.selected_cell = cell_key
             close_score_dialog()
             st.rerun()
@@ -1030,55 +1187,20 @@ def score_dialog(cell_key: str):
 # =========================
 # 集計関数
 # =========================
-def build_events(team_a_name, team_b_name):
-    rows = []
-    for score_no in range(1, 161):
-        for team in ["A", "B"]:
-            key = f"{team}_{score_no}"
-            data = st.session_state.scores[key]
-            point = POINT_MAP.get(data["mark"], 0)
-            if point <= 0:
-                continue
-            rows.append(
-                {
-                    "チーム": team_a_name if team == "A" else team_b_name,
-                    "列": team,
-                    "級": data["class"],
-                    "背番号": data["number"],
-                    "スコア番号": score_no,
-                    "記号": data["mark"],
-                    "得点": point,
-                }
-            )
-    return pd.DataFrame(rows)
-
-
-def build_summary(events_df):
-    if events_df.empty:
-        return pd.DataFrame(columns=["チーム", "級", "背番号", "得点"])
-    return (
-        events_df.groupby(["チーム", "級", "背番号"], as_index=False)["得点"]
-        .sum()
-        .sort_values(["チーム", "級", "背番号"])
-        .reset_index(drop=True)
-    )
+# 集計は ScoreState が保存・クリアのたびに差分更新しているので、
+# ここでは保持済みの値を読むだけ。
+@timed()
+def build_summary(team_a_name, team_b_name):
+    return st.session_state.scores.summary_df(team_a_name, team_b_name)
 
 
-def build_team_summary(events_df):
-    if events_df.empty:
-        return pd.DataFrame(columns=["チーム", "得点"])
-    return (
-        events_df.groupby("チーム", as_index=False)["得点"]
-        .sum()
-        .sort_values("チーム")
-        .reset_index(drop=True)
-    )
+@timed()
+def build_team_summary(team_a_name, team_b_name):
+    return st.session_state.scores.team_summary_df(team_a_name, team_b_name)
 
 
-def get_team_total(events_df, team_name):
-    if events_df.empty:
-        return 0
-    return int(events_df.loc[events_df["チーム"] == team_name, "得点"].sum())
+def get_team_total(team_code):
+    return st.session_state.scores.team_total(team_code)
 
 
 # =========================
@@ -1111,6 +1233,26 @@ st.markdown(
 
 st.markdown('<div class="glass-panel">', unsafe_allow_html=True)
 st.markdown('<div class="section-title">🏷️ チーム設定</div>', unsafe_allow_html=True)
+
+# 試合ごとにスコアシートを分けて保存する（コートごとに別の試合を選べる）
+active_games = list_games(get_conn(), status="active")
+game_labels = {g[0]: f"#{g[0]} {g[1]}（{g[3]}）" for g in active_games}
+if st.session_state.game_id not in game_labels:
+    game_labels = {st.session_state.game_id: f"#{st.session_state.game_id}", **game_labels}
+st.session_state.setdefault("game_select", st.session_state.game_id)
+
+game_col1, game_col2 = st.columns([3, 1])
+with game_col1:
+    st.selectbox(
+        "試合",
+        list(game_labels),
+        format_func=game_labels.get,
+        key="game_select",
+        on_change=on_game_select,
+    )
+with game_col2:
+    st.button("➕ 新しい試合", width="stretch", key="new_game", on_click=on_new_game)
+
 team_col1, team_col2 = st.columns(2)
 with team_col1:
     team_a_name = st.text_input("Aチーム名", value="Redチーム", key="team_a_name_input")
@@ -1118,12 +1260,11 @@ with team_col2:
     team_b_name = st.text_input("Bチーム名", value="Blueチーム", key="team_b_name_input")
 st.markdown('</div>', unsafe_allow_html=True)
 
-events_df = build_events(team_a_name, team_b_name)
-summary_df = build_summary(events_df)
-team_summary_df = build_team_summary(events_df)
+summary_df = build_summary(team_a_name, team_b_name)
+team_summary_df = build_team_summary(team_a_name, team_b_name)
 
-a_total = get_team_total(events_df, team_a_name)
-b_total = get_team_total(events_df, team_b_name)
+a_total = get_team_total("A")
+b_total = get_team_total("B")
 
 # 上部スコアボード
 a_team_safe = html_lib.escape(team_a_name)
@@ -1269,14 +1410,17 @@ else:
     start_block = 2
     end_block = 4
 
-clicked_cell = click_detector(
-    make_running_score_html(
-        st.session_state.selected_cell,
-        start_block=start_block,
-        end_block=end_block,
-    ),
-    key=f"score_click_{score_range}_{st.session_state.click_nonce}",
+running_score_html = make_running_score_html(
+    st.session_state.selected_cell,
+    start_block=start_block,
+    end_block=end_block,
 )
+# HTML の組み立ては make_running_score_html 側で計測済み。ここはコンポーネントへの受け渡し分
+with span("main.click_detector"):
+    clicked_cell = click_detector(
+        running_score_html,
+        key=f"score_click_{score_range}_{st.session_state.click_nonce}",
+    )
 
 if (
     clicked_cell in st.session_state.scores
@@ -1299,15 +1443,22 @@ if st.session_state.show_score_dialog and st.session_state.dialog_cell:
 
 st.divider()
 
+# PDFはボタンが押されたときだけ作る。入力のたびに作り直さない。
+pdf_request = (st.session_state.scores.digest(), team_a_name, team_b_name)
+
 try:
-    pdf_buffer = create_score_sheet_pdf(team_a_name, team_b_name)
-    st.download_button(
-        "📄 PDFをダウンロード",
-        data=pdf_buffer,
-        file_name="score_sheet.pdf",
-        mime="application/pdf",
-        width="stretch",
-    )
+    if st.session_state.get("pdf_request") != pdf_request:
+        if st.button("📄 PDFを作成", width="stretch", key="pdf_prepare"):
+            st.session_state.pdf_request = pdf_request
+
+    if st.session_state.get("pdf_request") == pdf_request:
+        st.download_button(
+            "📄 PDFをダウンロード",
+            data=create_score_sheet_pdf(team_a_name, team_b_name),
+            file_name="score_sheet.pdf",
+            mime="application/pdf",
+            width="stretch",
+        )
 except FileNotFoundError as e:
     st.warning(str(e))
 except Exception as e:
@@ -1315,11 +1466,19 @@ except Exception as e:
 
 st.divider()
 
+if st.button("🏁 試合終了（シーズン成績に記録）", width="stretch", key="finish_game"):
+    try:
+        finish_game(team_a_name, team_b_name)
+        st.success("試合を終了し、シーズン成績に記録しました。")
+    except Exception as e:
+        st.error(f"シーズン成績への記録に失敗しました: {e}")
+
 if st.button("🧹 入力をすべてリセット", type="secondary"):
-    st.session_state.scores = default_scores()
+    reset_scores()
     st.session_state.selected_cell = ""
-    save_scores()
     close_score_dialog()
     st.rerun()
 
-st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('</div>', unsafe_allow_html=True)
+
+rerun_end("main", _perf_started)
@@ -0,0 +1,25 @@
+"""アプリを止めた状態で行うDBの保守作業。リポジトリ直下から実行する:
+
+    python maintenance.py auto-vacuum            # data/events.db を auto_vacuum=INCREMENTAL に切り替える
+    python maintenance.py auto-vacuum other.db
+"""
+
+import argparse
+
+from lib_db import DB_PATH, convert_auto_vacuum
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DBの保守作業（アプリ停止中に実行）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    vacuum = sub.add_parser("auto-vacuum", help="既存DBを auto_vacuum=INCREMENTAL に切り替える（VACUUM で全体を書き直す）")
+    vacuum.add_argument("db", nargs="?", default=str(DB_PATH))
+    args = parser.parse_args()
+
+    if args.command == "auto-vacuum":
+        changed = convert_auto_vacuum(args.db)
+        print(f"{args.db}: " + ("INCREMENTAL に切り替えました" if changed else "すでに INCREMENTAL です"))
+
+
+if __name__ == "__main__":
+    main()
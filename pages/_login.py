@@ -1,6 +1,7 @@
 import streamlit as st
 from lib_db import get_conn, inject_css, inject_mobile_big_ui
-from app_auth import ensure_users_table, users_count, create_user, authenticate
+from app_auth import (ensure_users_table, users_count, create_user, authenticate, sign_in,
+    AuthBusy, login_retry_after, session_cookie_saved)
 
 # =========================
 # ページ設定
@@ -120,6 +121,14 @@ input {
 conn = get_conn()
 ensure_users_table(conn)
 
+
+def go_main():
+    st.session_state.pop("login_redirect_pending", None)
+    try:
+        st.switch_page("main.py")
+    except Exception:
+        pass
+
 # =========================
 # ヘッダー
 # =========================
@@ -140,6 +149,16 @@ st.markdown("""
 # =========================
 st.markdown('<div class="card">', unsafe_allow_html=True)
 
+# ログイン直後は、Cookieの書き込み（コンポーネントの描画）が済んでから画面を移る
+if st.session_state.get("login_redirect_pending"):
+    if session_cookie_saved():
+        go_main()
+    st.success("ログイン成功")
+    st.info("ログイン情報を保存しています…")
+    if st.button("メイン画面へ進む", key="login_continue"):
+        go_main()
+    st.stop()
+
 # 初回
 if users_count(conn) == 0:
 
@@ -172,16 +191,24 @@ else:
         ok = st.form_submit_button("ログイン")
 
     if ok:
-        user = authenticate(conn, username, password)
-        if user:
-            st.session_state["auth_user"] = user
-            st.success("ログイン成功")
-
+        user, message = None, "認証失敗"
+        retry = login_retry_after(username)
+        if retry:
+            message = f"ログインに続けて失敗したため、{retry}秒後に再度お試しください"
+        else:
             try:
-                st.switch_page("main.py")
-            except Exception:
-                pass
+                user = authenticate(conn, username, password)
+            except AuthBusy as e:
+                message = str(e)
+        if user:
+            if sign_in(conn, user):
+                # この実行では Cookie を書くコンポーネントを描画させ、移動は次の実行で行う
+                st.session_state["login_redirect_pending"] = True
+                st.success("ログイン成功")
+                st.button("メイン画面へ進む", key="login_continue")
+            else:
+                go_main()
         else:
-            st.error("認証失敗")
+            st.error(message)
 
 st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
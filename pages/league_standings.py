@@ -0,0 +1,122 @@
+import os
+import sys
+
+import streamlit as st
+
+# =========================
+# ページ設定
+# =========================
+if not st.session_state.get("_pc_set", False):
+    try:
+        st.set_page_config(
+            page_title="🏆 シーズン成績",
+            page_icon="🏆",
+            layout="wide",
+            initial_sidebar_state="collapsed",
+        )
+    except Exception:
+        pass
+    st.session_state["_pc_set"] = True
+
+st.markdown("""
+<style>
+[data-testid="stSidebarNav"] a[href*="_login"],
+[data-testid="stSidebarNav"] a[href*="%5Flogin"],
+[data-testid="stSidebarNav"] a[href*="login"] {
+    display: none !important;
+}
+</style>
+""", unsafe_allow_html=True)
+
+# =========================
+# import path
+# =========================
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app_auth
+from lib_db import inject_css, inject_mobile_big_ui
+from lib_league import (
+    get_league_conn,
+    read_class_leaders,
+    read_head_to_head,
+    read_player_points_per_game,
+    read_standings,
+    read_team_names,
+)
+from lib_score import CLASS_OPTIONS
+
+inject_css()
+inject_mobile_big_ui()
+
+# =========================
+# 認証
+# =========================
+app_auth.require_login()
+try:
+    app_auth.render_userbox(key="logout_button_league_standings")
+except TypeError:
+    app_auth.render_userbox()
+
+# =========================
+# シーズン成績（サマリー表だけを読むので試合数が増えても軽い）
+# =========================
+st.title("🏆 シーズン成績")
+st.caption("main画面の「試合終了」で記録した試合を集計しています。")
+
+conn = get_league_conn()
+standings = read_standings(conn)
+if standings.empty:
+    st.info("まだ記録された試合がありません。")
+    st.stop()
+
+st.subheader("順位表")
+st.dataframe(standings, width="stretch", hide_index=True)
+
+st.subheader("CLASS別 得点上位")
+leader_class = st.selectbox("CLASS", ["すべて", *CLASS_OPTIONS], key="league_leader_class")
+leader_limit = st.number_input("上位", min_value=1, max_value=50, value=5, step=1, key="league_leader_limit")
+leaders = read_class_leaders(
+    conn,
+    class_type=None if leader_class == "すべて" else leader_class,
+    limit=int(leader_limit),
+)
+if leaders.empty:
+    st.info("得点の記録がありません。")
+else:
+    st.dataframe(leaders, width="stretch", hide_index=True)
+
+st.subheader("選手別 1試合平均得点")
+min_games = st.number_input("最少試合数", min_value=1, value=1, step=1, key="league_min_games")
+per_game = read_player_points_per_game(conn, min_games=int(min_games))
+if per_game.empty:
+    st.info("条件に合う選手がいません。")
+else:
+    st.dataframe(per_game, width="stretch", height=420, hide_index=True)
+
+st.subheader("対戦成績")
+teams = read_team_names(conn)
+if len(teams) < 2:
+    st.info("対戦成績を見るには2チーム以上の記録が必要です。")
+else:
+    col_team, col_opp = st.columns(2)
+    with col_team:
+        team = st.selectbox("チーム", teams, key="league_h2h_team")
+    with col_opp:
+        opponents = [t for t in teams if t != team]
+        opponent = st.selectbox("相手", opponents, key="league_h2h_opponent")
+    h2h = read_head_to_head(conn, team, opponent)
+    cols = st.columns(4)
+    cols[0].metric("試合", h2h["games"])
+    cols[1].metric("勝-敗-分", f"{h2h['wins']}-{h2h['losses']}-{h2h['draws']}")
+    cols[2].metric("得点", h2h["points_for"])
+    cols[3].metric("失点", h2h["points_against"])
+
+st.divider()
+
+if hasattr(st, "page_link"):
+    st.page_link("main.py", label="⬅️ main画面へ戻る", icon="🏠")
+else:
+    if st.button("⬅️ main画面へ戻る"):
+        st.switch_page("main.py")
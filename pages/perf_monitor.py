@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+
+import pandas as pd
+import streamlit as st
+
+# =========================
+# ページ設定
+# =========================
+if not st.session_state.get("_pc_set", False):
+    try:
+        st.set_page_config(
+            page_title="⏱️ 処理時間",
+            page_icon="⏱️",
+            layout="wide",
+            initial_sidebar_state="collapsed",
+        )
+    except Exception:
+        pass
+    st.session_state["_pc_set"] = True
+
+st.markdown("""
+<style>
+[data-testid="stSidebarNav"] a[href*="_login"],
+[data-testid="stSidebarNav"] a[href*="%5Flogin"],
+[data-testid="stSidebarNav"] a[href*="login"] {
+    display: none !important;
+}
+</style>
+""", unsafe_allow_html=True)
+
+# =========================
+# import path
+# =========================
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app_auth
+import lib_perf
+from lib_db import inject_css, inject_mobile_big_ui
+
+inject_css()
+inject_mobile_big_ui()
+
+# =========================
+# 認証（管理者のみ）
+# =========================
+app_auth.require_login()
+try:
+    app_auth.render_userbox(key="logout_button_perf_monitor")
+except TypeError:
+    app_auth.render_userbox()
+
+me = app_auth.get_current_user()
+if not me or me.get("role") != "admin":
+    st.error("このページは管理者のみ利用できます。")
+    st.stop()
+
+# =========================
+# 計測の切り替え
+# =========================
+st.title("⏱️ 処理時間（全セッション）")
+st.caption(
+    f"関数ごとの所要時間を直近 {lib_perf.SAMPLE_LIMIT} 回分から集計します。"
+    f"起動時から有効にするには環境変数 {lib_perf.PERF_ENV}=1 を設定してください。"
+)
+
+# 切り替えはプロセス全体に効く。他の管理者が切り替えた値で上書きし合わないよう、
+# このセッションで操作したときだけ反映し、表示は毎回いまの状態に合わせる
+def on_perf_toggle():
+    lib_perf.set_enabled(st.session_state.perf_enabled)
+
+
+st.session_state.perf_enabled = lib_perf.is_enabled()
+st.toggle("計測する", key="perf_enabled", on_change=on_perf_toggle)
+
+# =========================
+# 集計
+# =========================
+stats = lib_perf.perf_stats()
+if not stats:
+    st.info("まだ計測結果がありません。計測を有効にして各画面を操作してください。")
+else:
+    df = pd.DataFrame(stats).rename(columns={
+        "name": "処理",
+        "count": "回数",
+        "p50_ms": "p50 (ms)",
+        "p95_ms": "p95 (ms)",
+        "max_ms": "最大 (ms)",
+        "total_ms": "合計 (ms)",
+    })
+    st.dataframe(df, width="stretch", height=480, hide_index=True)
+
+col_json, col_reset = st.columns(2)
+with col_json:
+    st.download_button(
+        "⬇️ JSONで保存",
+        data=lib_perf.perf_json(),
+        file_name=f"perf_{time.strftime('%Y%m%d_%H%M%S')}.json",
+        mime="application/json",
+        width="stretch",
+        disabled=not stats,
+    )
+with col_reset:
+    if st.button("🧹 計測結果をクリア", width="stretch", disabled=not stats):
+        lib_perf.reset_perf()
+        st.rerun()
+
+st.divider()
+
+if hasattr(st, "page_link"):
+    st.page_link("main.py", label="⬅️ main画面へ戻る", icon="🏠")
+else:
+    if st.button("⬅️ main画面へ戻る"):
+        st.switch_page("main.py")
@@ -1,11 +1,22 @@
-import json
-import sqlite3
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
 from app_auth import require_login, render_userbox
+from lib_db import writing
+from lib_perf import timed, rerun_start, rerun_end
+from lib_players import (
+    PLAYERS_DB_PATH,
+    get_players_conn,
+    get_roster,
+    get_roster_store,
+    import_players,
+    invalidate_roster,
+    iter_player_records,
+)
+
+_perf_started = rerun_start()
 
 
 # =========================
@@ -32,7 +43,7 @@ except TypeError:
 # =========================
 # 定数
 # =========================
-DB_PATH = "players.db"
+DB_PATH = PLAYERS_DB_PATH
 JSON_PATH = Path("players.json")
 
 PLAYER_COLUMNS = [
@@ -61,18 +72,6 @@ def normalize_player_df(df):
     return df[PLAYER_COLUMNS]
 
 
-def next_json_id(df):
-    """JSON保存時の次IDを採番する。"""
-    if df.empty or "id" not in df.columns:
-        return 1
-
-    numeric_ids = pd.to_numeric(df["id"], errors="coerce").dropna()
-    if numeric_ids.empty:
-        return 1
-
-    return int(numeric_ids.max()) + 1
-
-
 def safe_rerun():
     try:
         st.rerun()
@@ -84,29 +83,23 @@ def safe_rerun():
 # JSON操作
 # ※ init_json より先に定義することが重要
 # =========================
+# players.json は RosterStore（索引付き・追記ログ）経由で読み書きする。
+# 登録・削除は players.log への1行追記だけで、全体の書き直しはしない。
+def roster_store():
+    return get_roster_store(JSON_PATH)
+
+
 def save_players_json(df):
-    """players.json に選手一覧を保存する。"""
+    """players.json に選手一覧を保存する（全件置き換え）。"""
     df = normalize_player_df(df)
-    data = df.to_dict(orient="records")
-
-    with JSON_PATH.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    roster_store().replace_all(df.to_dict(orient="records"))
 
 
+@timed()
 def load_players_json():
-    """players.json から選手一覧を読み込む。存在しなければ空で作成する。"""
-    if not JSON_PATH.exists():
-        save_players_json(pd.DataFrame(columns=PLAYER_COLUMNS))
-
+    """players.json から選手一覧を読み込む。"""
     try:
-        with JSON_PATH.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if not isinstance(data, list):
-            st.warning("⚠️ players.json の形式が不正です。空データとして扱います。")
-            return pd.DataFrame(columns=PLAYER_COLUMNS)
-
-        return normalize_player_df(pd.DataFrame(data))
+        return normalize_player_df(pd.DataFrame(roster_store().players()))
     except Exception as e:
         st.error(f"❌ JSONファイルの読み込みに失敗しました: {e}")
         return pd.DataFrame(columns=PLAYER_COLUMNS)
@@ -115,77 +108,38 @@ def load_players_json():
 def init_json():
     """初回起動時に players.json を作成する。"""
     if not JSON_PATH.exists():
-        save_players_json(pd.DataFrame(columns=PLAYER_COLUMNS))
+        roster_store().compact()
 
 
 def save_player_json(uniform_number, player_name, team, bibs_type, class_type):
     """JSONへ選手を登録する。重複データは登録しない。"""
-    df = load_players_json()
-
-    duplicate = df[
-        (df["uniform_number"].astype(str) == str(uniform_number))
-        & (df["player_name"].astype(str) == str(player_name))
-        & (df["team"].astype(str) == str(team))
-        & (df["bibs_type"].astype(str) == str(bibs_type))
-        & (df["class_type"].astype(str) == str(class_type))
-    ]
-
-    if not duplicate.empty:
-        return False
-
-    new_row = {
-        "id": next_json_id(df),
-        "uniform_number": str(uniform_number),
-        "player_name": str(player_name),
-        "team": str(team),
-        "bibs_type": str(bibs_type),
-        "class_type": str(class_type),
-    }
-
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    save_players_json(df)
-    return True
+    return roster_store().add(uniform_number, player_name, team, bibs_type, class_type)
 
 
 def delete_player_json(player_id):
     """JSONから指定IDの選手を削除する。"""
-    df = load_players_json()
-    df = df[pd.to_numeric(df["id"], errors="coerce") != int(player_id)]
-    save_players_json(df)
+    roster_store().delete(player_id)
 
 
 # =========================
 # SQLite操作
 # =========================
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS players (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                uniform_number TEXT NOT NULL,
-                player_name TEXT NOT NULL,
-                team TEXT NOT NULL,
-                bibs_type TEXT NOT NULL,
-                class_type TEXT NOT NULL,
-                UNIQUE(uniform_number, player_name, team, bibs_type, class_type)
-            );
-            """
-        )
-        conn.commit()
+    # テーブル作成は lib_players の接続初期化で1回だけ行う
+    get_players_conn(DB_PATH)
 
 
+@timed()
 def fetch_players_sqlite():
-    with sqlite3.connect(DB_PATH) as conn:
-        df = pd.read_sql_query("SELECT * FROM players", conn)
-    return normalize_player_df(df)
+    # 共有の名簿キャッシュ（lib_players）を使う。書き込み後は invalidate_roster() で読み直す
+    return normalize_player_df(get_roster(DB_PATH).df)
 
 
+@timed()
 def save_player_sqlite(uniform_number, player_name, team, bibs_type, class_type):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            before = conn.total_changes
-            conn.execute(
+        with writing(get_players_conn(DB_PATH)) as conn:
+            cur = conn.execute(
                 """
                 INSERT OR IGNORE INTO players
                 (uniform_number, player_name, team, bibs_type, class_type)
@@ -193,9 +147,8 @@ def save_player_sqlite(uniform_number, player_name, team, bibs_type, class_type)
                 """,
                 (uniform_number, player_name, team, bibs_type, class_type),
             )
-            conn.commit()
-            after = conn.total_changes
-        return after > before
+        invalidate_roster()
+        return cur.rowcount > 0
     except Exception as e:
         st.error(f"❌ 登録中にエラーが発生しました: {e}")
         return False
@@ -203,9 +156,9 @@ def save_player_sqlite(uniform_number, player_name, team, bibs_type, class_type)
 
 def delete_player_sqlite(player_id):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with writing(get_players_conn(DB_PATH)) as conn:
             conn.execute("DELETE FROM players WHERE id = ?", (player_id,))
-            conn.commit()
+        invalidate_roster()
     except Exception as e:
         st.error(f"❌ 削除中にエラーが発生しました: {e}")
 
@@ -219,33 +172,20 @@ def export_sqlite_to_json():
 
 
 def import_json_to_sqlite():
-    df = load_players_json()
-    if df.empty:
-        return 0
-
-    inserted_count = 0
-    with sqlite3.connect(DB_PATH) as conn:
-        for _, row in df.iterrows():
-            before = conn.total_changes
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO players
-                (uniform_number, player_name, team, bibs_type, class_type)
-                VALUES (?, ?, ?, ?, ?);
-                """,
-                (
-                    str(row.get("uniform_number", "")),
-                    str(row.get("player_name", "")),
-                    str(row.get("team", "")),
-                    str(row.get("bibs_type", "")),
-                    str(row.get("class_type", "")),
-                ),
-            )
-            if conn.total_changes > before:
-                inserted_count += 1
-        conn.commit()
+    """players.json をSQLiteへ取り込み、(追加件数, スキップ件数) を返す。"""
+    try:
+        return import_players(get_players_conn(DB_PATH), roster_store().players())
+    finally:
+        invalidate_roster()
 
-    return inserted_count
+
+@timed()
+def import_roster_file(uploaded_file):
+    """アップロードされた名簿（JSON / CSV / Excel）をSQLiteへ一括登録する。"""
+    try:
+        return import_players(get_players_conn(DB_PATH), iter_player_records(uploaded_file, uploaded_file.name))
+    finally:
+        invalidate_roster()
 
 
 # =========================
@@ -546,13 +486,33 @@ with sync_col1:
 
 with sync_col2:
     if st.button("📥 JSON → SQLiteへ取り込み", key="import_json_sqlite"):
-        count = import_json_to_sqlite()
-        st.success(f"✅ JSONからSQLiteへ取り込みました。追加件数: {count}件")
+        try:
+            inserted, skipped = import_json_to_sqlite()
+            st.success(f"✅ JSONからSQLiteへ取り込みました。追加件数: {inserted}件（スキップ: {skipped}件）")
+        except Exception as e:
+            st.error(f"❌ JSONの取り込みに失敗しました: {e}")
+
+if storage_type == "SQLite":
+    with st.expander("📦 名簿ファイルから一括登録（JSON / CSV / Excel）"):
+        roster_file = st.file_uploader(
+            "名簿ファイル",
+            type=["json", "csv", "xlsx"],
+            key="roster_file",
+            help="見出しは uniform_number / player_name / team / bibs_type / class_type、"
+                 "または 背番号 / プレイヤー名 / TEAM / ビブスType / CLASS。",
+        )
+        if roster_file is not None and st.button("📥 一括登録", key="import_roster_file"):
+            try:
+                inserted, skipped = import_roster_file(roster_file)
+                st.success(f"✅ {inserted}件を登録しました（重複・不備によるスキップ: {skipped}件）")
+            except Exception as e:
+                st.error(f"❌ 名簿の取り込みに失敗しました: {e}")
 
 
 # =========================
 # 現在データ取得
 # =========================
+@timed()
 def fetch_players():
     if storage_type == "JSON":
         return load_players_json()
@@ -694,3 +654,5 @@ if not df.empty:
             safe_rerun()
         else:
             st.warning("⚠️ 削除する場合は確認チェックを入れてください。")
+
+rerun_end("player_registration", _perf_started)
@@ -1,14 +1,17 @@
 # pages/01_集計.py
 
-import json
-import sqlite3
 import textwrap
-from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
 from app_auth import require_login, render_userbox
+from lib_db import get_conn, list_games, read_score_cells_frame, get_score_version
+from lib_score import PlayerIndex, build_events_frame, attach_player_names
+from lib_players import get_roster, roster_version as current_roster_version
+from lib_perf import timed, rerun_start, rerun_end
+
+_perf_started = rerun_start()
 
 
 # =========================
@@ -33,16 +36,6 @@ render_userbox()
 # =========================
 # 定数
 # =========================
-DATA_FILE = Path("score_sheet_data.json")
-PLAYERS_DB_PATH = "players.db"
-
-POINT_MAP = {
-    "": 0,
-    "1点": 1,
-    "2点": 2,
-    "3点": 3,
-}
-
 CLASS_ORDER = ["初級", "中級", "上級"]
 
 
@@ -56,6 +49,7 @@ def render_html(content):
 # =========================
 # デザインCSS
 # =========================
+@timed()
 def inject_style():
     render_html(
         """
@@ -598,130 +592,34 @@ def inject_style():
 # =========================
 # データ読み込み
 # =========================
-def load_scores():
-    if not DATA_FILE.exists():
-        return {}
-
+# キャッシュ付きの load_dashboard から呼ばれるので、ここでは画面に何も出さない。
+# 失敗は messages に (st の関数名, 文言) で積み、render_dashboard が表示する。
+@timed()
+def load_score_frame(game_id, messages):
     try:
-        with DATA_FILE.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        return read_score_cells_frame(get_conn(), game_id)
     except Exception as e:
-        st.error(f"スコアデータの読み込みに失敗しました: {e}")
-        return {}
+        messages.append(("error", f"スコアデータの読み込みに失敗しました: {e}"))
+        return pd.DataFrame(columns=["team", "score_no", "mark", "class", "number"])
 
 
-def load_players():
+@timed()
+def load_player_index(messages):
     try:
-        with sqlite3.connect(PLAYERS_DB_PATH) as conn:
-            return pd.read_sql_query(
-                """
-                SELECT
-                    uniform_number,
-                    player_name,
-                    team,
-                    bibs_type,
-                    class_type
-                FROM players
-                """,
-                conn,
-            )
+        return get_roster().index
     except Exception as e:
-        st.warning(f"選手データの読み込みに失敗しました: {e}")
-        return pd.DataFrame(
-            columns=[
-                "uniform_number",
-                "player_name",
-                "team",
-                "bibs_type",
-                "class_type",
-            ]
-        )
+        messages.append(("warning", f"選手データの読み込みに失敗しました: {e}"))
+        return PlayerIndex(pd.DataFrame())
 
 
 # =========================
 # 集計関数
 # =========================
-def build_events(scores):
-    rows = []
-
-    for key, data in scores.items():
-        try:
-            team_code, score_no = key.split("_")
-        except ValueError:
-            continue
-
-        mark = data.get("mark", "")
-        point = POINT_MAP.get(mark, 0)
-
-        if point <= 0:
-            continue
-
-        team_name = "Red" if team_code == "A" else "Blue"
-
-        rows.append(
-            {
-                "TEAM": team_name,
-                "列": team_code,
-                "CLASS": data.get("class", ""),
-                "背番号": str(data.get("number", "")).strip(),
-                "スコア番号": int(score_no),
-                "得点種別": mark,
-                "得点": point,
-            }
-        )
-
-    return pd.DataFrame(rows)
-
-
-def attach_player_names(events_df, players_df):
-    if events_df.empty:
-        return events_df
-
-    if players_df.empty:
-        events_df = events_df.copy()
-        events_df["名前"] = ""
-        events_df["ビブスType"] = ""
-        return events_df
-
-    players_df = players_df.copy()
-    players_df["uniform_number"] = players_df["uniform_number"].astype(str).str.strip()
-    players_df["class_type"] = players_df["class_type"].astype(str).str.strip()
-    players_df["team"] = players_df["team"].astype(str).str.strip()
-
-    events_df = events_df.copy()
-    events_df["背番号"] = events_df["背番号"].astype(str).str.strip()
-    events_df["CLASS"] = events_df["CLASS"].astype(str).str.strip()
-    events_df["TEAM"] = events_df["TEAM"].astype(str).str.strip()
-
-    merged = events_df.merge(
-        players_df,
-        left_on=["背番号", "CLASS", "TEAM"],
-        right_on=["uniform_number", "class_type", "team"],
-        how="left",
-    )
-
-    merged.rename(
-        columns={
-            "player_name": "名前",
-            "bibs_type": "ビブスType",
-        },
-        inplace=True,
-    )
-
-    if "名前" not in merged.columns:
-        merged["名前"] = ""
-
-    if "ビブスType" not in merged.columns:
-        merged["ビブスType"] = ""
-
-    merged["名前"] = merged["名前"].fillna("")
-    merged["ビブスType"] = merged["ビブスType"].fillna("")
-
-    # 選手DBに存在しない背番号は、集計上「未登録選手」として扱う
-    merged.loc[merged["名前"].astype(str).str.strip() == "", "名前"] = "未登録選手"
-    merged.loc[merged["ビブスType"].astype(str).str.strip() == "", "ビブスType"] = "不明"
-
-    return merged
+@timed()
+def build_events(game_id, messages=None):
+    if game_id is None:
+        return build_events_frame(None)
+    return build_events_frame(load_score_frame(game_id, [] if messages is None else messages))
 
 
 def sort_class_team(df, columns):
@@ -734,6 +632,55 @@ def sort_class_team(df, columns):
     return df.sort_values(columns).reset_index(drop=True)
 
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_dashboard(game_id, score_version, roster_version):
+    """全セッションで共有する集計結果。
+
+    score_version はスコア保存のたびに増えるため、閲覧者が何人いても
+    スコアか選手DBが更新されたときに1回だけ計算し直す。
+    読み込みに失敗した場合は messages に文言が入る（表示は呼び出し側）。
+    """
+    messages = []
+    events_df = attach_player_names(build_events(game_id, messages), load_player_index(messages))
+
+    if events_df.empty:
+        return {"events": events_df, "messages": messages}
+
+    team_summary = (
+        events_df.groupby("TEAM", as_index=False)["得点"]
+        .sum()
+        .sort_values("TEAM")
+        .reset_index(drop=True)
+    )
+
+    class_summary = (
+        events_df.groupby(["CLASS", "TEAM"], as_index=False)["得点"]
+        .sum()
+        .reset_index(drop=True)
+    )
+    class_summary = sort_class_team(class_summary, ["CLASS", "TEAM"])
+
+    player_summary = (
+        events_df.groupby(
+            ["TEAM", "CLASS", "背番号", "名前", "ビブスType"],
+            as_index=False,
+        )["得点"]
+        .sum()
+        .reset_index(drop=True)
+    )
+    player_summary = sort_class_team(player_summary, ["TEAM", "CLASS", "背番号"])
+
+    return {
+        "events": events_df,
+        "red_total": int(events_df.loc[events_df["TEAM"] == "Red", "得点"].sum()),
+        "blue_total": int(events_df.loc[events_df["TEAM"] == "Blue", "得点"].sum()),
+        "team_summary": team_summary,
+        "class_summary": class_summary,
+        "player_summary": player_summary,
+        "messages": messages,
+    }
+
+
 def calc_leader(red_total, blue_total):
     if red_total == blue_total:
         return "引き分け", ""
@@ -986,121 +933,125 @@ render_html(
     """,
 )
 
-scores = load_scores()
-players_df = load_players()
-
-events_df = build_events(scores)
-events_df = attach_player_names(events_df, players_df)
-
-if events_df.empty:
-    render_html(
-        """
-        <div class="empty-card">
-            <div class="empty-title">まだ集計対象データがありません</div>
-            <div class="empty-text">スコア入力画面で得点を登録すると、この画面に集計結果が表示されます。</div>
-        </div>
-        """,
-    )
-
-    st.divider()
-
-    if hasattr(st, "page_link"):
-        st.page_link("main.py", label="⬅️ main画面へ戻る", icon="🏠")
-    else:
-        if st.button("⬅️ main画面へ戻る"):
-            st.switch_page("main.py")
-
-    st.stop()
-
-
-# =========================
-# 合計スコア
-# =========================
-red_total = int(events_df.loc[events_df["TEAM"] == "Red", "得点"].sum())
-blue_total = int(events_df.loc[events_df["TEAM"] == "Blue", "得点"].sum())
-
-render_score_board(red_total, blue_total)
-# グラフ表示は不要のため、得点シェアバーは表示しない
-# render_team_share(red_total, blue_total)
+games = list_games(get_conn())
+game_labels = {
+    g[0]: f"#{g[0]} {g[1]}（{g[3]}）" + ("" if g[2] == "active" else " 終了")
+    for g in games
+}
+game_id = st.selectbox("試合", list(game_labels), format_func=game_labels.get) if games else None
+
+def dashboard_key(game_id):
+    """集計結果が変わったかどうかの目印。主キー1件の参照と名簿の更新時刻だけで求まる。"""
+    score_version = get_score_version(get_conn(), game_id) if game_id is not None else 0
+    return game_id, score_version, current_roster_version()
+
+
+@timed()
+def render_dashboard(game_id):
+    """スコアボード・TOP3・各テーブル。絞り込みの操作ではこの部分だけを再実行する。"""
+    # 版数が変わっていなければ集計はキャッシュから返る
+    key = dashboard_key(game_id)
+    _, score_version, roster_version = key
+    dashboard = load_dashboard(game_id, score_version, roster_version)
+    if dashboard["messages"]:
+        for level, message in dashboard["messages"]:
+            getattr(st, level)(message)
+        # 読み込みに失敗した結果はキャッシュに残さず、次の再実行で読み直す
+        load_dashboard.clear(game_id, score_version, roster_version)
+        key = None
+    st.session_state.dashboard_rendered = key
+    events_df = dashboard["events"]
 
+    if events_df.empty:
+        render_html(
+            """
+            <div class="empty-card">
+                <div class="empty-title">まだ集計対象データがありません</div>
+                <div class="empty-text">スコア入力画面で得点を登録すると、この画面に集計結果が表示されます。</div>
+            </div>
+            """,
+        )
+        return
 
-# =========================
-# サマリ作成
-# =========================
-team_summary = (
-    events_df.groupby("TEAM", as_index=False)["得点"]
-    .sum()
-    .sort_values("TEAM")
-    .reset_index(drop=True)
-)
+    # 合計スコア
+    red_total = dashboard["red_total"]
+    blue_total = dashboard["blue_total"]
 
-class_summary = (
-    events_df.groupby(["CLASS", "TEAM"], as_index=False)["得点"]
-    .sum()
-    .reset_index(drop=True)
-)
-class_summary = sort_class_team(class_summary, ["CLASS", "TEAM"])
-
-player_summary = (
-    events_df.groupby(
-        ["TEAM", "CLASS", "背番号", "名前", "ビブスType"],
-        as_index=False,
-    )["得点"]
-    .sum()
-    .reset_index(drop=True)
-)
-player_summary = sort_class_team(player_summary, ["TEAM", "CLASS", "背番号"])
+    render_score_board(red_total, blue_total)
+    # グラフ表示は不要のため、得点シェアバーは表示しない
+    # render_team_share(red_total, blue_total)
 
+    # サマリ作成
+    team_summary = dashboard["team_summary"]
+    class_summary = dashboard["class_summary"]
+    player_summary = dashboard["player_summary"]
 
-section_header("🏆", "得点ランキング TOP3", "得点上位の選手をカードで見やすく表示します。")
-render_top_players(player_summary)
+    section_header("🏆", "得点ランキング TOP3", "得点上位の選手をカードで見やすく表示します。")
+    render_top_players(player_summary)
 
+    # チーム別合計
+    section_header("📌", "チーム別合計", "Red / Blue の総得点を比較します。")
+    render_table(team_summary)
 
-# =========================
-# チーム別合計
-# =========================
-section_header("📌", "チーム別合計", "Red / Blue の総得点を比較します。")
-render_table(team_summary)
+    # CLASS別・チーム別得点
+    section_header("🚀", "CLASS別・チーム別得点", "初級・中級・上級ごとの得点バランスを確認できます。")
+    render_class_cards(class_summary)
 
+    # 選手別集計
+    section_header("🏅", "選手別集計", "選手ごとの得点合計を確認します。得点王探しに便利です。")
+    render_table(player_summary, height=360)
 
-# =========================
-# CLASS別・チーム別得点
-# =========================
-section_header("🚀", "CLASS別・チーム別得点", "初級・中級・上級ごとの得点バランスを確認できます。")
-render_class_cards(class_summary)
+    # CLASS × TEAM フィルター
+    section_header("🔍", "CLASS × TEAM 絞り込み", "CLASSやTEAMを指定して、対象選手だけを絞り込めます。")
 
+    col_cls, col_team = st.columns(2)
 
-# =========================
-# 選手別集計
-# =========================
-section_header("🏅", "選手別集計", "選手ごとの得点合計を確認します。得点王探しに便利です。")
-render_table(player_summary, height=360)
+    with col_cls:
+        class_options = ["すべて"] + sorted(events_df["CLASS"].dropna().unique().tolist())
+        selected_class = st.selectbox("CLASS", class_options, key="filter_class")
 
+    with col_team:
+        team_options = ["すべて"] + sorted(events_df["TEAM"].dropna().unique().tolist())
+        selected_team = st.selectbox("TEAM", team_options, key="filter_team")
 
-# =========================
-# CLASS × TEAM フィルター
-# =========================
-section_header("🔍", "CLASS × TEAM 絞り込み", "CLASSやTEAMを指定して、対象選手だけを絞り込めます。")
+    filtered_df = player_summary.copy()
 
-col_cls, col_team = st.columns(2)
+    if selected_class != "すべて":
+        filtered_df = filtered_df[filtered_df["CLASS"] == selected_class]
 
-with col_cls:
-    class_options = ["すべて"] + sorted(events_df["CLASS"].dropna().unique().tolist())
-    selected_class = st.selectbox("CLASS", class_options)
+    if selected_team != "すべて":
+        filtered_df = filtered_df[filtered_df["TEAM"] == selected_team]
 
-with col_team:
-    team_options = ["すべて"] + sorted(events_df["TEAM"].dropna().unique().tolist())
-    selected_team = st.selectbox("TEAM", team_options)
+    render_table(filtered_df, height=320)
 
-filtered_df = player_summary.copy()
 
-if selected_class != "すべて":
-    filtered_df = filtered_df[filtered_df["CLASS"] == selected_class]
+def watch_dashboard(game_id):
+    """自動更新の見張り。版数だけを確かめ、描画済みの集計から変わったときだけページを再実行する。
 
-if selected_team != "すべて":
-    filtered_df = filtered_df[filtered_df["TEAM"] == selected_team]
+    変わっていなければ何も描かないので、表やグラフを送り直さない。
+    """
+    if dashboard_key(game_id) != st.session_state.get("dashboard_rendered"):
+        st.rerun()
+
+
+# TV表示などで画面を開きっぱなしにする場合は ?auto=1 で自動更新を既定ONにできる
+auto_col, interval_col = st.columns([1, 1])
+with auto_col:
+    auto_refresh = st.toggle("🔄 自動更新", value=st.query_params.get("auto") == "1", key="auto_refresh")
+with interval_col:
+    refresh_seconds = st.selectbox(
+        "更新間隔（秒）",
+        [5, 10, 30, 60],
+        index=1,
+        key="auto_refresh_seconds",
+        disabled=not auto_refresh,
+    )
 
-render_table(filtered_df, height=320)
+# 絞り込みの操作ではダッシュボード部分だけを描き直す。自動更新は見張りのフラグメントが
+# 一定間隔で版数を確かめ、スコアか名簿が更新されたときだけページ全体を再実行する
+st.fragment(render_dashboard)(game_id)
+if auto_refresh:
+    st.fragment(watch_dashboard, run_every=refresh_seconds)(game_id)
 
 st.divider()
 
@@ -1109,3 +1060,5 @@ if hasattr(st, "page_link"):
 else:
     if st.button("⬅️ main画面へ戻る"):
         st.switch_page("main.py")
+
+rerun_end("score_analytics", _perf_started)
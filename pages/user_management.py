@@ -395,16 +395,26 @@ def safe_rerun():
 conn = get_conn()
 app_auth.ensure_users_table(conn)
 
-rows = app_auth.list_users(conn)
-df = (
-    pd.DataFrame(rows, columns=["id", "username", "role", "created_at"])
-    if rows
-    else pd.DataFrame(columns=["id", "username", "role", "created_at"])
-)
+counts = app_auth.user_role_counts()
+admin_count = int(counts.get("admin", 0))
+user_count = int(counts.get("user", 0))
+total_count = int(sum(counts.values()))
+
+USER_COLUMNS = ["id", "username", "role", "created_at"]
+
+
+def reset_user_pages():
+    st.session_state["user_page_cursors"] = [None]
+
+
+def move_user_page(cursor):
+    cursors = st.session_state.setdefault("user_page_cursors", [None])
+    if cursor is None:
+        if len(cursors) > 1:
+            cursors.pop()
+    else:
+        cursors.append(cursor)
 
-admin_count = int((df["role"] == "admin").sum()) if not df.empty else 0
-user_count = int((df["role"] == "user").sum()) if not df.empty else 0
-total_count = int(len(df))
 
 # =========================
 # ヘッダー
@@ -448,23 +458,36 @@ st.markdown(
 # =========================
 section_header("👥", "ユーザー一覧", "登録済みユーザーを確認し、条件で絞り込みできます。")
 
-if df.empty:
+df = pd.DataFrame(columns=USER_COLUMNS)
+if total_count == 0:
     st.info("ユーザーがいません。まずは『ユーザー追加』から作成してください。")
 else:
     with st.expander("🔎 フィルタ", expanded=False):
         c1, c2 = st.columns(2)
         with c1:
-            q = st.text_input("ユーザー名で絞り込み（部分一致）", value="", key="user_filter_q")
+            q = st.text_input("ユーザー名で絞り込み（前方一致）", value="", key="user_filter_q",
+                              on_change=reset_user_pages)
         with c2:
-            role_pick = st.selectbox("ロールで絞り込み", ("すべて", "admin", "user"), key="user_filter_role")
-
-    view = df.copy()
-    if q.strip():
-        view = view[view["username"].astype(str).str.contains(q.strip(), na=False)]
-    if role_pick != "すべて":
-        view = view[view["role"] == role_pick]
-
-    st.dataframe(view.sort_values(["id"]), width="stretch", height=300, hide_index=True)
+            role_pick = st.selectbox("ロールで絞り込み", ("すべて", "admin", "user"), key="user_filter_role",
+                                     on_change=reset_user_pages)
+
+    # 絞り込みとページ送りはSQL側（ユーザー名・ロールのインデックス）で行い、表示中の1ページだけ読む
+    cursors = st.session_state.setdefault("user_page_cursors", [None])
+    rows, next_cursor = app_auth.user_directory_page(
+        q, None if role_pick == "すべて" else role_pick, after_id=cursors[-1])
+    df = pd.DataFrame(rows, columns=USER_COLUMNS)
+
+    st.dataframe(df, width="stretch", height=300, hide_index=True)
+
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        st.button("◀ 前へ", key="user_page_prev", width="stretch", disabled=len(cursors) <= 1,
+                  on_click=move_user_page, args=(None,))
+    with p2:
+        st.caption(f"{len(cursors)} ページ目（{len(df)} 件表示）")
+    with p3:
+        st.button("次へ ▶", key="user_page_next", width="stretch", disabled=next_cursor is None,
+                  on_click=move_user_page, args=(next_cursor,))
 
 # =========================
 # 追加・編集
@@ -512,9 +535,9 @@ with col_edit:
     )
 
     if df.empty:
-        st.info("ユーザーがいません。")
+        st.info("一覧に表示中のユーザーがいません。")
     else:
-        options = [f"{int(r.id)}: {r.username} ({r.role})" for _, r in df.sort_values("id").iterrows()]
+        options = [f"{int(r.id)}: {r.username} ({r.role})" for r in df.itertuples(index=False)]
         pick = st.selectbox("対象ユーザーを選択", options, key="edit_user_pick")
         sel_id = int(pick.split(":")[0]) if pick else None
         sel_row = df[df["id"] == sel_id].iloc[0] if sel_id in df["id"].values else None
@@ -548,10 +571,10 @@ with col_edit:
                 ok_role = st.form_submit_button("🔁 ロールを変更", width="stretch")
             if ok_role:
                 try:
-                    conn.execute("UPDATE users SET role=? WHERE id=?", (role_new, int(sel_row.id)))
-                    conn.commit()
-                    st.success("ロールを変更しました。")
-                    safe_rerun()
+                    ok, msg = app_auth.set_user_role(conn, int(sel_row.id), role_new)
+                    (st.success if ok else st.error)(msg)
+                    if ok:
+                        safe_rerun()
                 except Exception as e:
                     st.error(f"ロール変更に失敗しました: {e}")
 
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lib_db  # noqa: E402
+
+
+@pytest.fixture
+def events_conn(tmp_path):
+    """一時ディレクトリの events.db への管理下の接続。"""
+    return lib_db.connection_manager(tmp_path / "events.db", lib_db.init_events_db).get()
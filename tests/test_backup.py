@@ -0,0 +1,21 @@
+import sqlite3
+
+import lib_db
+
+
+def test_backup_returns_a_path_to_a_complete_copy(events_conn, tmp_path, monkeypatch):
+    conn = events_conn
+    monkeypatch.setattr(lib_db, "BACKUP_DIR", tmp_path / "backups")
+    for i in range(50):
+        lib_db.add_event_sql(conn, "初級", "Red", "A", str(i), "", "2pt", "1Q", game_id=1)
+
+    fname, path = lib_db.backup_sqlite(conn, pages=1, sleep=0)
+
+    assert path == tmp_path / "backups" / fname
+    assert not path.with_name(fname + ".part").exists()
+    copy = sqlite3.connect(path)
+    try:
+        assert copy.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        assert copy.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 50
+    finally:
+        copy.close()
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import lib_db
+
+
+def _init(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS items(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return lib_db.ConnectionManager(tmp_path / "items.db", _init)
+
+
+def _in_thread(func):
+    result = {}
+
+    def run():
+        result["value"] = func()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def _count(manager):
+    with manager.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+def test_each_thread_reads_on_its_own_connection(manager):
+    conn = manager.get()
+    assert manager.get() is conn
+    assert _in_thread(manager.get) is not conn
+
+
+def test_connection_context_returns_the_lease(manager):
+    def borrow():
+        with manager.connection() as conn:
+            conn.execute("BEGIN")
+            conn.execute("SELECT 1").fetchone()
+        return conn
+
+    conn = _in_thread(borrow)
+    # 抜けた時点でプールに戻り（開いていたトランザクションは巻き戻され）、次のスレッドが使い回す
+    assert conn in manager._idle and not conn.in_transaction
+    assert _in_thread(manager.get) is conn
+
+
+def test_nested_connection_keeps_the_outer_lease(manager):
+    conn = manager.get()
+    with manager.connection() as inner:
+        assert inner is conn
+    assert manager.get() is conn and conn not in manager._idle
+    manager.release()
+    assert conn in manager._idle
+
+
+def test_connections_of_finished_threads_are_reused(manager):
+    conn = _in_thread(manager.get)     # release() せずに終わったスレッド
+    assert conn not in manager._idle
+    assert _in_thread(manager.get) is conn
+
+
+def test_concurrent_writers_commit_every_row(manager):
+    def insert(i):
+        with lib_db.writing(manager.get()) as w:
+            w.execute("INSERT INTO items(name) VALUES (?)", (f"item{i}",))
+        manager.release()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(insert, range(200)))
+    assert _count(manager) == 200
+
+
+def test_writer_rolls_back_and_commits_only_at_the_outermost_level(manager):
+    conn = manager.get()
+    with pytest.raises(sqlite3.IntegrityError):
+        with lib_db.writing(conn) as w:
+            w.execute("INSERT INTO items(name) VALUES ('a')")
+            with lib_db.writing(conn) as inner:
+                inner.execute("INSERT INTO items(name) VALUES ('b')")
+            assert _in_thread(lambda: _count(manager)) == 0     # 内側を抜けてもまだ commit しない
+            w.execute("INSERT INTO items(name) VALUES ('a')")
+    assert _count(manager) == 0
@@ -0,0 +1,41 @@
+import lib_db
+
+
+def _insert_interleaved(conn):
+    # 試合1と試合2のイベントを交互に入れ、試合1のページ境界が試合2の行をまたぐようにする
+    rows = [("Red" if i % 3 else "Blue", f"p{i}", "2pt", 1 if i % 2 else 2) for i in range(40)]
+    with lib_db.writing(conn) as w:
+        w.executemany("INSERT INTO events(team, name, action, game_id) VALUES (?, ?, ?, ?)", rows)
+    return [r[0] for r in conn.execute("SELECT id FROM events WHERE game_id=1 ORDER BY id")]
+
+
+def _page_ids(conn, limit, newest_first=False, **filters):
+    ids, cursor = [], None
+    while True:
+        df, cursor = lib_db.read_events_page(conn, after_id=cursor, limit=limit,
+                                             newest_first=newest_first, **filters)
+        assert len(df) <= limit
+        ids.extend(df["id"].tolist())
+        if cursor is None:
+            return ids
+
+
+def test_pages_cover_every_row_of_the_game_once(events_conn):
+    expected = _insert_interleaved(events_conn)
+    assert len(expected) == 20
+
+    # 割り切れない件数と、ちょうど割り切れる件数（最終ページが満杯）の両方
+    for limit in (3, 5):
+        assert _page_ids(events_conn, limit, game_id=1) == expected
+        assert _page_ids(events_conn, limit, newest_first=True, game_id=1) == expected[::-1]
+        pages = list(lib_db.iter_event_pages(events_conn, limit=limit, game_id=1))
+        assert all(not df.empty for df in pages)
+        assert [i for df in pages for i in df["id"]] == expected
+
+
+def test_pages_combine_game_and_team_filters(events_conn):
+    _insert_interleaved(events_conn)
+    expected = [r[0] for r in events_conn.execute(
+        "SELECT id FROM events WHERE game_id=1 AND team='Red' ORDER BY id")]
+
+    assert _page_ids(events_conn, 4, game_id=1, team="Red") == expected
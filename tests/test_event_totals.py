@@ -0,0 +1,27 @@
+import lib_db
+
+
+def test_event_without_team_is_accepted_and_not_counted(events_conn):
+    conn = events_conn
+    scored = lib_db.add_event_sql(conn, "初級", "Red", "", "1", "A", "2pt", "1Q", game_id=1)
+    no_team = lib_db.add_event_sql(conn, "初級", None, "", "2", "B", "3pt", "1Q", game_id=1)
+
+    assert lib_db.get_score_red_blue(conn, 1) == (2, 0)
+
+    lib_db.delete_event_by_id(conn, no_team)
+    assert lib_db.get_score_red_blue(conn, 1) == (2, 0)
+
+    lib_db.delete_event_by_id(conn, scored)
+    assert lib_db.get_score_red_blue(conn, 1) == (0, 0)
+
+
+def test_update_moves_points_between_teams(events_conn):
+    conn = events_conn
+    row_id = lib_db.add_event_sql(conn, "初級", None, "", "1", "A", "2pt", "1Q", game_id=1)
+    with lib_db.writing(conn) as w:
+        w.execute("UPDATE events SET team='Blue' WHERE id=?", (row_id,))
+    assert lib_db.get_score_red_blue(conn, 1) == (0, 2)
+
+    with lib_db.writing(conn) as w:
+        w.execute("UPDATE events SET team=NULL WHERE id=?", (row_id,))
+    assert lib_db.get_score_red_blue(conn, 1) == (0, 0)
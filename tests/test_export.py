@@ -0,0 +1,32 @@
+import csv
+import gzip
+import io
+
+import lib_db
+
+
+def _add_events(conn):
+    lib_db.add_event_sql(conn, "初級", "Red", "A", "7", "山田", "2pt", "1Q", game_id=1)
+    lib_db.add_event_sql(conn, "上級", "Blue", "B", "4", "佐藤", "3pt", "2Q", game_id=1)
+    lib_db.add_event_sql(conn, "初級", "Red", "A", "9", "鈴木", "1pt", "1Q", game_id=2)
+
+
+def test_export_closes_the_file_on_exit(events_conn):
+    conn = events_conn
+    _add_events(conn)
+
+    with lib_db.export_events_csv(conn, game_id=1) as (fname, f):
+        assert fname.endswith(".csv")
+        rows = list(csv.reader(io.StringIO(f.read().decode("utf-8-sig"))))
+    assert f.closed
+    assert rows[0] == lib_db.EXPORT_COLUMNS
+    assert [row[4] for row in rows[1:]] == ["山田", "佐藤"]
+
+
+def test_compressed_export_matches_plain(events_conn):
+    conn = events_conn
+    _add_events(conn)
+
+    with lib_db.export_events_csv(conn) as (_, plain), lib_db.export_events_csv(conn, compress=True) as (fname, gz):
+        assert fname.endswith(".csv.gz")
+        assert gzip.decompress(gz.read()) == plain.read()
@@ -0,0 +1,59 @@
+import lib_db
+
+LEGACY = {
+    "A_1": {"mark": "2点", "class": "初級", "number": "7"},
+    "B_1": {"mark": "3点", "class": "上級", "number": "4"},
+    "A_2": {"mark": "", "class": "初級", "number": ""},
+}
+
+
+def test_legacy_scores_are_imported_only_once(events_conn):
+    conn = events_conn
+    loads = []
+
+    def load_legacy():
+        loads.append(1)
+        return LEGACY
+
+    game_id = lib_db.ensure_active_game(conn, load_legacy)
+    assert len(lib_db.load_score_cells(conn, game_id)) == 2
+
+    # リセットで score_cells が空になってから、新しいセッションが始まる
+    lib_db.clear_score_cells(conn, game_id)
+    assert lib_db.ensure_active_game(conn, load_legacy) == game_id
+    assert len(lib_db.list_games(conn)) == 1
+    assert lib_db.load_score_cells(conn, game_id) == {}
+    assert loads == [1]
+
+
+def test_failed_legacy_load_is_retried(events_conn):
+    conn = events_conn
+
+    def broken():
+        raise ValueError("壊れたJSON")
+
+    try:
+        lib_db.ensure_active_game(conn, broken)
+    except ValueError:
+        pass
+    assert lib_db.get_meta(conn, lib_db.LEGACY_SCORES_IMPORTED) is None
+
+    # 読み込めなかった間も試合は使え、次のセッションで取り込み直す
+    empty_game = lib_db.ensure_active_game(conn)
+    imported = lib_db.ensure_active_game(conn, lambda: LEGACY)
+    assert imported != empty_game
+    assert len(lib_db.load_score_cells(conn, imported)) == 2
+    assert lib_db.get_meta(conn, lib_db.LEGACY_SCORES_IMPORTED) == "1"
+
+
+def test_upsert_score_cell_returns_the_new_version(events_conn):
+    conn = events_conn
+    game_id = lib_db.create_game(conn, "試合 1")
+    assert lib_db.get_score_version(conn, game_id) == 0
+
+    assert lib_db.upsert_score_cell(conn, game_id, "A", 1, "2点", "初級", "7") == 1
+    assert lib_db.upsert_score_cell(conn, game_id, "A", 1, "3点", "初級", "7") == 2
+    assert lib_db.upsert_score_cell(conn, game_id, "A", 1, "", "初級", "") == 3
+    # 行の無いセルのクリアは何も変えない
+    assert lib_db.upsert_score_cell(conn, game_id, "A", 1, "", "初級", "") is None
+    assert lib_db.get_score_version(conn, game_id) == 3
@@ -0,0 +1,49 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import lib_db
+
+
+def _init(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS items(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return lib_db.ConnectionManager(tmp_path / "items.db", _init)
+
+
+def _names(manager):
+    with manager.connection() as conn:
+        return sorted(r[0] for r in conn.execute("SELECT name FROM items"))
+
+
+def test_concurrent_submits_commit_every_row(manager):
+    writer = lib_db.GroupCommitWriter(manager)
+
+    def submit(i):
+        return writer.submit("INSERT INTO items(name) VALUES (?)", (f"item{i:03d}",))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = list(pool.map(submit, range(300)))
+
+    rowids = [f.result(timeout=10) for f in futures]
+    assert len(set(rowids)) == 300
+    assert _names(manager) == [f"item{i:03d}" for i in range(300)]
+
+
+def test_failure_reaches_only_its_own_future(manager):
+    # 窓を長くして3件を同じバッチにまとめる
+    writer = lib_db.GroupCommitWriter(manager, window=0.5)
+    sql = "INSERT INTO items(name) VALUES (?)"
+    first = writer.submit(sql, ("a",))
+    duplicate = writer.submit(sql, ("a",))
+    last = writer.submit(sql, ("b",))
+
+    assert first.result(timeout=10)
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(timeout=10)
+    assert last.result(timeout=10)
+    assert _names(manager) == ["a", "b"]
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pandas as pd
+
+import lib_db
+import lib_league
+
+
+def _league_conn(path):
+    return lib_db.connection_manager(path, lib_league.init_league_db).get()
+
+
+def _cells(*rows):
+    return pd.DataFrame(rows, columns=["team", "score_no", "mark", "class", "number"])
+
+
+def test_same_number_in_different_classes_are_different_players(tmp_path):
+    conn = _league_conn(tmp_path / "league.db")
+    cells = _cells(("A", 1, "2点", "初級", "7"), ("A", 2, "3点", "上級", "7"), ("B", 1, "1点", "初級", "4"))
+    lib_league.archive_score_sheet(conn, 1, "Red", "Blue", cells)
+
+    players = pd.read_sql_query("SELECT class_type, uniform_number FROM players", conn)
+    assert sorted(players.itertuples(index=False, name=None)) == [("上級", "7"), ("初級", "4"), ("初級", "7")]
+
+    leaders = lib_league.read_class_leaders(conn)
+    points = {(r.CLASS, r.背番号): r.得点 for r in leaders.itertuples()}
+    assert points == {("初級", "7"): 2, ("上級", "7"): 3, ("初級", "4"): 1}
+    assert lib_league.read_team_names(conn) == ["Blue", "Red"]
+
+
+def test_legacy_players_are_split_by_class(tmp_path):
+    path = tmp_path / "league.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE teams (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE players (
+          id INTEGER PRIMARY KEY AUTOINCREMENT, team_id INTEGER NOT NULL,
+          uniform_number TEXT NOT NULL, player_name TEXT NOT NULL,
+          UNIQUE(team_id, uniform_number)
+        );
+        CREATE TABLE matches (
+          id INTEGER PRIMARY KEY AUTOINCREMENT, match_date TEXT NOT NULL, class_type TEXT NOT NULL,
+          team_a_id INTEGER NOT NULL, team_b_id INTEGER NOT NULL,
+          score_a INTEGER NOT NULL, score_b INTEGER NOT NULL
+        );
+        CREATE TABLE player_match_stats (
+          id INTEGER PRIMARY KEY AUTOINCREMENT, match_id INTEGER NOT NULL, player_id INTEGER NOT NULL,
+          team_id INTEGER NOT NULL, points INTEGER NOT NULL
+        );
+        INSERT INTO teams(name) VALUES ('Red'), ('Blue');
+        INSERT INTO players(team_id, uniform_number, player_name) VALUES (1, '7', '山田');
+        INSERT INTO matches(match_date, class_type, team_a_id, team_b_id, score_a, score_b)
+          VALUES ('2024-01-01', '初級', 1, 2, 2, 0), ('2024-01-08', '上級', 1, 2, 3, 0);
+        INSERT INTO player_match_stats(match_id, player_id, team_id, points) VALUES (1, 1, 1, 2), (2, 1, 1, 3);
+    """)
+    legacy.close()
+
+    conn = _league_conn(path)
+    players = pd.read_sql_query("SELECT id, class_type, player_name FROM players ORDER BY id", conn)
+    assert list(players.itertuples(index=False, name=None)) == [(1, "上級", "山田"), (2, "初級", "山田")]
+
+    per_game = lib_league.read_player_points_per_game(conn)
+    assert sorted(zip(per_game["CLASS"], per_game["得点"])) == [("上級", 3), ("初級", 2)]
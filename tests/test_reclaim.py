@@ -0,0 +1,53 @@
+import sqlite3
+import threading
+
+import lib_db
+
+
+def test_reclaim_space_does_not_vacuum_legacy_db(tmp_path):
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t(x)")
+    conn.executemany("INSERT INTO t VALUES (zeroblob(4096))", [()] * 50)
+    conn.commit()
+    conn.execute("DELETE FROM t")
+    conn.commit()
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    lib_db.reclaim_space(conn, sleep=0)
+
+    # auto_vacuum=NONE のままなら実行中には何もしない（全体の VACUUM をしない）
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == free
+    conn.close()
+
+    assert lib_db.convert_auto_vacuum(path) is True
+    assert lib_db.convert_auto_vacuum(path) is False
+
+
+def test_reclaim_space_returns_free_pages_incrementally(events_conn):
+    conn = events_conn
+    for _ in range(3):
+        lib_db.add_event_sql(conn, "初級", "Red", "", "1", "x" * 2000, "2pt", "1Q", game_id=1)
+    with lib_db.writing(conn) as w:
+        w.executemany("INSERT INTO events(team, name, action, game_id) VALUES ('Red', ?, '2pt', 2)",
+                      [("x" * 2000,)] * 200)
+    lib_db.archive_game_events(conn, 2, archive=False)
+    for thread in list(lib_db._reclaim_threads.values()):
+        thread.join()
+
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_new_connection_opens_while_a_write_is_in_progress(tmp_path, events_conn):
+    assert events_conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    manager = lib_db.connection_manager(tmp_path / "events.db", lib_db.init_events_db)
+    counts = []
+    with lib_db.writing(events_conn) as w:
+        w.execute("INSERT INTO events(team, name, action, game_id) VALUES ('Red', 'x', '2pt', 1)")
+        # 書き込み中でも別スレッドの新しい接続は開けて、確定前の行は見えない
+        thread = threading.Thread(
+            target=lambda: counts.append(manager.get().execute("SELECT COUNT(*) FROM events").fetchone()[0]))
+        thread.start()
+        thread.join()
+    assert counts == [0]
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from lib_players import PLAYER_FIELDS, Roster, RosterStore
+
+
+def test_add_detects_duplicates_after_normalising_cells(tmp_path):
+    store = RosterStore(tmp_path / "players.json")
+    assert store.add("11", "山田", "Red", "A", "初級")
+
+    # Excel の数値セルや前後の空白は、保存時と同じ整形で同じ選手とみなす
+    assert not store.add(11.0, " 山田 ", "Red", "A", "初級")
+    assert not store.add(11, "山田", "Red ", "A", "初級")
+    assert len(store.players()) == 1
+
+    assert store.add("11", "山田", "Red", "A", "上級")
+    assert len(store.players()) == 2
+
+
+def _roster(*players):
+    rows = [{"id": i, **dict(zip(PLAYER_FIELDS, p))} for i, p in enumerate(players, start=1)]
+    return Roster(pd.DataFrame(rows, columns=["id"] + PLAYER_FIELDS), version=1)
+
+
+def test_find_and_suggest_in_number_order():
+    roster = _roster(
+        ("23", "佐藤", "Red", "A", "初級"),
+        ("2", "鈴木", "Red", "A", "初級"),
+        ("10", "高橋", "Red", "A", "初級"),
+        ("1", "田中", "Red", "A", "初級"),
+        ("12", "伊藤", "Red", "A", "初級"),
+        ("2", "渡辺", "Red", "A", "上級"),
+        ("2", "山本", "Blue", "A", "初級"),
+        ("GK", "中村", "Red", "A", "初級"),
+    )
+
+    assert roster.find("Red", "初級", "2")["player_name"] == "鈴木"
+    assert roster.find(" Red", "上級", " 2 ")["player_name"] == "渡辺"
+    assert roster.find("Red", "中級", "2") is None
+
+    def numbers(prefix, limit=6):
+        return [p["uniform_number"] for p in roster.suggest("Red", "初級", prefix, limit=limit)]
+
+    assert numbers("") == ["1", "2", "10", "12", "23", "GK"]
+    assert numbers("", limit=3) == ["1", "2", "10"]
+    assert numbers("1") == ["1", "10", "12"]
+    assert numbers("2") == ["2", "23"]
+    assert numbers("9") == []
+    assert [p["player_name"] for p in roster.suggest("Blue", "初級")] == ["山本"]
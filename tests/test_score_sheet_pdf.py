@@ -0,0 +1,50 @@
+import pytest
+import streamlit
+
+from benchmarks.bench_hot_paths import ROOT, StreamlitStub, load_page
+from lib_score import ScoreState
+
+pymupdf = pytest.importorskip("pymupdf")
+
+
+@pytest.fixture(scope="module")
+def main_page():
+    return load_page(ROOT / "main.py", StreamlitStub(streamlit))
+
+
+def _render(main_page, scores, team_a="Red", team_b="Blue"):
+    main_page["render_score_sheet_pdf"].clear()
+    return main_page["render_score_sheet_pdf"](scores.digest(), team_a, team_b, scores)
+
+
+def _scores():
+    scores = ScoreState()
+    scores.set_cell("A_1", "2点", "初級", "7")
+    scores.set_cell("B_1", "3点", "上級", "23")
+    scores.set_cell("A_2", "1点", "中級", "11")
+    return scores
+
+
+def test_pdf_has_template_image_static_form_and_marks(main_page):
+    doc = pymupdf.open(stream=_render(main_page, _scores()), filetype="pdf")
+    assert doc.page_count == 1
+    page = doc[0]
+
+    # テンプレート画像は透過（SMask）付きで1枚、罫線・スコア番号は静的レイヤーのフォーム
+    images = page.get_images(full=True)
+    assert len(images) == 1 and images[0][1] != 0
+    assert [name for _, name, _, _ in page.get_xobjects() if name.endswith("score_sheet_static")]
+
+    words = {w[4] for w in page.get_text("words")}
+    assert {"Red", "Blue", "7", "23", "11", "160"} <= words
+    assert {"3", "2"} <= words    # 合計
+
+
+def test_pdf_is_identical_across_renders(main_page):
+    first = _render(main_page, _scores())
+    again = _render(main_page, _scores())
+    other = _render(main_page, _scores(), team_a="White")
+    assert len(first) == len(again)
+    text = [pymupdf.open(stream=pdf, filetype="pdf")[0].get_text() for pdf in (first, again, other)]
+    assert text[0] == text[1]
+    assert "White" in text[2] and "Red" not in text[2]
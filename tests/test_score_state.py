@@ -0,0 +1,88 @@
+import random
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lib_score import CLASS_OPTIONS, MARKS, MAX_SCORE_NO, POINT_MAP, ScoreState, cell_key
+
+
+def _naive_totals(cells):
+    """セル辞書を全件走査して数え直した合計（差分更新と比べる基準）。"""
+    teams, classes, players = {"A": 0, "B": 0}, {}, {}
+    for key, cell in cells.items():
+        point = POINT_MAP.get(cell["mark"], 0)
+        if not point:
+            continue
+        team = key.split("_")[0]
+        teams[team] += point
+        class_key = (team, cell["class"])
+        player_key = (team, cell["class"], cell["number"])
+        classes[class_key] = classes.get(class_key, 0) + point
+        players[player_key] = players.get(player_key, 0) + point
+    return teams, classes, players
+
+
+def _naive_summary(players):
+    names = {"A": "Red", "B": "Blue"}
+    rows = [{"チーム": names[t], "級": c, "背番号": n, "得点": p} for (t, c, n), p in players.items()]
+    if not rows:
+        return pd.DataFrame(columns=["チーム", "級", "背番号", "得点"])
+    return pd.DataFrame(rows).sort_values(["チーム", "級", "背番号"]).reset_index(drop=True)
+
+
+def _assert_matches_rebuild(state):
+    teams, classes, players = _naive_totals(state.to_dict())
+    assert state.team_total("A") == teams["A"]
+    assert state.team_total("B") == teams["B"]
+    assert state.class_totals() == classes
+    assert state.player_totals() == players
+    assert_frame_equal(state.summary_df("Red", "Blue"), _naive_summary(players), check_dtype=False)
+
+    rebuilt = ScoreState.from_dict(state.to_dict())
+    assert rebuilt.digest() == state.digest()
+    assert_frame_equal(rebuilt.team_summary_df("Red", "Blue"), state.team_summary_df("Red", "Blue"))
+
+
+def test_incremental_totals_match_a_rebuild_after_set_overwrite_and_clear():
+    rng = random.Random(1)
+    state = ScoreState()
+    _assert_matches_rebuild(state)
+
+    keys = [cell_key(t, n) for t in range(2) for n in range(1, 31)]
+    for step in range(600):
+        key = rng.choice(keys)
+        if step % 7 == 0:
+            state.clear_cell(key)
+        else:
+            # 上書き（点数・CLASS・背番号の変更）も同じキーに何度も入る
+            state.set_cell(key, rng.choice(MARKS), rng.choice(CLASS_OPTIONS), str(rng.randrange(5)))
+        if step % 25 == 0:
+            _assert_matches_rebuild(state)
+    _assert_matches_rebuild(state)
+
+    for key in keys:
+        state.clear_cell(key)
+    assert state.team_total("A") == state.team_total("B") == 0
+    assert state.class_totals() == {} and state.player_totals() == {}
+    assert state.digest() == ScoreState().digest()
+
+
+def test_digest_follows_cell_contents():
+    state = ScoreState()
+    empty = state.digest()
+
+    state.set_cell("A_1", "2点", "初級", "7")
+    scored = state.digest()
+    assert scored != empty
+
+    for changed in (("3点", "初級", "7"), ("2点", "中級", "7"), ("2点", "初級", "8")):
+        state.set_cell("A_1", *changed)
+        assert state.digest() != scored
+    state.set_cell("A_1", "2点", "初級", "7")
+    assert state.digest() == scored
+
+    state.set_cell(f"B_{MAX_SCORE_NO}", "1点", "上級", "4")
+    assert state.team_total("B") == 1
+    state.clear_cell(f"B_{MAX_SCORE_NO}")
+    state.clear_cell("A_1")
+    assert state.digest() == empty
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+import app_auth
+
+
+def test_change_password_revokes_other_sessions(events_conn, monkeypatch):
+    conn = events_conn
+    monkeypatch.setattr(app_auth, "_ITER", 1000)
+    app_auth.ensure_users_table(conn)
+    app_auth.create_user(conn, "coach", "secret1")
+    user = app_auth.authenticate(conn, "coach", "secret1")
+
+    kept = app_auth.create_session(conn, user["id"])
+    other = app_auth.create_session(conn, user["id"])
+    monkeypatch.setattr(app_auth.st, "session_state", {"auth_token": kept})
+
+    ok, _ = app_auth.change_password(conn, user["id"], "secret1", "secret2")
+
+    assert ok
+    assert app_auth.resume_session(conn, kept)["id"] == user["id"]
+    assert app_auth.resume_session(conn, other) is None
+
+
+def test_login_failures_are_pruned_and_capped(monkeypatch):
+    monkeypatch.setattr(app_auth, "_login_failures", app_auth.OrderedDict())
+    monkeypatch.setattr(app_auth, "LOGIN_MAX_TRACKED", 3)
+    now = time.monotonic()
+    app_auth._login_failures["stale"] = [now - app_auth.LOGIN_WINDOW_SEC - 1]
+
+    for name in ("a", "b", "c", "d"):
+        app_auth._record_login(name, ok=False)
+
+    # 期間切れは捨てられ、上限を超えた分は古いものから捨てられる
+    assert list(app_auth._login_failures) == ["b", "c", "d"]
+
+    for _ in range(app_auth.LOGIN_MAX_FAILURES + 2):
+        app_auth._record_login("d", ok=False)
+    assert len(app_auth._login_failures["d"]) == app_auth.LOGIN_MAX_FAILURES
+    assert app_auth.login_retry_after("d") > 0
+
+
+def test_concurrent_login_for_same_user_is_busy_not_a_failure(events_conn, monkeypatch):
+    conn = events_conn
+    monkeypatch.setattr(app_auth, "_ITER", 1000)
+    monkeypatch.setattr(app_auth, "_login_failures", app_auth.OrderedDict())
+    app_auth.ensure_users_table(conn)
+    app_auth.create_user(conn, "coach", "secret1")
+
+    monkeypatch.setattr(app_auth, "_login_in_flight", {"coach"})
+    with pytest.raises(app_auth.AuthBusy):
+        app_auth.authenticate(conn, "coach", "secret1")
+    assert "coach" not in app_auth._login_failures